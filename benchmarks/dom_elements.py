@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Measures the CPU time and retained memory of processing a large `DOM.setChildNodes` burst, comparing
+the compact, lazily-populated `webfriend.rpc.dom.DOMElement` against an eager implementation
+equivalent to the one it replaced.
+
+Usage: python benchmarks/dom_elements.py [NODE_COUNT]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from webfriend.rpc.cache import ElementCache
+from webfriend.rpc.dom import DOM, DOMElement
+from webfriend.rpc.event import Event
+import gc
+import sys
+import time
+
+
+class FakeTab(object):
+    pass
+
+
+class EagerDOMElement(object):
+    """
+    The previous DOMElement implementation: a regular class that parses attributes and builds child
+    objects up front.
+    """
+    def __init__(self, rpc, definition):
+        self.dom = rpc
+        self.generation = rpc.element_cache.generation
+        self.definition = definition
+        self.id = definition['nodeId']
+        self.parent_id = definition.get('parentId')
+        self.type = definition.get('nodeType')
+        self.local_name = definition.get('localName')
+        self._partial = ('nodeName' not in definition)
+        self._name = definition.get('nodeName')
+        self._value = definition.get('nodeValue')
+        self._box_model = None
+        self._bounding_rect = None
+        self.attributes = {}
+        self.child_nodes = []
+        self.child_ids = set()
+        self._text = ''
+
+        for child in definition.get('children', []):
+            child_type = child.get('nodeType')
+
+            if child_type == 1:
+                self.child_ids.add(child['nodeId'])
+            elif child_type == 3:
+                self._text = child.get('nodeValue', '')
+            else:
+                self.child_nodes.append(EagerDOMElement(rpc, child))
+
+        attrgen = (a for a in definition.get('attributes', []))
+
+        for name, value in [(n, next(attrgen)) for n in attrgen]:
+            self.attributes[name] = value
+
+
+def generate_nodes(count):
+    nodes = []
+    next_id = [10]
+
+    def new_id():
+        next_id[0] += 1
+        return next_id[0]
+
+    for i in range(count):
+        nodes.append({
+            'nodeId':         new_id(),
+            'backendNodeId':  new_id(),
+            'parentId':       2,
+            'nodeType':       1,
+            'nodeName':       'LI',
+            'localName':      'li',
+            'nodeValue':      '',
+            'childNodeCount': 2,
+            'attributes': [
+                'id', 'item-{}'.format(i),
+                'class', 'list-item list-item-{}'.format(i % 10),
+                'data-index', '{}'.format(i),
+            ],
+            'children': [
+                {
+                    'nodeId':    new_id(),
+                    'nodeType':  3,
+                    'nodeName':  '#text',
+                    'localName': '',
+                    'nodeValue': 'Item number {}'.format(i),
+                },
+                {
+                    'nodeId':    new_id(),
+                    'nodeType':  8,
+                    'nodeName':  '#comment',
+                    'localName': '',
+                    'nodeValue': ' item {} '.format(i),
+                },
+            ],
+        })
+
+    return nodes
+
+
+def retained_size(obj, seen):
+    """
+    Approximate the memory retained by an element, excluding the node definition (which is shared
+    with the event payload either way).
+    """
+    if id(obj) in seen or isinstance(obj, (DOM, FakeTab)):
+        return 0
+
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+        values = [v for k, v in obj.__dict__.items() if k != 'definition']
+    elif hasattr(obj, '__slots__'):
+        values = [getattr(obj, k, None) for k in obj.__slots__ if k != 'definition']
+    elif isinstance(obj, dict):
+        values = list(obj.keys()) + list(obj.values())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        values = list(obj)
+    else:
+        return size
+
+    for value in values:
+        if isinstance(value, (dict, list, tuple, set, frozenset)) or hasattr(value, 'dom'):
+            size += retained_size(value, seen)
+
+    return size
+
+
+def run(label, element_cls, count, touch=False):
+    dom = DOM(FakeTab())
+    dom.element_cache = ElementCache(max_size=(count * 2))
+    event = Event(dom, 'setChildNodes', {
+        'parentId': 2,
+        'nodes':    generate_nodes(count),
+    })
+
+    gc.collect()
+    started_at = time.time()
+
+    for node in event.get('nodes'):
+        dom.element_cache.put(element_cls(dom, node))
+
+    if touch:
+        for element in list(dom.element_cache._elements.values()):
+            element.attributes
+            element.child_nodes
+
+    elapsed = time.time() - started_at
+
+    seen = set()
+    size = sum([
+        retained_size(e, seen) for e in dom.element_cache._elements.values()
+    ])
+
+    print('{:<40} {:>8.1f}ms {:>10.1f}MiB'.format(
+        label,
+        elapsed * 1e3,
+        size / 1048576.0
+    ))
+
+
+def main():
+    count = (int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
+
+    print('Processing a setChildNodes event with {} element nodes'.format(count))
+    print('{:<40} {:>10} {:>13}'.format('', 'cpu', 'retained'))
+    run('eager DOMElement (previous)', EagerDOMElement, count)
+    run('lazy DOMElement', DOMElement, count)
+    run('lazy DOMElement (all fields accessed)', DOMElement, count, touch=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -50,6 +50,16 @@ log.addHandler(err)
     metavar='PLUGIN[,PLUGIN ..]',
     help='A comma-separated list of additional plugins to load'
 )
+@click.option(
+    '--event-log', '-E',
+    metavar='FILENAME',
+    help='Write all events received by the current tab to the given file (or unix:// socket) as NDJSON'
+)
+@click.option(
+    '--event-log-filter',
+    metavar='PATTERN[,PATTERN ..]',
+    help='A comma-separated list of event name patterns (e.g. "Network.*") to write to the event log'
+)
 @click.argument('script', type=click.File('rb'), required=False)
 @click.argument('remainder', nargs=-1, type=click.UNPROCESSED)
 @click.pass_context
@@ -67,6 +77,8 @@ def main(
     log_level,
     script_log_level,
     plugins,
+    event_log,
+    event_log_filter,
     script,
     remainder
 ):
@@ -99,6 +111,12 @@ def main(
         ) as chrome:
             environment = Environment(browser=chrome, log_level=script_log_level)
 
+            if event_log:
+                if event_log_filter:
+                    event_log_filter = event_log_filter.split(',')
+
+                chrome.default.tap_events(event_log, patterns=event_log_filter)
+
             if isinstance(plugins, list):
                 for plugin in plugins:
                     environment.register_by_module_name(plugin)
@@ -0,0 +1,145 @@
+"""
+Coalescing rules collapse bursts of high-frequency events (e.g. `Network.dataReceived`) into a
+single aggregated event per time window, so that event handlers, waiters, and taps only see one
+event per window instead of thousands.
+"""
+from __future__ import absolute_import
+from collections import OrderedDict
+import time
+
+
+class CoalescingRule(object):
+    modes = ['latest', 'sum']
+
+    def __init__(self, event_name, window=100, mode='latest', key=None, sum_fields=None):
+        """
+        Describes how a particular event should be coalesced.
+
+        #### Arguments
+
+        - **event_name** (`str`):
+
+            The fully-qualified name of the event to coalesce (e.g. `Network.dataReceived`).
+
+        - **window** (`int`):
+
+            The length of the aggregation window, in milliseconds.  One aggregated event per
+            **key** is emitted when the window elapses.
+
+        - **mode** (`str`):
+
+            How events within a window are combined:
+
+            - "latest": Only the most recent event is kept.
+
+            - "sum": The most recent event is kept, but the fields named in **sum_fields** are
+              replaced with the sum of that field across all events in the window.
+
+        - **key** (`str`, optional):
+
+            If given, events are aggregated separately for each distinct value of this payload
+            field (e.g. `requestId`).  Otherwise all events in a window are aggregated together.
+
+        - **sum_fields** (`list`, optional):
+
+            The payload fields to sum when **mode** is "sum".
+
+        Every aggregated payload has a *coalescedCount* field added to it that contains the number
+        of events that were combined to produce it.
+        """
+        if mode not in self.modes:
+            raise AttributeError("Invalid coalescing mode, must be one of: {}".format(
+                ', '.join(self.modes)
+            ))
+
+        if '.' not in event_name:
+            raise AttributeError("Event name must be fully-qualified (e.g.: 'Network.dataReceived')")
+
+        if mode == 'sum' and not sum_fields:
+            raise AttributeError("Must specify sum_fields when using the 'sum' mode")
+
+        self.event_name = event_name
+        self.window     = window
+        self.mode       = mode
+        self.key        = key
+        self.sum_fields = list(sum_fields or [])
+        self.received   = 0
+        self.emitted    = 0
+        self.proxy      = None
+        self.flush_at   = None
+        self._buckets   = OrderedDict()
+
+    @property
+    def method(self):
+        return self.event_name.split('.', 1)[1]
+
+    @property
+    def pending(self):
+        return (self.flush_at is not None)
+
+    def add(self, payload, proxy=None, now=None):
+        if now is None:
+            now = time.time()
+
+        if not isinstance(payload, dict):
+            payload = {}
+
+        if proxy is not None:
+            self.proxy = proxy
+
+        # the window starts when the first event is received
+        if self.flush_at is None:
+            self.flush_at = now + (self.window / 1e3)
+
+        if self.key is None:
+            bucket_key = None
+        else:
+            bucket_key = payload.get(self.key)
+
+        existing = self._buckets.get(bucket_key)
+        aggregate = dict(payload)
+
+        if existing is None:
+            aggregate['coalescedCount'] = 1
+        else:
+            aggregate['coalescedCount'] = existing['coalescedCount'] + 1
+
+            if self.mode == 'sum':
+                for field in self.sum_fields:
+                    aggregate[field] = existing.get(field, 0) + payload.get(field, 0)
+
+        self._buckets[bucket_key] = aggregate
+        self.received += 1
+
+    def is_due(self, now=None):
+        if self.flush_at is None:
+            return False
+
+        if now is None:
+            now = time.time()
+
+        return (now >= self.flush_at)
+
+    def flush(self):
+        """
+        Return all aggregated payloads for the current window (in the order their keys were first
+        seen) and start a new window.
+        """
+        payloads = self._buckets.values()
+
+        self._buckets = OrderedDict()
+        self.flush_at = None
+        self.emitted += len(payloads)
+
+        return payloads
+
+    def as_dict(self):
+        return {
+            'event':    self.event_name,
+            'window':   self.window,
+            'mode':     self.mode,
+            'key':      self.key,
+            'sum':      self.sum_fields,
+            'received': self.received,
+            'emitted':  self.emitted,
+        }
@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend.coalesce import CoalescingRule
+
+
+class CoalescingRuleTest(TestCase):
+    def test_sum_by_key(self):
+        rule = CoalescingRule(
+            'Network.dataReceived',
+            window=100,
+            mode='sum',
+            key='requestId',
+            sum_fields=['dataLength']
+        )
+
+        rule.add({'requestId': 'a', 'dataLength': 10, 'timestamp': 1}, now=0)
+        rule.add({'requestId': 'b', 'dataLength': 5, 'timestamp': 2}, now=0.01)
+        rule.add({'requestId': 'a', 'dataLength': 20, 'timestamp': 3}, now=0.02)
+
+        self.assertFalse(rule.is_due(now=0.05))
+        self.assertTrue(rule.is_due(now=0.1))
+
+        self.assertEqual([
+            {'requestId': 'a', 'dataLength': 30, 'timestamp': 3, 'coalescedCount': 2},
+            {'requestId': 'b', 'dataLength': 5, 'timestamp': 2, 'coalescedCount': 1},
+        ], rule.flush())
+
+        # flushing starts a new window
+        self.assertFalse(rule.pending)
+        self.assertEqual([], rule.flush())
+        self.assertEqual(3, rule.received)
+        self.assertEqual(2, rule.emitted)
+
+    def test_latest(self):
+        rule = CoalescingRule('DOM.childNodeCountUpdated', window=50)
+
+        for i in range(100):
+            rule.add({'nodeId': i, 'childNodeCount': i}, now=0)
+
+        self.assertEqual([
+            {'nodeId': 99, 'childNodeCount': 99, 'coalescedCount': 100},
+        ], rule.flush())
+
+    def test_invalid_rules(self):
+        self.assertRaises(AttributeError, CoalescingRule, 'dataReceived')
+        self.assertRaises(AttributeError, CoalescingRule, 'Network.dataReceived', mode='average')
+        self.assertRaises(AttributeError, CoalescingRule, 'Network.dataReceived', mode='sum')
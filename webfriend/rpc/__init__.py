@@ -5,6 +5,7 @@ from webfriend.rpc.base import Base
 from webfriend.rpc.browser import Browser
 from webfriend.rpc.console import Console
 from webfriend.rpc.dom import DOM, DOMElement
+from webfriend.rpc.domsnapshot import DOMSnapshot
 from webfriend.rpc.emulation import Emulation
 from webfriend.rpc.event import Event
 from webfriend.rpc.input import Input
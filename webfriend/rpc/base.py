@@ -32,6 +32,27 @@ class Base(object):
             **params
         )
 
+    def call_many(self, calls, reply_timeout=None, raise_errors=True):
+        """
+        Perform several calls against this domain in a single round trip.
+
+        #### Arguments
+
+        - **calls** (`list`):
+
+            A list of `(method, params)` tuples.
+
+        - **raise_errors** (`bool`):
+
+            If false, failed calls have their exception returned in place of a reply.
+
+        #### Returns
+        A `list` of replies, in the same order as **calls**.
+        """
+        return self.tab.rpc_many([
+            ('{}.{}'.format(self.domain, method), params) for method, params in calls
+        ], reply_timeout=reply_timeout, raise_errors=raise_errors)
+
     def enable(self):
         if self.supports_events:
             self.call('enable')
@@ -0,0 +1,189 @@
+from __future__ import absolute_import
+from collections import OrderedDict
+from threading import RLock
+import time
+
+
+class ElementCache(object):
+    """
+    A bounded, least-recently-used cache of `webfriend.rpc.dom.DOMElement` instances keyed by
+    node ID.
+
+    Node IDs are only meaningful within a single version of a document, so the cache tracks a
+    _generation_ number that is incremented every time the cache is invalidated (e.g.: on
+    navigation or when the document is replaced).  Elements record the generation they were
+    created in, which makes it possible to tell when a held element has gone stale.
+    """
+    default_max_size = 25000
+
+    def __init__(self, max_size=None):
+        self.max_size   = (max_size or self.default_max_size)
+        self.generation = 0
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+        self._elements  = OrderedDict()
+        self._lock      = RLock()
+
+    def get(self, id, fallback=None):
+        with self._lock:
+            try:
+                element = self._elements.pop(id)
+            except KeyError:
+                self.misses += 1
+                return fallback
+
+            # re-insert to mark this as the most recently used element
+            self._elements[id] = element
+            self.hits += 1
+
+            return element
+
+    def peek(self, id, fallback=None):
+        """
+        Return the cached element without counting a lookup or marking it as recently used.
+        """
+        with self._lock:
+            return self._elements.get(id, fallback)
+
+    def put(self, element):
+        with self._lock:
+            self._elements.pop(element.id, None)
+            self._elements[element.id] = element
+
+            while len(self._elements) > self.max_size:
+                self._elements.popitem(last=False)
+                self.evictions += 1
+
+        return element
+
+    def remove(self, id):
+        with self._lock:
+            return self._elements.pop(id, None)
+
+    def invalidate(self):
+        """
+        Discard all cached elements and start a new generation.
+        """
+        with self._lock:
+            self._elements = OrderedDict()
+            self.generation += 1
+
+        return self.generation
+
+    def as_dict(self):
+        lookups = (self.hits + self.misses)
+
+        return {
+            'generation': self.generation,
+            'size':       len(self),
+            'max_size':   self.max_size,
+            'hits':       self.hits,
+            'misses':     self.misses,
+            'evictions':  self.evictions,
+            'hit_rate':   (float(self.hits) / lookups if lookups else 0.0),
+        }
+
+    def __contains__(self, id):
+        return (id in self._elements)
+
+    def __len__(self):
+        return len(self._elements)
+
+
+class QueryCache(object):
+    """
+    A bounded cache of selector query results, mapping a selector and the node it was evaluated
+    against to the IDs of the nodes it matched.
+
+    The cache is cleared whenever a change that could affect what a selector matches is observed
+    (see `webfriend.rpc.dom.DOM`), and every clear starts a new _epoch_; results are only stored
+    if no clear happened while the query was in flight.  Since the browser only reports changes
+    to the parts of a document it has sent us, entries also expire after **max_age** seconds,
+    and queries that matched nothing are never cached.
+    """
+    default_max_size = 1000
+    default_max_age = 10.0
+
+    def __init__(self, max_size=None, max_age=None):
+        self.max_size      = (max_size or self.default_max_size)
+        self.max_age       = (self.default_max_age if max_age is None else max_age)
+        self.epoch         = 0
+        self.hits          = 0
+        self.misses        = 0
+        self.invalidations = 0
+        self._results      = OrderedDict()
+        self._lock         = RLock()
+
+    def get(self, selector, node_id):
+        """
+        Return the cached node IDs for the given selector and context node, or `None`.
+        """
+        key = (selector, node_id)
+
+        with self._lock:
+            try:
+                stored_at, node_ids = self._results.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+
+            if self.max_age and (time.time() - stored_at) > self.max_age:
+                self.misses += 1
+                return None
+
+            self._results[key] = (stored_at, node_ids)
+            self.hits += 1
+
+            return list(node_ids)
+
+    def put(self, selector, node_id, node_ids, epoch=None):
+        """
+        Store the result of a query.  If **epoch** is given and the cache has been cleared since
+        it was read (i.e.: the document changed while the query was in flight), nothing is stored.
+        """
+        if not len(node_ids):
+            return False
+
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return False
+
+            key = (selector, node_id)
+
+            self._results.pop(key, None)
+            self._results[key] = (time.time(), tuple(node_ids))
+
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+        return True
+
+    def clear(self):
+        """
+        Discard all cached results and start a new epoch.
+        """
+        with self._lock:
+            if len(self._results):
+                self.invalidations += 1
+
+            self._results = OrderedDict()
+            self.epoch += 1
+
+        return self.epoch
+
+    def as_dict(self):
+        lookups = (self.hits + self.misses)
+
+        return {
+            'size':          len(self),
+            'max_size':      self.max_size,
+            'max_age':       self.max_age,
+            'hits':          self.hits,
+            'misses':        self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate':      (float(self.hits) / lookups if lookups else 0.0),
+        }
+
+    def __len__(self):
+        return len(self._results)
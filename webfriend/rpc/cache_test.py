@@ -0,0 +1,90 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend.rpc.cache import ElementCache, QueryCache
+import time
+
+
+class FakeElement(object):
+    def __init__(self, id):
+        self.id = id
+
+
+class ElementCacheTest(TestCase):
+    def test_lru_eviction(self):
+        cache = ElementCache(max_size=3)
+
+        for i in range(3):
+            cache.put(FakeElement(i))
+
+        # touch 0 so that 1 becomes the least-recently used element
+        self.assertEqual(0, cache.get(0).id)
+        cache.put(FakeElement(3))
+
+        self.assertEqual(3, len(cache))
+        self.assertIn(0, cache)
+        self.assertNotIn(1, cache)
+        self.assertEqual(1, cache.evictions)
+
+    def test_hit_miss_counters(self):
+        cache = ElementCache()
+        cache.put(FakeElement(1))
+
+        self.assertEqual(1, cache.get(1).id)
+        self.assertEqual('nope', cache.get(2, 'nope'))
+
+        stats = cache.as_dict()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(0.5, stats['hit_rate'])
+
+    def test_invalidate(self):
+        cache = ElementCache()
+        cache.put(FakeElement(1))
+
+        self.assertEqual(1, cache.invalidate())
+        self.assertEqual(0, len(cache))
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(1, cache.generation)
+
+
+class QueryCacheTest(TestCase):
+    def test_hits_and_invalidation(self):
+        cache = QueryCache()
+
+        self.assertIsNone(cache.get('a', 1))
+        self.assertTrue(cache.put('a', 1, [2, 3]))
+        self.assertEqual([2, 3], cache.get('a', 1))
+        self.assertIsNone(cache.get('a', 4))
+
+        # empty results are never cached
+        self.assertFalse(cache.put('b', 1, []))
+
+        cache.clear()
+        self.assertIsNone(cache.get('a', 1))
+
+        stats = cache.as_dict()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(3, stats['misses'])
+        self.assertEqual(1, stats['invalidations'])
+        self.assertEqual(0.25, stats['hit_rate'])
+
+    def test_stale_results_not_stored(self):
+        cache = QueryCache()
+        epoch = cache.epoch
+
+        # the document changed while the query was in flight
+        cache.clear()
+
+        self.assertFalse(cache.put('a', 1, [2], epoch=epoch))
+        self.assertEqual(0, len(cache))
+
+    def test_expiry_and_size(self):
+        cache = QueryCache(max_size=2, max_age=0.0001)
+        cache.put('a', 1, [2])
+        cache.put('b', 1, [3])
+        cache.put('c', 1, [4])
+
+        self.assertEqual(2, len(cache))
+        time.sleep(0.001)
+        self.assertIsNone(cache.get('c', 1))
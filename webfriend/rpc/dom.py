@@ -1,14 +1,340 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 from webfriend.rpc import Base
+from webfriend.rpc.cache import ElementCache, QueryCache
+from webfriend.rpc.runtime import EmbeddedScriptError
+from webfriend.utils.extract import EXTRACT_SCRIPT, EXTRACT_NODE_FN, compile_spec
+from webfriend.utils import fingerprint
 import logging
 import math
 import re
 import time
+from gzip import GzipFile
+from weakref import WeakValueDictionary
 from webfriend import exceptions
 
 RX_ID_EXPANSION = re.compile('#(?P<id>[^\s]+)')
 
+# Resolves to true as soon as the given test function returns true for the document, or to false
+# once the timeout elapses.  The test is re-run only when the observed document (the top-level
+# document unless another is given) actually changes.
+MUTATION_WAIT_FN = """function(test, timeout, target){
+    return new Promise(function(resolve, reject){
+        var observer = null;
+        var timer = null;
+
+        var check = function(){
+            try {
+                return test();
+            } catch(e) {
+                if(observer){
+                    observer.disconnect();
+                }
+
+                clearTimeout(timer);
+                reject(e);
+                return true;
+            }
+        };
+
+        if(check() === true){
+            return resolve(true);
+        }
+
+        observer = new MutationObserver(function(){
+            if(check() === true){
+                observer.disconnect();
+                clearTimeout(timer);
+                resolve(true);
+            }
+        });
+
+        observer.observe(target || document, {
+            childList:     true,
+            subtree:       true,
+            attributes:    true,
+            characterData: true,
+        });
+
+        timer = setTimeout(function(){
+            observer.disconnect();
+            resolve(false);
+        }, timeout);
+    });
+}"""
+
+# Evaluates an XPath expression relative to `this` (optionally waiting for it to match) in the
+# document that owns it, and returns the matching elements as an array (or null if none match.)
+# The page itself is left untouched.
+XPATH_FN = """function(expression, timeout){
+    var context = this;
+    var doc = (context.nodeType === Node.DOCUMENT_NODE ? context : context.ownerDocument);
+
+    var evaluate = function(type){
+        return doc.evaluate(expression, context, null, type, null);
+    };
+
+    var collect = function(){
+        var result = evaluate(XPathResult.ORDERED_NODE_SNAPSHOT_TYPE);
+        var nodes = [];
+
+        for(var i = 0; i < result.snapshotLength; i++){
+            var node = result.snapshotItem(i);
+
+            if(node.nodeType === Node.ELEMENT_NODE){
+                nodes.push(node);
+            }
+        }
+
+        return (nodes.length ? nodes : null);
+    };
+
+    if(!timeout){
+        return collect();
+    }
+
+    return (%s)(function(){
+        return (evaluate(XPathResult.FIRST_ORDERED_NODE_TYPE).singleNodeValue !== null);
+    }, timeout, doc).then(function(found){
+        return (found ? collect() : null);
+    });
+}""" % MUTATION_WAIT_FN
+
+# Waits for a selector to match beneath `this` (a document or element, possibly in a subframe),
+# observing mutations to the document that owns it rather than the top-level document.
+WAIT_FOR_SELECTOR_FN = """function(selector, timeout){
+    var root = this;
+    var doc = (root.nodeType === Node.DOCUMENT_NODE ? root : root.ownerDocument);
+
+    return (%s)(function(){
+        return (root.querySelector(selector) !== null);
+    }, timeout, doc);
+}""" % MUTATION_WAIT_FN
+
+# Measures every element passed in (`this` plus all arguments) in one pass.  Box model quads are
+# derived from the border box and computed edge widths, in viewport coordinates.
+GEOMETRY_FN = """function(){
+    var elements = [this].concat(Array.prototype.slice.call(arguments));
+
+    return elements.map(function(el){
+        if(el && el.nodeType === Node.DOCUMENT_NODE){
+            el = el.documentElement;
+        }
+
+        if(!el || el.nodeType !== Node.ELEMENT_NODE){
+            return null;
+        }
+
+        var rect = el.getBoundingClientRect();
+        var style = (el.ownerDocument.defaultView || window).getComputedStyle(el);
+
+        var edges = function(prefix, suffix){
+            return ['top', 'right', 'bottom', 'left'].map(function(side){
+                return (parseFloat(style.getPropertyValue(prefix + side + suffix)) || 0);
+            });
+        };
+
+        var quad = function(box, e, sign){
+            var l = box[0] - (sign * e[3]),
+                t = box[1] - (sign * e[0]),
+                r = box[2] + (sign * e[1]),
+                b = box[3] + (sign * e[2]);
+
+            return [l, t, r, t, r, b, l, b];
+        };
+
+        var border = [rect.left, rect.top, rect.right, rect.bottom];
+        var padding = quad(border, edges('border-', '-width'), -1);
+        var content = quad([padding[0], padding[1], padding[4], padding[5]], edges('padding-', ''), -1);
+
+        return {
+            rect: {
+                x:      rect.x,
+                y:      rect.y,
+                width:  rect.width,
+                height: rect.height,
+                top:    rect.top,
+                right:  rect.right,
+                bottom: rect.bottom,
+                left:   rect.left,
+            },
+            box: {
+                content: content,
+                padding: padding,
+                border:  quad(border, [0, 0, 0, 0], 1),
+                margin:  quad(border, edges('margin-', ''), 1),
+                width:   Math.round(rect.width),
+                height:  Math.round(rect.height),
+            },
+            visible: (
+                rect.width > 0 &&
+                rect.height > 0 &&
+                style.display !== 'none' &&
+                style.visibility !== 'hidden' &&
+                parseFloat(style.opacity) > 0
+            ),
+        };
+    });
+}"""
+
+# Serializes a node into a property on the node itself, so that it can be read back in chunks by
+# SOURCE_CHUNK_FN without ever transferring the whole string in one message.
+SOURCE_HOLD_FN = """function(){
+    var html;
+
+    if(this.nodeType === Node.DOCUMENT_NODE){
+        html = (this.doctype ? new XMLSerializer().serializeToString(this.doctype) : '');
+        html += (this.documentElement ? this.documentElement.outerHTML : '');
+    }else if(typeof(this.outerHTML) === 'string'){
+        html = this.outerHTML;
+    }else{
+        html = new XMLSerializer().serializeToString(this);
+    }
+
+    this.__webfriend_source__ = html;
+    return html.length;
+}"""
+
+SOURCE_CHUNK_FN = """function(start, size){
+    var html = this.__webfriend_source__;
+    var end = Math.min(start + size, html.length);
+
+    // never split a surrogate pair across two chunks
+    if(end < html.length && end - 1 > start){
+        var code = html.charCodeAt(end - 1);
+
+        if(code >= 0xD800 && code <= 0xDBFF){
+            end--;
+        }
+    }
+
+    return [html.slice(start, end), end];
+}"""
+
+SOURCE_RELEASE_FN = """function(){
+    delete this.__webfriend_source__;
+}"""
+
+# The checks performed before acting on an element, by action.
+ACTIONABILITY_CHECKS = {
+    'click': ['attached', 'visible', 'stable', 'enabled', 'receives_events'],
+    'field': ['attached', 'visible', 'enabled', 'editable'],
+    'focus': ['attached', 'visible'],
+}
+
+# Re-checks the element on every animation frame until all of the given checks pass (resolving
+# with {ok: true}) or the timeout elapses (resolving with {ok: false} and the last failed check.)
+ACTIONABILITY_FN = """function(checks, timeout){
+    var el = this;
+    var win = (el.ownerDocument && el.ownerDocument.defaultView) || window;
+    var deadline = Date.now() + timeout;
+    var last = null;
+    var scrolled = false;
+
+    var wants = function(check){
+        return (checks.indexOf(check) >= 0);
+    };
+
+    var failure = function(){
+        if(!el.isConnected){
+            return 'it is not attached to the document';
+        }
+
+        var rect = el.getBoundingClientRect();
+        var style = win.getComputedStyle(el);
+
+        if(wants('visible') && (
+            rect.width <= 0 || rect.height <= 0 || style.visibility !== 'visible'
+        )){
+            return 'it is not visible';
+        }
+
+        if(wants('stable')){
+            var box = [rect.left, rect.top, rect.width, rect.height].join(',');
+            var moved = (box !== last);
+
+            last = box;
+
+            if(moved){
+                return 'it is not stable';
+            }
+        }
+
+        if(wants('enabled') && (
+            (el.matches && el.matches(':disabled')) || el.getAttribute('aria-disabled') === 'true'
+        )){
+            return 'it is disabled';
+        }
+
+        if(wants('editable') && !el.isContentEditable && (
+            ['INPUT', 'TEXTAREA', 'SELECT'].indexOf(el.tagName) < 0 || el.readOnly
+        )){
+            return 'it is not editable';
+        }
+
+        if(wants('receives_events')){
+            var x = rect.left + (rect.width / 2);
+            var y = rect.top + (rect.height / 2);
+
+            if(x < 0 || y < 0 || x >= win.innerWidth || y >= win.innerHeight){
+                if(!scrolled){
+                    scrolled = true;
+                    last = null;
+                    el.scrollIntoView({block: 'center', inline: 'center'});
+                }
+
+                return 'it is outside of the viewport';
+            }
+
+            var root = (el.getRootNode && el.getRootNode().elementFromPoint ? el.getRootNode() : el.ownerDocument);
+            var hit = root.elementFromPoint(x, y);
+
+            if(!hit || (hit !== el && !el.contains(hit) && hit.control !== el)){
+                return 'it is covered by ' + (hit ? hit.outerHTML.slice(0, 100) : 'nothing');
+            }
+        }
+
+        return null;
+    };
+
+    return new Promise(function(resolve){
+        var check = function(){
+            var reason = failure();
+
+            if(reason === null){
+                resolve({ok: true});
+            }else if(Date.now() >= deadline){
+                resolve({ok: false, reason: reason});
+            }else if(win.document.hidden){
+                // animation frames don't fire in background pages
+                setTimeout(check, 16);
+            }else{
+                win.requestAnimationFrame(check);
+            }
+        };
+
+        check();
+    });
+}"""
+
+
+def script_value(reply):
+    """
+    Return the by-value result of a `Runtime.callFunctionOn` reply.
+
+    #### Raises
+    `webfriend.rpc.runtime.EmbeddedScriptError` if the function threw an exception.
+    """
+    if 'exceptionDetails' in reply.result:
+        exception = reply.result['exceptionDetails']
+
+        raise EmbeddedScriptError(exception.get('exception', {}).get(
+            'description',
+            exception.get('text', 'Unknown Error')
+        ))
+
+    return reply.result.get('result', {}).get('value')
+
 
 class NoSuchElement(Exception):
     pass
@@ -19,6 +345,40 @@ class InvalidElement(Exception):
 
 
 class DOMElement(object):
+    """
+    A local representation of a remote DOM node.
+
+    Elements are created in large numbers (every node received in a `DOM.setChildNodes` event
+    becomes one), so they are kept compact: instances use `__slots__`, and the attributes, text,
+    and children are only parsed out of the retained node definition the first time they are
+    accessed.
+
+    Elements that know their node's `backendNodeId` are interned by it (see `DOM.materialize`), so
+    a handle to a node stays the same object across queries, and can transparently re-resolve its
+    node ID after the frontend's view of the document has been reset.
+    """
+    __slots__ = (
+        '__weakref__',
+        'dom',
+        'definition',
+        '_id',
+        '_backend_id',
+        'parent_id',
+        'type',
+        'local_name',
+        'generation',
+        '_partial',
+        '_name',
+        '_value',
+        '_attributes',
+        '_child_ids',
+        '_child_nodes',
+        '_text',
+        '_box_model',
+        '_bounding_rect',
+        '_visible',
+    )
+
     def __init__(self, rpc, definition):
         self.dom = rpc
         self.populate(definition)
@@ -27,57 +387,170 @@ class DOMElement(object):
         if not isinstance(definition, dict):
             raise AttributeError("DOM Element definition must be a dict")
 
-        if 'nodeId' not in definition or definition['nodeId'] is None:
+        if definition.get('nodeId') is None:
             raise AttributeError("DOM Element definition must contain 'nodeId'")
 
-        if 'nodeName' not in definition:
-            self._partial = True
-        else:
-            self._partial = False
-
-        self.definition  = definition
-        self.id          = definition['nodeId']
-        self.parent_id   = definition.get('parentId')
-        self.type        = definition.get('nodeType')
-        self.local_name  = definition.get('localName')
-        self.attributes  = {}
-        self._box_model  = None
-        self._name       = definition.get('nodeName')
-        self._value      = definition.get('nodeValue')
-        self.child_nodes = []
-        self._text       = ''
-        self.child_ids   = set()
+        self.definition     = definition
+        self.generation     = self.dom.element_cache.generation
+        self._id            = definition['nodeId']
+        self._backend_id    = definition.get('backendNodeId')
+        self.parent_id      = definition.get('parentId')
+        self.type           = definition.get('nodeType')
+        self.local_name     = definition.get('localName')
+        self._partial       = ('nodeName' not in definition)
+        self._name          = definition.get('nodeName')
+        self._value         = definition.get('nodeValue')
+        self._attributes    = None
+        self._child_ids     = None
+        self._child_nodes   = None
+        self._text          = None
+        self._box_model     = None
         self._bounding_rect = None
+        self._visible       = None
 
-        # populate children
-        if len(definition.get('children', [])):
-            for child in definition['children']:
-                child_type = child.get('nodeType')
+        if self._backend_id is not None:
+            self.dom.intern(self)
 
-                if child_type == 1:
-                    self.child_ids.add(child['nodeId'])
+    @property
+    def id(self):
+        # handles that outlived a reset of the document's node IDs are re-resolved on use
+        if self._backend_id is not None and self.generation != self.dom.element_cache.generation:
+            self.rebind()
 
-                elif child_type == 3:
-                    self._text = child.get('nodeValue', '')
+        return self._id
 
-                else:
-                    self.child_nodes.append(DOMElement(self.dom, child))
+    @property
+    def backend_id(self):
+        """
+        The node's `backendNodeId`, which identifies it across resets of the document's node IDs.
+        If it was not sent with the node, it is retrieved (and the element interned) on first use.
+        """
+        if self._backend_id is None:
+            self._backend_id = self.dom.call('describeNode', nodeId=self._id).get(
+                'node', {}
+            ).get('backendNodeId')
+
+            if self._backend_id is not None:
+                self.dom.intern(self)
+
+        return self._backend_id
+
+    def rebind(self):
+        """
+        Obtain a current node ID for this element from its `backendNodeId`.
+
+        #### Raises
+        `webfriend.rpc.dom.NoSuchElement` if the node no longer exists.
+        """
+        # nodes can only be pushed to the frontend once it has requested the document
+        self.dom.document
+
+        node_ids = self.dom.push_node_by_backend_ids_to_frontend([self._backend_id]).get(
+            'nodeIds', []
+        )
+
+        if not len(node_ids) or not node_ids[0]:
+            raise NoSuchElement("Element {} (backend node {}) no longer exists".format(
+                self._id,
+                self._backend_id
+            ))
+
+        logging.debug('Rebinding element {} to node {}'.format(self._id, node_ids[0]))
+
+        return self.bind(node_ids[0])
+
+    def bind(self, node_id, backend_id=None):
+        """
+        Point this element at the given node ID (e.g.: after the document's node IDs were reset)
+        while keeping everything already known about it.  If the node IDs were reset, the node
+        IDs of its children are no longer valid, so its children are fetched again when next
+        needed (its text is kept.)
+        """
+        generation = self.dom.element_cache.generation
+
+        if generation != self.generation and 'children' in self.definition:
+            self.text
+            self.definition = dict(self.definition)
+            del self.definition['children']
+            self._child_ids = None
+            self._child_nodes = None
+
+        self._id = node_id
+        self.definition['nodeId'] = node_id
+        self.generation = generation
+
+        if backend_id is not None and self._backend_id is None:
+            self._backend_id = backend_id
+            self.dom.intern(self)
+
+        self.dom.element_cache.put(self)
+
+        return self._id
+
+    def _parse_children(self):
+        child_ids = set()
+        child_nodes = []
+
+        for child in self.definition.get('children', ()):
+            child_type = child.get('nodeType')
+
+            if child_type == 1:
+                child_ids.add(child['nodeId'])
+
+            elif child_type != 3:
+                child_nodes.append(child)
 
-        # populate attributes
-        if len(definition.get('attributes', [])):
-            attrgen = (a for a in definition['attributes'])
+        self._child_ids = child_ids
+        self._child_nodes = child_nodes
 
-            for name, value in [(n, attrgen.next()) for n in attrgen]:
-                self.attributes[name] = value
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            if self._partial:
+                # skeleton elements were never sent with their attributes, so fetch them once and
+                # start tracking the element so that attribute events keep them current
+                self.refresh_attributes()
+
+                if self.id not in self.dom.element_cache:
+                    self.dom.element_cache.put(self)
+            else:
+                pairs = self.definition.get('attributes', ())
+                self._attributes = dict(zip(pairs[0::2], pairs[1::2]))
+
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, value):
+        self._attributes = value
+
+    @property
+    def child_ids(self):
+        if self._child_ids is None:
+            self._parse_children()
+
+        return self._child_ids
+
+    @property
+    def child_nodes(self):
+        if self._child_nodes is None:
+            self._parse_children()
+
+        # non-element children are retained as definitions until they are first asked for
+        if len(self._child_nodes) and isinstance(self._child_nodes[0], dict):
+            self._child_nodes = [DOMElement(self.dom, c) for c in self._child_nodes]
+
+        return self._child_nodes
 
     def evaluate(self, script, return_by_value=False, own_properties=False, accessors_only=True):
-        remote_object = self.dom.call('resolveNode', nodeId=self.id).result.get('object', {})
-        object_id = remote_object['objectId']
+        runtime = self.dom.tab.runtime
+
+        # the node and any object the script returns live in one object group, which is released
+        # as a whole when the outermost group exits (even if something below raises)
+        with runtime.object_group():
+            object_id = self.dom.resolve_node(self.id)
 
-        # retrieve details via script injection
-        try:
             # call the function to retrieve runtime position info
-            result = self.dom.tab.runtime.call_function_on(
+            result = runtime.call_function_on(
                 object_id,
                 "function(){{ {} }}".format(script),
                 return_by_value=return_by_value,
@@ -91,14 +564,11 @@ class DOMElement(object):
 
             if result_id:
                 # retrieve the object that resulted from that call
-                properties = self.dom.tab.runtime.get_properties(
+                properties = runtime.get_properties(
                     result_id,
                     own_properties=own_properties,
                     accessors_only=accessors_only
                 )
-
-                # release that object
-                self.dom.tab.runtime.release_object(result_id)
             else:
                 properties = []
 
@@ -107,10 +577,6 @@ class DOMElement(object):
                 (p['name'], p.get('value', {}).get('value')) for p in properties if not p['name'].startswith('_')
             ])
 
-        finally:
-            if not return_by_value:
-                self.dom.tab.runtime.release_object(object_id)
-
     def click(self, ensure_target=True, scroll_to=True):
         if self.attributes.get('target') == '_blank':
             del self['target']
@@ -138,6 +604,14 @@ class DOMElement(object):
     def is_partial(self):
         return self._partial
 
+    @property
+    def is_stale(self):
+        """
+        Whether the document this element was retrieved from has since been replaced (in which
+        case its node ID is no longer valid.)
+        """
+        return (self.generation != self.dom.element_cache.generation)
+
     @property
     def name(self):
         return self._name
@@ -157,8 +631,95 @@ class DOMElement(object):
 
     @property
     def text(self):
+        if self._text is None:
+            text = ''
+
+            for child in self.definition.get('children', ()):
+                if child.get('nodeType') == 3:
+                    text = child.get('nodeValue', '')
+
+            self._text = text
+
         return self._text
 
+    @property
+    def child_count(self):
+        return self.definition.get('childNodeCount')
+
+    @property
+    def has_unfetched_children(self):
+        """
+        Whether this node may have children that have not been sent to us yet.
+        """
+        if 'children' in self.definition or self.type not in (None, 1, 9, 11):
+            return False
+
+        return (self.definition.get('childNodeCount') != 0)
+
+    def fetch_children(self, depth=None):
+        """
+        Request this element's children (and, if **depth** is greater than 1, their descendants)
+        from the browser.  See `DOM.fetch_children`.
+        """
+        self.dom.fetch_children(self, depth=depth)
+        return self
+
+    def set_children(self, children):
+        """
+        Replace this element's children with the given node definitions (e.g.: from a
+        `DOM.setChildNodes` event.)
+        """
+        self.definition['children'] = children
+        self.definition['childNodeCount'] = len(children)
+        self._child_ids = None
+        self._child_nodes = None
+        self._text = None
+
+    def apply_attribute(self, name, value=None, remove=False):
+        """
+        Apply an attribute change reported by DOM mutation events, without making any calls.
+        """
+        if self._attributes is None:
+            # nothing is known about a skeleton's attributes yet; they're fetched on first read
+            if self._partial:
+                return
+
+            self.attributes
+
+        if remove:
+            self._attributes.pop(name, None)
+        else:
+            self._attributes[name] = value
+
+    def update_text_node(self, node_id, value=None, remove=False):
+        """
+        Apply a change to one of this element's text node children, as reported by DOM mutation
+        events.
+        """
+        children = self.definition.get('children', [])
+
+        for i, child in enumerate(children):
+            if child.get('nodeId') == node_id:
+                if remove:
+                    del children[i]
+                else:
+                    child['nodeValue'] = value
+                break
+
+        self._text = None
+
+    def insert_text_node(self, definition, previous_node_id=None):
+        children = self.definition.setdefault('children', [])
+        index = 0
+
+        for i, child in enumerate(children):
+            if child.get('nodeId') == previous_node_id:
+                index = i + 1
+                break
+
+        children.insert(index, definition)
+        self._text = None
+
     @property
     def value(self):
         return self._value
@@ -175,6 +736,13 @@ class DOMElement(object):
     def outer_html(self, value):
         self.call('setOuterHTML', nodeId=self.id, outerHTML=value)
 
+    def write_outer_html(self, destination, **kwargs):
+        """
+        Write this element's HTML source to a file or stream without holding all of it in memory.
+        See `DOM.write_outer_html`.
+        """
+        return self.dom.write_outer_html(self.id, destination, **kwargs)
+
     def refresh_attributes(self):
         pairs = self.dom.call('getAttributes', nodeId=self.id).get('attributes', [])
         attrgen = (a for a in pairs)
@@ -189,13 +757,33 @@ class DOMElement(object):
 
     @property
     def children(self):
+        if self.has_unfetched_children:
+            self.dom.fetch_children(self)
+
         out = []
+        missing = set()
 
         for i in self.child_ids:
             el = self.dom.element(i)
 
             if el:
                 out.append(el)
+            else:
+                missing.add(i)
+
+        # children that were received nested inside of this element's definition (rather than in
+        # their own event) are materialized and cached the first time they are asked for
+        if len(missing):
+            for child in self.definition.get('children', ()):
+                if child.get('nodeId') in missing:
+                    missing.discard(child['nodeId'])
+                    child.setdefault('parentId', self.id)
+                    out.append(self.dom.element_cache.put(self.dom.materialize(child)))
+
+        # anything else we know is a child of this element but have no definition for is returned
+        # as a skeleton rather than dropped
+        if len(missing):
+            out.extend(self.dom.elements_for(sorted(missing)))
 
         return out
 
@@ -207,12 +795,40 @@ class DOMElement(object):
         self._bounding_rect = None
         return self.bounds
 
+    def recheck_visible(self):
+        self._visible = None
+        return self.visible
+
+    def set_geometry(self, geometry):
+        self._bounding_rect = geometry['rect']
+        self._box_model = geometry['box']
+        self._visible = geometry['visible']
+
+    def measure(self):
+        """
+        Retrieve this element's geometry (see `DOM.geometry`).  Documents are measured by their
+        document element.
+
+        #### Raises
+        `ValueError` if this node cannot be measured (e.g.: it is a text or comment node.)
+        """
+        if self.dom.geometry([self]).get(self.id) is None:
+            raise ValueError('Node {} is not an element or document, and cannot be measured'.format(
+                self.id
+            ))
+
     @property
     def bounds(self):
         if self._bounding_rect is None:
-            self._bounding_rect = self.evaluate("return this.getBoundingClientRect()")
+            self.measure()
         return self._bounding_rect
 
+    @property
+    def visible(self):
+        if self._visible is None:
+            self.measure()
+        return self._visible
+
     @property
     def box(self):
         if self._box_model is None:
@@ -276,6 +892,12 @@ class DOMElement(object):
     def focus(self):
         self.dom.focus(self.id)
 
+    def wait_for_actionable(self, action='click', timeout=10000):
+        """
+        Wait for this element to be ready for the given action.  See `DOM.wait_for_actionable`.
+        """
+        return self.dom.wait_for_actionable(self.id, action=action, timeout=timeout)
+
     def __getitem__(self, key):
         return self.attributes[key]
 
@@ -309,9 +931,9 @@ class DOMElement(object):
                     element_name
                 )
             else:
-                return '{} id={}'.format(self.name, self.id)
+                return '{} id={}'.format(self.name, self._id)
         else:
-            parts = ['node={}'.format(self.id)]
+            parts = ['node={}'.format(self._id)]
 
             if self.name:
                 parts.append('name={}'.format(self.name))
@@ -324,15 +946,43 @@ class DOMElement(object):
 
 class DOM(Base):
     domain = 'DOM'
+    element_cache_size = ElementCache.default_max_size
+    query_cache_size = QueryCache.default_max_size
+    query_cache_max_age = QueryCache.default_max_age
+    observe_mutations = True
+    mutation_wait_slack = 1000
+    child_fetch_depth = 1
+    prefetch_depth = 3
+    prefetch_window = 1.0
+    source_chunk_size = 1048576
     _you_never_forget_your_first_root_element = None
     _root_element = None
-    _elements = {}
+
+    def __init__(self, tab):
+        super(DOM, self).__init__(tab)
+        self.element_cache = ElementCache(max_size=self.element_cache_size)
+        self.query_cache = QueryCache(
+            max_size=self.query_cache_size,
+            max_age=self.query_cache_max_age
+        )
+        self.version = 0
+        self._text_owners = {}
+        self._frame_roots = {}
+        self._interned = WeakValueDictionary()
+        self._last_fetch = 0
 
     def initialize(self):
         self.on('setChildNodes', self.on_child_nodes)
         self.on('childNodeInserted', self.on_child_inserted)
         self.on('childNodeRemoved', self.on_child_removed)
+        self.on('attributeModified', self.on_attribute_modified)
+        self.on('attributeRemoved', self.on_attribute_removed)
+        self.on('characterDataModified', self.on_character_data_modified)
+        self.on('childNodeCountUpdated', self.on_child_node_count_updated)
+        self.on('documentUpdated', self.invalidate)
         self.tab.page.on('frameClearedScheduledNavigation', self.reset)
+        self.tab.page.on('frameNavigated', self.on_frame_navigated)
+        self.tab.page.on('frameDetached', self.on_frame_detached)
 
     def reset(self, *args, **kwargs):
         """
@@ -344,6 +994,30 @@ class DOM(Base):
         if kwargs.get('clear_initial_root', True):
             self._you_never_forget_your_first_root_element = None
 
+    def invalidate(self, *args, **kwargs):
+        """
+        Discards all locally-cached elements and the current root element.  This is called
+        whenever the remote document is replaced, since all previously-known node IDs become
+        invalid at that point.
+        """
+        generation = self.element_cache.invalidate()
+        self.query_cache.clear()
+        self._text_owners = {}
+        self._frame_roots = {}
+        self.reset()
+
+        logging.debug('DOM element cache invalidated, now at generation {}'.format(generation))
+
+    @property
+    def cache_stats(self):
+        """
+        Return a `dict` describing the size and hit rate of the local element cache.  The
+        statistics for the selector query cache are under the _queries_ key.
+        """
+        stats = self.element_cache.as_dict()
+        stats['queries'] = self.query_cache.as_dict()
+        return stats
+
     def clear_requests(self, *args, **kwargs):
         self.tab.reset_network_request_cache()
 
@@ -357,10 +1031,129 @@ class DOM(Base):
 
             The DOM element id.
         """
-        if id in self._elements:
+        if id in self.element_cache:
             return True
         return False
 
+    def intern(self, element):
+        """
+        Register the given element as the canonical handle for its `backendNodeId`.  Handles are
+        held weakly, so interning never keeps an otherwise-unused element alive.
+        """
+        self._interned[element._backend_id] = element
+        return element
+
+    def materialize(self, definition):
+        """
+        Return the element for the given node definition.  If an element for the same node
+        already exists (either cached under the same node ID, or interned under the same
+        `backendNodeId`) it is updated in place and returned, so that existing handles to the node
+        remain valid and current.  Definitions that only identify the node (without a _nodeName_)
+        just update the element's node ID, keeping the rest of what is known about it.
+        """
+        element = self.element_cache.peek(definition['nodeId'])
+
+        if element is None and definition.get('backendNodeId') is not None:
+            element = self._interned.get(definition['backendNodeId'])
+
+        if element is None:
+            return DOMElement(self, definition)
+
+        # a bare reference to a node we already know (e.g.: from pushing it by its backend ID)
+        # only moves the element to the node's current ID
+        if 'nodeName' not in definition:
+            element.bind(definition['nodeId'], backend_id=definition.get('backendNodeId'))
+            return element
+
+        element.populate(definition)
+        return element
+
+    def elements_for(self, node_ids):
+        """
+        Return elements for the given node IDs (e.g.: from a query reply).  Elements that are not
+        already cached are cached as skeletons without contacting the browser; their
+        `backendNodeId` (and so their interned identity) is only retrieved once it is first
+        needed (see `webfriend.rpc.dom.DOMElement.backend_id`.)
+
+        Nodes pushed to us by a query normally arrive (with their `backendNodeId`) in
+        `DOM.setChildNodes` events before the reply does, so misses here are uncommon.
+
+        #### Returns
+        A `list` of `webfriend.rpc.dom.DOMElement`, in the same order as **node_ids**.
+        """
+        elements = []
+
+        for node_id in node_ids:
+            element = self.element_cache.get(node_id)
+
+            if element is None:
+                element = self.element_cache.put(self.materialize({
+                    'nodeId': node_id,
+                }))
+
+            elements.append(element)
+
+        return elements
+
+    def elements_for_backend_ids(self, backend_node_ids):
+        """
+        Return elements for the given backend node IDs (e.g.: from a snapshot).  Nodes that already
+        have a current, interned handle are returned without contacting the browser; the rest are
+        pushed to the frontend in a single call.
+
+        #### Returns
+        A `list` of `webfriend.rpc.dom.DOMElement`, in the same order as **backend_node_ids**.
+        Nodes that no longer exist are omitted.
+        """
+        generation = self.element_cache.generation
+        elements = {}
+        missing = []
+
+        for backend_node_id in backend_node_ids:
+            element = self._interned.get(backend_node_id)
+
+            if element is not None and element.generation == generation:
+                elements[backend_node_id] = element
+            elif backend_node_id not in missing:
+                missing.append(backend_node_id)
+
+        if len(missing):
+            # nodes can only be pushed to the frontend once it has requested the document
+            self.document
+
+            node_ids = self.push_node_by_backend_ids_to_frontend(missing).get('nodeIds', [])
+
+            for backend_node_id, node_id in zip(missing, node_ids):
+                if not node_id:
+                    continue
+
+                elements[backend_node_id] = self.element_cache.put(self.materialize({
+                    'nodeId':        node_id,
+                    'backendNodeId': backend_node_id,
+                }))
+
+        return [elements[i] for i in backend_node_ids if i in elements]
+
+    @classmethod
+    def resolved_nodes(cls, selector):
+        """
+        If the given selector is already an element, a list of elements, or the result of a
+        previous selection (a `dict` with a _nodes_ key), return the `list` of elements it
+        refers to.  Otherwise return `None`.
+        """
+        if isinstance(selector, DOMElement):
+            return [selector]
+
+        elif isinstance(selector, dict) and 'nodes' in selector:
+            return list(selector['nodes'])
+
+        elif isinstance(selector, (list, tuple)) and len(selector) and all([
+            isinstance(n, DOMElement) for n in selector
+        ]):
+            return list(selector)
+
+        return None
+
     def element(self, id, fallback=None):
         """
         Return the given ID as a `webfriend.rpc.dom.DOMElement`, or `None` if we have not
@@ -379,7 +1172,7 @@ class DOM(Base):
         #### Returns
         - `webfriend.rpc.dom.DOMElement` if the element is known, **fallback** if not.
         """
-        return self._elements.get(id, fallback)
+        return self.element_cache.get(id, fallback)
 
     def element_at(self, x, y, shadow=False):
         """
@@ -416,103 +1209,612 @@ class DOM(Base):
 
         return None
 
-    def print_node(self, node_id=None, level=0, indent=4):
+    def extract(self, spec, node_id=None, context_id=None):
         """
-        Print details about the given element to the debug log.
-        """
-        if node_id is None:
-            node_id = self.root.id
+        Extract structured data from the page in a single script evaluation.
 
-        node = self.element(node_id)
+        - **spec** (`str`, `dict`):
 
-        if node is not None:
-            logging.debug('TREE: {}{}'.format((' ' * indent * level), node))
+            A field specification describing what to extract; see `webfriend.utils.extract` for
+            the format.
 
-            for child in node.children:
-                self.print_node(child.id, level=level + 1)
+        - **node_id** (`int`, optional):
 
-    @property
-    def root(self):
-        """
-        Returns the root DOM element for the current document.
+            If given, all selectors in the spec are evaluated relative to this node instead of
+            the document.
+
+        - **context_id** (`int`, optional):
+
+            If given (and **node_id** is not), extract from the document of this execution
+            context (e.g.: that of a frame; see `webfriend.rpc.Runtime.context_for`.)
 
         #### Returns
-        The `webfriend.rpc.dom.DOMElement` representing the root element.
+        The extracted data, in the shape described by **spec**.
         """
-        if self._root_element is None:
-            self.reset()
+        spec = compile_spec(spec)
 
-            self._root_element = DOMElement(
-                self,
-                self.call('getDocument', depth=1, pierce=True).get('root')
+        if node_id is None:
+            return self.tab.runtime.run_script(
+                EXTRACT_SCRIPT,
+                data=spec,
+                return_by_value=True,
+                context_id=context_id
             )
 
-            # keep track of the VERY first root element encountered, so that if we switch roots
-            # for traversing frames, we can always come back to this one
-            if self._you_never_forget_your_first_root_element is None:
-                self._you_never_forget_your_first_root_element = self._root_element
+        return self.call_function_on(node_id, EXTRACT_NODE_FN, arguments=[spec])
+
+    def fingerprint(
+        self,
+        selector=None,
+        node_id=None,
+        depth=3,
+        exclude=None,
+        attributes=True,
+        normalize_whitespace=True
+    ):
+        """
+        Compute hash-tree fingerprints of the elements matching the given selector (or of the
+        document element) in a single script evaluation; see `webfriend.utils.fingerprint`.
 
-            self._elements[self._root_element.id] = self._root_element
+        #### Arguments
 
-        return self._root_element
+        - **selector** (`str`, optional):
 
-    @property
-    def scroll_width(self):
-        return self.root.evaluate(
-            "return document.documentElement.scrollWidth",
-            return_by_value=True
-        ).get('value', None)
+            A CSS selector for the element(s) to fingerprint.  If omitted, the document element
+            is used.
 
-    @property
-    def scroll_height(self):
-        return self.root.evaluate(
-            "return document.documentElement.scrollHeight",
-            return_by_value=True
-        ).get('value', None)
+        - **node_id** (`int`, optional):
 
-    @property
-    def frames(self):
-        return self.query_all('frame')
+            If given, **selector** is evaluated relative to this node (and if **selector** is
+            omitted, this node is fingerprinted.)
 
-    def root_to(self, selector):
-        elements = self.select_nodes(selector, wait_for_match=True)
+        - **depth** (`int`):
 
-        if elements:
-            element = self.ensure_unique_element(selector, elements['nodes'])
+            How many levels of child hashes to return below each root.
 
-            subdoc = element.content_document
+        - **exclude** (`str`, optional):
 
-            if subdoc is not None:
-                # reset, we've got a document, but leave the top-level document in place
-                # so we can go back to it
-                self.reset(clear_initial_root=False)
+            A CSS selector for elements to leave out of the fingerprint entirely (e.g.: ads or
+            clocks that change on every load.)
 
-                self.call('requestChildNodes', nodeId=subdoc.id)
-                self._root_element = subdoc
-                logging.debug('DOM root is now {}'.format(self.root))
-                return self.root
-            else:
-                raise InvalidElement("Element does not contain a nested document")
+        - **attributes** (`bool`):
 
-        raise NoSuchElement("No elements matched the query selector '{}'".format(selector))
+            Whether attribute values contribute to the hashes.
 
-    def root_to_top(self):
-        if self._you_never_forget_your_first_root_element:
-            self._root_element = self._you_never_forget_your_first_root_element
+        - **normalize_whitespace** (`bool`):
 
-        logging.debug('DOM root is now {}'.format(self.root))
-        return self.root
+            Whether to collapse runs of whitespace in text (and ignore whitespace-only text)
+            before hashing.
 
-    def remove_node(self, node_id):
+        #### Returns
+        A fingerprint `dict` with the keys _selector_, _depth_, and _roots_.
         """
-        Remove a specific node (and all children) from the DOM.
-
-        - **id** (`str`):
+        options = {
+            'selector':             selector,
+            'depth':                depth,
+            'exclude':              exclude,
+            'attributes':           attributes,
+            'normalize_whitespace': normalize_whitespace,
+        }
+
+        if node_id is None:
+            roots = self.tab.runtime.evaluate(
+                fingerprint.fingerprint_expression(**options),
+                wrapper_fn=False,
+                return_by_value=True
+            )
+        else:
+            roots = self.call_function_on(
+                node_id,
+                'function(spec){{ return ({})(spec, this); }}'.format(fingerprint.FINGERPRINT_FN),
+                arguments=[fingerprint.compile_spec(**options)]
+            )
+
+        return {
+            'selector': selector,
+            'depth':    depth,
+            'roots':    (roots or []),
+        }
+
+    def resolve_node(self, node_id, object_group=None):
+        """
+        Resolve the given node into a remote Javascript object.  The object is allocated in the
+        given object group, or the active `webfriend.rpc.Runtime.object_group` if there is one.
+
+        #### Returns
+        The remote object ID.
+        """
+        runtime = self.tab.runtime
+
+        if object_group is None:
+            object_group = runtime.current_object_group
+
+        params = {
+            'nodeId': node_id,
+        }
+
+        if object_group is not None:
+            params['objectGroup'] = runtime.allocating(object_group)
+
+        return runtime.track(
+            self.call('resolveNode', **params).result['object']['objectId'],
+            object_group,
+            description='node {}'.format(node_id)
+        )
+
+    def call_function_on(
+        self,
+        node_id,
+        function,
+        arguments=None,
+        await_promise=None,
+        reply_timeout=None
+    ):
+        """
+        Call the given Javascript function (given as source) with `this` bound to the given node,
+        and return its result by value.
+
+        #### Raises
+        `webfriend.rpc.runtime.EmbeddedScriptError` if the function throws an exception (or the
+        promise it returns is rejected.)
+        """
+        with self.tab.runtime.object_group():
+            reply = self.tab.runtime.call_function_on(
+                self.resolve_node(node_id),
+                function,
+                arguments=arguments,
+                return_by_value=True,
+                await_promise=await_promise,
+                reply_timeout=reply_timeout
+            )
+
+        return script_value(reply)
+
+    def write_outer_html(
+        self,
+        node_id,
+        destination,
+        gzip=False,
+        chunk_size=None,
+        reply_timeout=None
+    ):
+        """
+        Write the HTML source of the given node to a file or stream.  The source is serialized once
+        in the page and read back in chunks, so that neither a single message nor this process
+        ever holds the whole document at once.
+
+        #### Arguments
+
+        - **node_id** (`int`):
+
+            The node to retrieve the source of.  Document nodes are written with their doctype.
+
+        - **destination** (`str`, _file-like object_):
+
+            A filesystem path, or a file-like object opened for writing bytes.  File-like objects
+            are not closed.
+
+        - **gzip** (`bool`):
+
+            Whether to gzip-compress the output.
+
+        - **chunk_size** (`int`, optional):
+
+            The maximum number of characters to read from the page in each call; defaults to
+            `DOM.source_chunk_size`.
+
+        - **reply_timeout** (`int`, optional):
+
+            The timeout (in milliseconds) for each call.
+
+        #### Returns
+        The number of (uncompressed) bytes of UTF-8 encoded HTML that were written.
+        """
+        if chunk_size is None:
+            chunk_size = self.source_chunk_size
+
+        if chunk_size < 2:
+            raise ValueError("'chunk_size' must be at least 2")
+
+        if isinstance(destination, basestring):
+            stream = open(destination, 'wb')
+        else:
+            stream = destination
+
+        output = stream
+
+        if gzip:
+            output = GzipFile(fileobj=stream, mode='wb')
+
+        runtime = self.tab.runtime
+        size = 0
+
+        try:
+            with runtime.object_group():
+                object_id = self.resolve_node(node_id)
+
+                def call(function, arguments=None):
+                    return script_value(runtime.call_function_on(
+                        object_id,
+                        function,
+                        arguments=arguments,
+                        return_by_value=True,
+                        reply_timeout=reply_timeout
+                    ))
+
+                length = call(SOURCE_HOLD_FN)
+                start = 0
+
+                try:
+                    while start < length:
+                        data, end = call(SOURCE_CHUNK_FN, [start, chunk_size])
+
+                        if end <= start:
+                            raise EmbeddedScriptError(
+                                'Source of node {} changed while it was being read'.format(node_id)
+                            )
+
+                        data = data.encode('utf-8')
+                        output.write(data)
+                        size += len(data)
+                        start = end
+                finally:
+                    try:
+                        call(SOURCE_RELEASE_FN)
+                    except (exceptions.ProtocolError, exceptions.TimeoutError) as e:
+                        logging.debug('Failed to release source of node {}: {}'.format(node_id, e))
+        finally:
+            if output is not stream:
+                output.close()
+
+            if stream is not destination:
+                stream.close()
+
+        return size
+
+    def print_node(self, node_id=None, level=0, indent=4):
+        """
+        Print details about the given element to the debug log.
+        """
+        if node_id is None:
+            node_id = self.root.id
+
+        node = self.element(node_id)
+
+        if node is not None:
+            logging.debug('TREE: {}{}'.format((' ' * indent * level), node))
+
+            for child in node.children:
+                self.print_node(child.id, level=level + 1)
+
+    @property
+    def root(self):
+        """
+        Returns the root DOM element for the current document.
+
+        #### Returns
+        The `webfriend.rpc.dom.DOMElement` representing the root element.
+        """
+        if self._root_element is None:
+            # requesting the document invalidates all node IDs the frontend knew about
+            self.invalidate()
+
+            self._root_element = self.materialize(
+                self.call('getDocument', depth=1, pierce=True).get('root')
+            )
+
+            self.index_text_nodes(self._root_element.definition)
+
+            # keep track of the VERY first root element encountered, so that if we switch roots
+            # for traversing frames, we can always come back to this one
+            if self._you_never_forget_your_first_root_element is None:
+                self._you_never_forget_your_first_root_element = self._root_element
+
+            self.element_cache.put(self._root_element)
+
+        return self._root_element
+
+    @property
+    def scroll_width(self):
+        return self.root.evaluate(
+            "return document.documentElement.scrollWidth",
+            return_by_value=True
+        ).get('value', None)
+
+    @property
+    def scroll_height(self):
+        return self.root.evaluate(
+            "return document.documentElement.scrollHeight",
+            return_by_value=True
+        ).get('value', None)
+
+    @property
+    def frames(self):
+        return self.query_all('frame')
+
+    @property
+    def document(self):
+        """
+        The top-level document, regardless of whether `root_to` has been used to switch the root
+        into a frame.
+        """
+        root = self.root
+        return (self._you_never_forget_your_first_root_element or root)
+
+    def frame_root(self, frame_id):
+        """
+        Return the document element of the given frame.  See `frame_roots`.
+        """
+        return self.frame_roots([frame_id]).get(frame_id)
+
+    def frame_roots(self, frame_ids=None):
+        """
+        Return the document element for each of the given frames (or all frames in the page).
+        Frame documents are located once (for all uncached frames together, in three round trips)
+        and cached until the frame navigates, is detached, or the page is replaced.
+
+        Frames whose documents cannot be reached from this tab (e.g.: out-of-process frames) are
+        omitted.
+
+        #### Returns
+        A `dict` of frame ID to `webfriend.rpc.dom.DOMElement`.
+        """
+        page = self.tab.page
+
+        if frame_ids is None:
+            frame_ids = [f['id'] for f in page.frames]
+
+        top_frame_id = page.top_frame_id
+        roots = {}
+        missing = []
+
+        for frame_id in frame_ids:
+            if frame_id == top_frame_id:
+                roots[frame_id] = self.document
+
+            elif frame_id in self._frame_roots:
+                roots[frame_id] = self._frame_roots[frame_id]
+
+            else:
+                missing.append(frame_id)
+
+        if len(missing):
+            # nodes can only be pushed to us once the document has been requested
+            self.document
+
+            owners = self.call_many([
+                ('getFrameOwner', {
+                    'frameId': frame_id,
+                }) for frame_id in missing
+            ], raise_errors=False)
+
+            found = [
+                (frame_id, owner.get('backendNodeId')) for frame_id, owner in zip(missing, owners)
+                if not isinstance(owner, Exception)
+            ]
+
+            described = self.call_many([
+                ('describeNode', {
+                    'backendNodeId': owner_id,
+                    'depth':         1,
+                    'pierce':        True,
+                }) for _, owner_id in found
+            ], raise_errors=False)
+
+            documents = []
+
+            for (frame_id, _), reply in zip(found, described):
+                if isinstance(reply, Exception):
+                    continue
+
+                backend_node_id = reply.get('node', {}).get('contentDocument', {}).get(
+                    'backendNodeId'
+                )
+
+                if backend_node_id:
+                    documents.append((frame_id, backend_node_id))
+                else:
+                    logging.debug('Frame {} has no reachable document'.format(frame_id))
+
+            if len(documents):
+                node_ids = self.push_node_by_backend_ids_to_frontend(
+                    [document_id for _, document_id in documents]
+                ).get('nodeIds', [])
+
+                for (frame_id, document_id), node_id in zip(documents, node_ids):
+                    if not node_id:
+                        continue
+
+                    element = self.element_cache.put(self.materialize({
+                        'nodeId':        node_id,
+                        'backendNodeId': document_id,
+                        'nodeType':      9,
+                        'nodeName':      '#document',
+                        'frameId':       frame_id,
+                    }))
+
+                    self._frame_roots[frame_id] = roots[frame_id] = element
+
+        return roots
+
+    def query_all_frames(self, selector, frame_ids=None, reply_timeout=None):
+        """
+        Query every frame in the page (or just the given frames) for elements matching the given
+        selector.  All frames are queried together in a single round trip.
+
+        #### Arguments
+
+        - **selector** (`str`):
+
+            The CSS-style selector to query each frame for.
+
+        - **frame_ids** (`list`, optional):
+
+            The IDs of the frames to query.  Defaults to all frames.
+
+        - **reply_timeout** (`int`, optional):
+
+            How long (in milliseconds) to wait for all frames to reply.
+
+        #### Returns
+        A `list` of `dict` objects (one per frame with matches, in frame tree order) with the keys
+        _frame_id_, _name_, _url_, _selector_, _count_, and _nodes_ (a `list` of
+        `webfriend.rpc.dom.DOMElement`).
+        """
+        roots = self.frame_roots(frame_ids)
+        frames = [f for f in self.tab.page.frames if f['id'] in roots]
+
+        replies = self.call_many([
+            ('querySelectorAll', {
+                'nodeId':   roots[frame['id']].id,
+                'selector': self.prepare_selector(selector),
+            }) for frame in frames
+        ], reply_timeout=reply_timeout, raise_errors=False)
+
+        results = []
+        replies = [
+            (r if isinstance(r, Exception) else r.get('nodeIds', [])) for r in replies
+        ]
+        elements = self.elements_for([
+            i for r in replies if not isinstance(r, Exception) for i in r
+        ])
+
+        for frame, reply in zip(frames, replies):
+            if isinstance(reply, Exception):
+                logging.debug('Failed to query frame {}: {}'.format(frame['id'], reply))
+                continue
+
+            nodes = elements[0:len(reply)]
+            elements = elements[len(reply):]
+
+            if len(nodes):
+                results.append({
+                    'frame_id': frame['id'],
+                    'name':     frame['name'],
+                    'url':      frame['url'],
+                    'selector': selector,
+                    'count':    len(nodes),
+                    'nodes':    nodes,
+                })
+
+        return results
+
+    def root_to(self, selector):
+        elements = self.select_nodes(selector, wait_for_match=True)
+
+        if elements:
+            element = self.ensure_unique_element(selector, elements['nodes'])
+
+            subdoc = element.content_document
+
+            if subdoc is not None:
+                # reset, we've got a document, but leave the top-level document in place
+                # so we can go back to it
+                self.reset(clear_initial_root=False)
+
+                self.call('requestChildNodes', nodeId=subdoc.id)
+                self._root_element = subdoc
+                logging.debug('DOM root is now {}'.format(self.root))
+                return self.root
+            else:
+                raise InvalidElement("Element does not contain a nested document")
+
+        raise NoSuchElement("No elements matched the query selector '{}'".format(selector))
+
+    def root_to_top(self):
+        if self._you_never_forget_your_first_root_element:
+            self._root_element = self._you_never_forget_your_first_root_element
+
+        logging.debug('DOM root is now {}'.format(self.root))
+        return self.root
+
+    def remove_node(self, node_id):
+        """
+        Remove a specific node (and all children) from the DOM.
+
+        - **id** (`str`):
 
             The DOM element id.
         """
         self.call('removeNode', nodeId=node_id)
 
+    def wait_for_actionable(self, node_id, action='click', checks=None, timeout=10000):
+        """
+        Wait until the given element can be acted upon.  The element is re-checked in the page on
+        every animation frame, so this returns as soon as the element is ready.
+
+        #### Arguments
+
+        - **node_id** (`int`):
+
+            The element to check.
+
+        - **action** (`str`):
+
+            The action about to be performed (one of `click`, `field`, or `focus`), which
+            determines the default checks:
+
+            - `click`: _attached_, _visible_, _stable_, _enabled_, and _receives_events_.
+            - `field`: _attached_, _visible_, _enabled_, and _editable_.
+            - `focus`: _attached_ and _visible_.
+
+        - **checks** (`list`, optional):
+
+            The checks to perform, overriding those for **action**.  _attached_: the element is
+            in the document; _visible_: it has a non-empty box and is not hidden; _stable_: its
+            box did not change between two animation frames; _enabled_: it is not disabled;
+            _editable_: it is a form field that is not read-only (or is content-editable);
+            _receives_events_: it is the element that would receive a click at its center (the
+            element is scrolled into view if needed.)
+
+        - **timeout** (`int`):
+
+            The maximum amount of time, in milliseconds, to wait.
+
+        #### Returns
+        `True` once the element is actionable.
+
+        #### Raises
+        - `webfriend.exceptions.TimeoutError` if the element was not actionable in time.
+        - `ValueError` if an unknown action or check is given.
+        """
+        if checks is None:
+            if action not in ACTIONABILITY_CHECKS:
+                raise ValueError("Unknown action '{}', must be one of: {}".format(
+                    action,
+                    ', '.join(sorted(ACTIONABILITY_CHECKS.keys()))
+                ))
+
+            checks = ACTIONABILITY_CHECKS[action]
+
+        known = set([c for v in ACTIONABILITY_CHECKS.values() for c in v])
+        unknown = set(checks) - known
+
+        if len(unknown):
+            raise ValueError("Unknown actionability check(s): {}".format(
+                ', '.join(sorted(unknown))
+            ))
+
+        result = self.call_function_on(
+            node_id,
+            ACTIONABILITY_FN,
+            arguments=[list(checks), timeout],
+            await_promise=True,
+            reply_timeout=(timeout + self.mutation_wait_slack)
+        )
+
+        if not result or not result.get('ok'):
+            raise exceptions.TimeoutError(
+                "Element {} was not ready to {} within {}ms: {}".format(
+                    node_id,
+                    action,
+                    timeout,
+                    (result or {}).get('reason', 'unknown reason')
+                )
+            )
+
+        return True
+
     def focus(self, node_id):
         """
         Set the focus on a specific element.
@@ -577,11 +1879,9 @@ class DOM(Base):
         # if we don't have a cached copy, then return a skeleton instance so that we can still
         # perform operations on the returned element
         #
-        return self.element(matched_node_id, DOMElement(self, {
-            'nodeId': matched_node_id,
-        }))
+        return self.elements_for([matched_node_id])[0]
 
-    def query_all(self, selector, node_id=None, reply_timeout=None):
+    def query_all(self, selector, node_id=None, reply_timeout=None, use_cache=False):
         """
         Query for all matching elements. Matched elements will be populated in the local DOM element
         cache for rapid retrieval in subsequent calls.
@@ -601,22 +1901,46 @@ class DOM(Base):
             The timeout (in milliseconds) before the query raises a
             `webfriend.exceptions.TimeoutError`.
 
+        - **use_cache** (`bool`):
+
+            Whether the result may be served from (and stored in) the query cache, which is
+            cleared whenever the document is observed to change.  Since the browser only reports
+            changes to nodes it has already sent us, changes elsewhere (e.g.: beneath nodes only
+            ever returned by a query) go unnoticed, and a cached result may be stale for up to
+            the cache's _max_age_ (10 seconds by default.)  Only use this where a slightly stale
+            result is acceptable.
+
         #### Returns
         A `list` of matching `webfriend.rpc.dom.DOMElement` (zero or more).
 
         #### Raises
         - `webfriend.exceptions.TimeoutError` if the query times out.
         """
+        nodes = self.resolved_nodes(selector)
+
+        if nodes is not None:
+            return nodes
+
         if node_id is None:
             node_id = self.root.id
 
-        # perform the call
-        node_ids = self.call(
-            'querySelectorAll',
-            reply_timeout=reply_timeout,
-            selector=self.prepare_selector(selector),
-            nodeId=node_id
-        ).get('nodeIds', [])
+        node_ids = None
+        epoch = self.query_cache.epoch
+
+        if use_cache:
+            node_ids = self.query_cache.get(selector, node_id)
+
+        if node_ids is None:
+            # perform the call
+            node_ids = self.call(
+                'querySelectorAll',
+                reply_timeout=reply_timeout,
+                selector=self.prepare_selector(selector),
+                nodeId=node_id
+            ).get('nodeIds', [])
+
+            if use_cache:
+                self.query_cache.put(selector, node_id, node_ids, epoch=epoch)
 
         # we try to retrieve the element from the local element cache because they typically
         # come in as a series of events before the querySelector reply comes back, meaning that
@@ -625,65 +1949,306 @@ class DOM(Base):
         # if we don't have a cached copy, then return a skeleton instance so that we can still
         # perform operations on the returned element
         #
-        return [
-            self.element(i, DOMElement(self, {
-                'nodeId': i,
-            })) for i in node_ids
+        return self.elements_for(node_ids)
+
+    def query_many(self, selectors, node_id=None, reply_timeout=None, use_cache=False):
+        """
+        Perform several `query_all` calls in a single round trip.  Selectors that already refer to
+        elements (see `resolved_nodes`) are passed through, and (if **use_cache** is set)
+        selectors whose results are in the query cache are answered from it; only the rest are
+        queried.  See `query_all` for the staleness this can introduce.
+
+        #### Returns
+        A `list` containing a `list` of matching `webfriend.rpc.dom.DOMElement` for each selector,
+        in the same order as **selectors**.
+        """
+        resolved = [self.resolved_nodes(selector) for selector in selectors]
+        node_ids = [None] * len(selectors)
+        pending = []
+
+        if None in resolved and node_id is None:
+            node_id = self.root.id
+
+        epoch = self.query_cache.epoch
+
+        for i, (selector, nodes) in enumerate(zip(selectors, resolved)):
+            if nodes is not None:
+                continue
+
+            if use_cache:
+                node_ids[i] = self.query_cache.get(selector, node_id)
+
+            if node_ids[i] is None:
+                pending.append(i)
+
+        if len(pending):
+            replies = self.call_many([
+                ('querySelectorAll', {
+                    'nodeId':   node_id,
+                    'selector': self.prepare_selector(selectors[i]),
+                }) for i in pending
+            ], reply_timeout=reply_timeout)
+
+            for i, reply in zip(pending, replies):
+                node_ids[i] = reply.get('nodeIds', [])
+
+                if use_cache:
+                    self.query_cache.put(selectors[i], node_id, node_ids[i], epoch=epoch)
+
+        results = []
+        elements = self.elements_for([i for ids in node_ids if ids for i in ids])
+
+        for nodes, ids in zip(resolved, node_ids):
+            if nodes is None:
+                nodes = elements[0:len(ids)]
+                elements = elements[len(ids):]
+
+            results.append(nodes)
+
+        return results
+
+    def geometry(self, nodes):
+        """
+        Measure many elements at once.  The bounding rectangle, box model, and visibility of every
+        given node is retrieved with a single injected function call, and stored on the
+        corresponding `webfriend.rpc.dom.DOMElement` so that subsequent reads of *bounds*, *box*,
+        *width*, *height*, etc. don't make any further calls.
+
+        #### Arguments
+
+        - **nodes** (`list`):
+
+            The `webfriend.rpc.dom.DOMElement` instances or node IDs to measure.
+
+        #### Returns
+        A `dict` of node ID to a `dict` containing the element's *rect*, *box*, and *visible*
+        flag (or `None` for nodes that are neither elements nor documents.)  Documents are
+        measured by their document element.
+        """
+        elements = [
+            (n if isinstance(n, DOMElement) else self.elements_for([n])[0]) for n in nodes
         ]
 
-    def xpath(self, expression, wait_for_match=True, timeout=10000, interval=250):
+        if not len(elements):
+            return {}
+
+        runtime = self.tab.runtime
+
+        with runtime.object_group() as group:
+            runtime.allocating(group)
+
+            # resolve every node in one round trip, then hand them all to a single call
+            object_ids = [
+                runtime.track(
+                    reply.result['object']['objectId'],
+                    group,
+                ) for reply in self.call_many([
+                    ('resolveNode', {
+                        'nodeId':      element.id,
+                        'objectGroup': group,
+                    }) for element in elements
+                ])
+            ]
+
+            reply = runtime.call(
+                'callFunctionOn',
+                objectId=object_ids[0],
+                functionDeclaration=GEOMETRY_FN,
+                arguments=[{
+                    'objectId': object_id,
+                } for object_id in object_ids[1:]],
+                returnByValue=True
+            )
+
+        if 'exceptionDetails' in reply.result:
+            raise EmbeddedScriptError(
+                reply.result['exceptionDetails'].get('text', 'Failed to measure elements')
+            )
+
+        results = {}
+
+        for element, geometry in zip(elements, reply.result.get('result', {}).get('value', [])):
+            if geometry is not None:
+                element.set_geometry(geometry)
+
+            results[element.id] = geometry
+
+        return results
+
+    def xpath(self, expression, node_id=None, wait_for_match=True, timeout=10000, interval=250):
         """
         Query the DOM for elements matching the given XPath expression.
 
+        The expression is evaluated in the page with `evaluate` on the document that owns the
+        context node (so context nodes in subframes work), and (if **wait_for_match** is set) the
+        page waits for it to match using a `MutationObserver` rather than being polled.  The
+        matches are returned as a remote array, and each is requested by its remote object (in a
+        single round trip), so the page's DOM is never modified.
+
         #### Arguments
 
         - **expression** (`str`):
 
             An XPath expression to evaluate within the current DOM.
 
+        - **node_id** (`int`, optional):
+
+            The node to use as the context node for relative expressions.  Defaults to the
+            document.
+
+        - **wait_for_match** (`bool`):
+
+            Whether to wait for the expression to match at least one element.
+
+        - **timeout** (`int`):
+
+            The number of milliseconds to wait for a match.
+
+        - **interval** (`int`):
+
+            The number of milliseconds to wait before retrying if the page is navigated while
+            waiting.
+
         #### Returns
-        A list of matching elements.
+        A list of matching elements (in document order), or `False` if none matched.  Only element
+        nodes are returned; text and attribute nodes are skipped.
+
+        #### Raises
+        `webfriend.rpc.runtime.EmbeddedScriptError` if the expression is invalid.
         """
+        runtime = self.tab.runtime
+        deadline = time.time() + (timeout / 1000.0)
 
-        # call getDocument first so subsequent calls to performSearch work properly
-        # (thanks @jamcplusplus for catching this)
-        self.root
-        started_at = time.time()
+        if node_id is None:
+            node_id = self.root.id
+
+        while True:
+            remaining = max(int((deadline - time.time()) * 1000), 0)
+            wait_ms = (remaining if wait_for_match else 0)
 
-        while time.time() < (started_at + (timeout / 1000.0)):
             try:
-                # perform the call
-                handle = self.perform_search(expression)
-                count = handle.get('resultCount', 0)
+                with runtime.object_group():
+                    reply = runtime.call_function_on(
+                        self.resolve_node(node_id),
+                        XPATH_FN,
+                        arguments=[expression, wait_ms],
+                        await_promise=True,
+                        reply_timeout=(wait_ms + self.mutation_wait_slack)
+                    )
 
-                if count:
-                    return self.get_search_results(handle.get('searchId'), to_index=count)
-                else:
-                    self.discard_search_results(handle.get('searchId'))
+                    script_value(reply)
+                    matches = reply.result.get('result', {}).get('objectId')
+
+                    if matches is None:
+                        return False
+
+                    return self.request_nodes(matches)
 
             except (
                 exceptions.TimeoutError,
                 exceptions.ProtocolError
-            ):
-                pass
+            ) as e:
+                logging.debug('XPath query {} interrupted: {}'.format(expression, e))
 
-            if not wait_for_match:
-                break
+            if not wait_for_match or time.time() >= deadline:
+                return False
 
             time.sleep(interval / 1000.0)
 
-        return False
+    def request_nodes(self, array_id):
+        """
+        Return elements for the nodes in the given remote array (e.g.: as returned by a script.)
+        The array's items are listed in one call, and are then all requested in a single round
+        trip.
+
+        #### Returns
+        A `list` of `webfriend.rpc.dom.DOMElement`, in array order.
+        """
+        items = []
+
+        for prop in self.tab.runtime.get_properties(array_id, own_properties=True) or []:
+            name = prop.get('name', '')
+            object_id = prop.get('value', {}).get('objectId')
+
+            if name.isdigit() and object_id:
+                items.append((int(name), object_id))
+
+        if not len(items):
+            return []
+
+        replies = self.call_many([
+            ('requestNode', {
+                'objectId': item,
+            }) for _, item in sorted(items)
+        ])
+
+        return self.elements_for([
+            reply.get('nodeId') for reply in replies if reply.get('nodeId')
+        ])
+
+    def wait_for_selector(self, selector, timeout=10000):
+        """
+        Wait for an element matching the given selector to appear beneath the current root
+        element.  Rather than polling, this injects a `MutationObserver` on the document that owns
+        the root (which may be a subframe's document after `root_to`) that re-checks the selector
+        whenever that document changes, and awaits the promise it resolves; so the wait completes
+        as soon as a matching element appears, in a single round trip.
+
+        #### Arguments
+
+        - **selector** (`str`):
+
+            The CSS-style selector to wait for.
+
+        - **timeout** (`int`):
+
+            The number of milliseconds to wait for a match.
+
+        #### Returns
+        `True` if a matching element exists, `False` if the timeout elapsed first.
+
+        #### Raises
+        - `webfriend.rpc.runtime.EmbeddedScriptError` if the selector is invalid or the wait was
+          interrupted (e.g.: by navigation).
+        - `webfriend.exceptions.TimeoutError` if the reply never arrives.
+        """
+        return (self.call_function_on(
+            self.root.id,
+            WAIT_FOR_SELECTOR_FN,
+            arguments=[self.prepare_selector(selector), int(timeout)],
+            await_promise=True,
+            reply_timeout=(timeout + self.mutation_wait_slack)
+        ) is True)
+
+    def wait_for_script(self, test_fn, timeout=10000):
+        """
+        Wait until the given Javascript function (given as source) returns true, re-evaluating it
+        whenever the document is mutated.  See `wait_for_selector`.
+        """
+        return (self.tab.runtime.evaluate(
+            '({})({}, {})'.format(MUTATION_WAIT_FN, test_fn, int(timeout)),
+            wrapper_fn=False,
+            return_by_value=True,
+            await_promise=True,
+            reply_timeout=(timeout + self.mutation_wait_slack)
+        ) is True)
 
     def select_nodes(self, selector, wait_for_match=True, timeout=10000, interval=250):
         """
-        Polls the DOM for an element that matches the given selector.  Either the element will be
-        found and returned within the given timeout, or a TimeoutError will be raised.
+        Waits for an element that matches the given selector to appear in the DOM.  Either the
+        element will be found and returned within the given timeout, or `False` is returned.
+
+        The DOM is queried once; if nothing matches, the wait is performed in the page using
+        `wait_for_selector` and the DOM is queried again once a match appears.  Polling is only
+        used as a fallback if the in-page wait is interrupted (e.g.: by navigation.)
 
         #### Arguments
 
         - **selector** (`str`):
 
-            The CSS-style selector that specifies the DOM element to look for.
+            The CSS-style selector that specifies the DOM element to look for.  Elements, or the
+            results of a previous selection (e.g.: from [page::find](#pagefind)), are returned
+            as-is.
 
         - **timeout** (`int`):
 
@@ -691,17 +2256,27 @@ class DOM(Base):
 
         - **interval** (`int`):
 
-            The polling interval, in milliseconds, used for rechecking for the element.
+            The polling interval, in milliseconds, used when falling back to polling.
 
         #### Returns
-        `webfriend.rpc.dom.DOMElement`
-
-        #### Raises
-        `webfriend.exceptions.TimeoutError`
+        A `dict` containing the *selector*, *count*, and matching *nodes*, or `False` if nothing
+        matched.
         """
-        started_at = time.time()
+        nodes = self.resolved_nodes(selector)
+
+        if nodes is not None:
+            if not len(nodes):
+                return False
+
+            return {
+                'selector': (selector.get('selector') if isinstance(selector, dict) else None),
+                'count':    len(nodes),
+                'nodes':    nodes,
+            }
 
-        while time.time() <= (started_at + (timeout / 1000.0)):
+        deadline = time.time() + (timeout / 1000.0)
+
+        while True:
             try:
                 elements = self.query_all(selector, reply_timeout=interval)
 
@@ -725,61 +2300,174 @@ class DOM(Base):
             ):
                 pass
 
-            time.sleep(interval / 1000.0)
+            remaining = int((deadline - time.time()) * 1000)
 
-        return False
+            if remaining <= 0:
+                return False
+
+            if self.observe_mutations:
+                try:
+                    # whether this matched or timed out, the next pass re-queries the DOM and
+                    # (if the deadline has passed) gives up
+                    self.wait_for_selector(selector, timeout=remaining)
+                    continue
+                except (
+                    exceptions.TimeoutError,
+                    exceptions.ProtocolError,
+                    EmbeddedScriptError
+                ) as e:
+                    logging.debug('Falling back to polling for {}: {}'.format(selector, e))
+
+            time.sleep(min(interval, remaining) / 1000.0)
+
+    def index_text_nodes(self, definition):
+        """
+        Record which element owns each text node in the given node definition (and everything
+        nested in it), so that `DOM.characterDataModified` events can be applied to the owner.
+        """
+        stack = [definition]
+
+        while len(stack):
+            node = stack.pop()
+
+            for child in node.get('children', ()):
+                if child.get('nodeType') == 3:
+                    self._text_owners[child['nodeId']] = node['nodeId']
+
+                elif 'children' in child:
+                    stack.append(child)
 
     def on_child_nodes(self, event):
-        for node in event.get('nodes', []):
-            element = DOMElement(self, node)
+        parent_id = event.get('parentId')
+        nodes = event.get('nodes', [])
 
-            logging.debug('Adding node {} {}'.format(
-                element.id,
-                element
-            ))
+        for node in nodes:
+            if parent_id is not None:
+                node.setdefault('parentId', parent_id)
+
+            element = self.materialize(node)
+
+            # lazy formatting; rendering every element here would defeat lazy attribute parsing
+            logging.debug('Adding node %s %s', element.id, element)
+
+            self.element_cache.put(element)
+            self.index_text_nodes(node)
 
-            self._elements[node['nodeId']] = element
+        # the event carries the parent's complete list of children
+        parent = self.element_cache.peek(parent_id)
 
-            if self.has_element(element.parent_id):
-                self.element(element.parent_id).child_ids.add(element.id)
+        if parent is not None:
+            parent.set_children(nodes)
+
+        if parent_id is not None:
+            self.index_text_nodes({
+                'nodeId':   parent_id,
+                'children': nodes,
+            })
 
     def on_child_inserted(self, event):
         definition = event.get('node')
         parent_id = event.get('parentNodeId')
 
-        element = DOMElement(self, definition)
-        self._elements[element.id] = element
+        element = self.materialize(definition)
+        self.element_cache.put(element)
+        self.query_cache.clear()
+        self.version += 1
 
-        logging.debug('Inserting node {} {}'.format(
-            element.id,
-            element
-        ))
+        logging.debug('Inserting node %s %s', element.id, element)
 
-        if self.has_element(parent_id):
-            try:
-                self.element(parent_id).child_ids.add(element.id)
-            except KeyError:
-                pass
+        if definition.get('nodeType') == 3:
+            self._text_owners[element.id] = parent_id
+            parent = self.element_cache.peek(parent_id)
+
+            if parent is not None:
+                parent.insert_text_node(definition, event.get('previousNodeId'))
+        else:
+            self.index_text_nodes(definition)
+
+        parent = self.element_cache.peek(parent_id)
+
+        if parent is not None:
+            parent.child_ids.add(element.id)
 
     def on_child_removed(self, event):
         node_id = event.get('nodeId')
         parent_id = event.get('parentNodeId')
 
-        if self.has_element(parent_id):
-            try:
-                self.element(parent_id).child_ids.remove(node_id)
-            except KeyError:
-                pass
+        self.query_cache.clear()
+        self.version += 1
+
+        if self._text_owners.pop(node_id, None) is not None:
+            parent = self.element_cache.peek(parent_id)
+
+            if parent is not None:
+                parent.update_text_node(node_id, remove=True)
 
-        if self.has_element(node_id):
+        parent = self.element_cache.peek(parent_id)
+
+        if parent is not None:
+            parent.child_ids.discard(node_id)
+
+        element = self.element_cache.remove(node_id)
+
+        if element is not None:
             logging.debug('Removing node {} {}'.format(
-                self._elements[node_id].id,
-                self._elements[node_id]
+                element.id,
+                element
             ))
 
-            del self._elements[node_id]
+    def on_attribute_modified(self, event):
+        self.query_cache.clear()
+        self.version += 1
+        element = self.element_cache.peek(event.get('nodeId'))
+
+        if element is not None:
+            element.apply_attribute(event.get('name'), event.get('value'))
+
+    def on_attribute_removed(self, event):
+        self.query_cache.clear()
+        self.version += 1
+        element = self.element_cache.peek(event.get('nodeId'))
+
+        if element is not None:
+            element.apply_attribute(event.get('name'), remove=True)
+
+    def on_character_data_modified(self, event):
+        node_id = event.get('nodeId')
+        value = event.get('characterData')
+
+        self.version += 1
+
+        # update the text node itself (if we have it) and the text of the element that owns it
+        text_node = self.element_cache.peek(node_id)
+
+        if text_node is not None:
+            text_node.definition['nodeValue'] = value
+            text_node._value = value
 
-    # def on_set_attribute_value()
+        owner = self.element_cache.peek(self._text_owners.get(node_id))
+
+        if owner is not None:
+            owner.update_text_node(node_id, value)
+
+    def on_child_node_count_updated(self, event):
+        # children changed somewhere we aren't tracking in detail
+        self.query_cache.clear()
+        self.version += 1
+        element = self.element_cache.peek(event.get('nodeId'))
+
+        if element is not None:
+            element.definition['childNodeCount'] = event.get('childNodeCount')
+
+    def on_frame_navigated(self, event):
+        # only navigations of the top-level frame replace the document
+        if not event.get('frame.parentId'):
+            self.invalidate()
+        else:
+            self._frame_roots.pop(event.get('frame.id'), None)
+
+    def on_frame_detached(self, event):
+        self._frame_roots.pop(event.get('frameId'), None)
 
     @property
     def resources(self):
@@ -837,6 +2525,9 @@ class DOM(Base):
 
     @classmethod
     def ensure_unique_element(cls, selector, elements):
+        if isinstance(selector, dict):
+            selector = selector.get('selector')
+
         if elements is False:
             raise exceptions.EmptyResult("No elements matched the selector: {}".format(
                 selector
@@ -879,11 +2570,7 @@ class DOM(Base):
             toIndex=to_index
         ).get('nodeIds', [])
 
-        return [
-            self.element(i, DOMElement(self, {
-                'nodeId': i,
-            })) for i in node_ids
-        ]
+        return self.elements_for(node_ids)
 
     def discard_search_results(self, search_id):
         self.call('discardSearchResults', searchId=search_id)
@@ -891,11 +2578,77 @@ class DOM(Base):
     def push_node_by_path_to_frontend(self, path):
         node_ids = self.call('pushNodeByPathToFrontend', path=path).get('nodeIds', [])
 
-        return [
-            self.element(i, DOMElement(self, {
-                'nodeId': i,
-            })) for i in node_ids
-        ]
+        return self.elements_for(node_ids)
+
+    def request_child_nodes(self, node_id, depth=None, pierce=None, sync=True):
+        """
+        Request the children of the given node, which are delivered in `DOM.setChildNodes` events.
+
+        #### Arguments
+
+        - **node_id** (`int`):
+
+            The node whose children should be sent.
+
+        - **depth** (`int`, optional):
+
+            How many levels of descendants to send (-1 for the entire subtree); defaults to 1.
+
+        - **pierce** (`bool`, optional):
+
+            Whether to descend into iframes and shadow roots.
+
+        - **sync** (`bool`):
+
+            Whether to wait until the resulting events have been applied to the element cache
+            before returning.
+        """
+        params = {
+            'nodeId': node_id,
+        }
+
+        if depth is not None:
+            params['depth'] = depth
+
+        if pierce is not None:
+            params['pierce'] = pierce
+
+        self.call('requestChildNodes', **params)
+
+        if sync and hasattr(self.tab, 'sync_events'):
+            self.tab.sync_events()
+
+    def fetch_children(self, element, depth=None):
+        """
+        Fetch the children of the given element on demand.
+
+        An isolated fetch retrieves `DOM.child_fetch_depth` levels below the element.  If another
+        fetch happened within the last `DOM.prefetch_window` seconds, a traversal of the tree is
+        assumed to be underway, and the element's parent is fetched `DOM.prefetch_depth` levels
+        deep instead, so that the element's siblings and several levels of their descendants
+        arrive in the same round trip.
+        """
+        now = time.time()
+        target = element
+
+        if depth is None:
+            depth = self.child_fetch_depth
+
+            if (now - self._last_fetch) < self.prefetch_window:
+                depth = self.prefetch_depth
+                parent = self.element_cache.peek(element.parent_id)
+
+                if parent is not None:
+                    target = parent
+                    depth += 1
+
+        self._last_fetch = now
+
+        # the element must be cached for the resulting events to be applied to it
+        if element.id not in self.element_cache:
+            self.element_cache.put(element)
+
+        self.request_child_nodes(target.id, depth=depth)
 
     def push_node_by_backend_ids_to_frontend(self, backend_node_ids):
         return self.call('pushNodesByBackendIdsToFrontend', backendNodeIds=backend_node_ids)
@@ -0,0 +1,878 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend.exceptions import ProtocolError, TimeoutError
+from webfriend.rpc.dom import DOM, DOMElement, NoSuchElement, XPATH_FN
+from webfriend.rpc.dom import SOURCE_HOLD_FN, SOURCE_CHUNK_FN, ACTIONABILITY_FN
+from webfriend.rpc.dom import WAIT_FOR_SELECTOR_FN, GEOMETRY_FN
+from webfriend.rpc.runtime import Runtime
+import gzip
+import io
+
+
+class FakeTab(object):
+    pass
+
+
+class DOMElementTest(TestCase):
+    def setUp(self):
+        self.dom = DOM(FakeTab())
+
+    def test_lazy_population(self):
+        element = DOMElement(self.dom, {
+            'nodeId':     5,
+            'nodeType':   1,
+            'nodeName':   'A',
+            'localName':  'a',
+            'attributes': ['href', '/test', 'class', 'link'],
+            'children': [
+                {'nodeId': 6, 'nodeType': 3, 'nodeName': '#text', 'nodeValue': 'Click'},
+                {'nodeId': 7, 'nodeType': 8, 'nodeName': '#comment', 'nodeValue': 'hi'},
+                {'nodeId': 8, 'nodeType': 1, 'nodeName': 'SPAN', 'localName': 'span'},
+            ],
+        })
+
+        self.assertFalse(hasattr(element, '__dict__'))
+        self.assertEqual({'href': '/test', 'class': 'link'}, element.attributes)
+        self.assertEqual('Click', element.text)
+        self.assertEqual(set([8]), element.child_ids)
+        self.assertEqual([7], [c.id for c in element.child_nodes])
+        self.assertIn('href', element)
+        self.assertEqual('/test', element['href'])
+
+    def test_nested_children_materialized_on_access(self):
+        element = self.dom.element_cache.put(DOMElement(self.dom, {
+            'nodeId':   1,
+            'nodeType': 1,
+            'nodeName': 'UL',
+            'children': [
+                {'nodeId': 2, 'nodeType': 1, 'nodeName': 'LI', 'attributes': ['id', 'a']},
+                {'nodeId': 3, 'nodeType': 1, 'nodeName': 'LI', 'attributes': ['id', 'b']},
+            ],
+        }))
+
+        self.assertFalse(self.dom.has_element(2))
+
+        children = sorted(element.children, key=lambda c: c.id)
+
+        self.assertEqual(['a', 'b'], [c['id'] for c in children])
+        self.assertEqual([1, 1], [c.parent_id for c in children])
+        self.assertTrue(self.dom.has_element(2))
+        self.assertIs(children[0], self.dom.element(2))
+
+
+class ScriptedDOM(DOM):
+    def __init__(self, tab, results, waits):
+        super(ScriptedDOM, self).__init__(tab)
+        self.results = list(results)
+        self.waits = list(waits)
+        self.calls = []
+
+    def query_all(self, selector, node_id=None, reply_timeout=None):
+        self.calls.append('query')
+        return [DOMElement(self, {'nodeId': i}) for i in self.results.pop(0)]
+
+    def wait_for_selector(self, selector, timeout=10000):
+        self.calls.append('wait')
+        result = self.waits.pop(0)
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+
+class SelectNodesTest(TestCase):
+    def test_waits_for_mutation_instead_of_polling(self):
+        dom = ScriptedDOM(FakeTab(), [[], [4, 5]], [True])
+        results = dom.select_nodes('li', timeout=5000, interval=5000)
+
+        self.assertEqual(['query', 'wait', 'query'], dom.calls)
+        self.assertEqual(2, results['count'])
+        self.assertEqual([4, 5], [n.id for n in results['nodes']])
+
+    def test_falls_back_to_polling(self):
+        dom = ScriptedDOM(FakeTab(), [[], [7]], [ProtocolError('context destroyed')])
+        results = dom.select_nodes('li', timeout=5000, interval=1)
+
+        self.assertEqual(['query', 'wait', 'query'], dom.calls)
+        self.assertEqual([7], [n.id for n in results['nodes']])
+
+    def test_no_wait(self):
+        dom = ScriptedDOM(FakeTab(), [[]], [])
+
+        self.assertFalse(dom.select_nodes('li', wait_for_match=False))
+        self.assertEqual(['query'], dom.calls)
+
+
+class FunctionCallDOM(DOM):
+    def __init__(self, tab, result):
+        super(FunctionCallDOM, self).__init__(tab)
+        self._root_element = DOMElement(self, {'nodeId': 1})
+        self.result = result
+        self.calls = []
+
+    def call_function_on(self, node_id, function, arguments=None, **kwargs):
+        self.calls.append((node_id, function, arguments))
+        return self.result
+
+
+class XPathTab(object):
+    connected = True
+
+    def __init__(self, matched):
+        self.matched = matched
+        self.calls = []
+        self.runtime = Runtime(self)
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.calls.append((method, params))
+
+        if method == 'DOM.resolveNode':
+            return FakeReply({'object': {'objectId': 'node-{}'.format(params['nodeId'])}})
+
+        elif method == 'Runtime.callFunctionOn':
+            if self.matched:
+                return FakeReply({'result': {'type': 'object', 'objectId': 'matches'}})
+            else:
+                return FakeReply({'result': {'type': 'object', 'subtype': 'null'}})
+
+        elif method == 'Runtime.getProperties':
+            return FakeReply({
+                'result': [
+                    {'name': str(i), 'value': {'objectId': 'match-{}'.format(n)}}
+                    for i, n in reversed(list(enumerate(self.matched)))
+                ] + [
+                    {'name': 'length', 'value': {'value': len(self.matched)}},
+                    {'name': '__proto__', 'value': {'objectId': 'proto'}},
+                ],
+            })
+
+        return FakeReply({})
+
+    def rpc_many(self, calls, **kwargs):
+        self.calls.append(('batch', [c[0] for c in calls]))
+
+        return [
+            FakeReply({
+                'nodeId': int(p['objectId'].split('-')[1]),
+            }) for _, p in calls
+        ]
+
+
+class XPathTest(TestCase):
+    def test_relative_to_context_node(self):
+        tab = XPathTab([9, 7])
+        dom = DOM(tab)
+        results = dom.xpath('./li', node_id=42, wait_for_match=False)
+
+        self.assertEqual([9, 7], [e.id for e in results])
+
+        methods = [c[0] for c in tab.calls]
+        self.assertEqual([
+            'DOM.resolveNode',
+            'Runtime.callFunctionOn',
+            'Runtime.getProperties',
+            'batch',
+            'Runtime.releaseObjectGroup',
+        ], methods)
+
+        self.assertEqual(42, tab.calls[0][1]['nodeId'])
+        self.assertEqual('node-42', tab.calls[1][1]['objectId'])
+        self.assertEqual(XPATH_FN, tab.calls[1][1]['functionDeclaration'])
+        self.assertEqual([{'value': './li'}, {'value': 0}], tab.calls[1][1]['arguments'])
+        self.assertEqual('matches', tab.calls[2][1]['objectId'])
+        self.assertEqual(['DOM.requestNode'] * 2, tab.calls[3][1])
+
+        # the page is never modified
+        self.assertNotIn('setAttribute', XPATH_FN)
+        self.assertIn('context.ownerDocument', XPATH_FN)
+
+    def test_no_match(self):
+        tab = XPathTab([])
+        dom = DOM(tab)
+        dom._root_element = DOMElement(dom, {'nodeId': 1})
+
+        self.assertFalse(dom.xpath('//p', timeout=100))
+        self.assertEqual([
+            'DOM.resolveNode',
+            'Runtime.callFunctionOn',
+            'Runtime.releaseObjectGroup',
+        ], [c[0] for c in tab.calls])
+        self.assertEqual(1, tab.calls[0][1]['nodeId'])
+        self.assertTrue(tab.calls[1][1]['arguments'][1]['value'] > 0)
+
+
+class WaitForSelectorTest(TestCase):
+    def test_waits_within_current_root(self):
+        dom = FunctionCallDOM(FakeTab(), True)
+
+        # e.g.: the document of a subframe, after root_to
+        dom._root_element = DOMElement(dom, {'nodeId': 12, 'nodeType': 9})
+
+        self.assertTrue(dom.wait_for_selector('li', timeout=500))
+        self.assertEqual([(12, WAIT_FOR_SELECTOR_FN, ['li', 500])], dom.calls)
+        self.assertIn('root.ownerDocument', WAIT_FOR_SELECTOR_FN)
+        self.assertIn('root.querySelector(selector)', WAIT_FOR_SELECTOR_FN)
+
+    def test_timeout(self):
+        dom = FunctionCallDOM(FakeTab(), False)
+
+        self.assertFalse(dom.wait_for_selector('li', timeout=500))
+
+
+class FakeReply(object):
+    def __init__(self, result):
+        self.result = result
+
+    def get(self, key, fallback=None):
+        return self.result.get(key, fallback)
+
+
+class GeometryTab(object):
+    connected = True
+
+    def __init__(self, values=None):
+        self.calls = []
+        self.values = values
+        self.runtime = Runtime(self)
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.calls.append((method, params))
+
+        if method != 'Runtime.callFunctionOn':
+            return FakeReply({})
+
+        if self.values is not None:
+            return FakeReply({'result': {'value': self.values}})
+
+        return FakeReply({
+            'result': {
+                'value': [
+                    {
+                        'rect':    {'top': 10 * i, 'left': 0, 'width': 100.5, 'height': 20.0 * i},
+                        'box':     {'width': 101, 'height': 20 * i},
+                        'visible': (i > 1),
+                    } for i in range(1, len(params['arguments']) + 2)
+                ],
+            },
+        })
+
+    def rpc_many(self, calls, **kwargs):
+        self.calls.append(('batch', [c[0] for c in calls]))
+
+        return [
+            FakeReply({'object': {'objectId': 'obj-{}'.format(p['nodeId'])}}) for _, p in calls
+        ]
+
+
+class GeometryTest(TestCase):
+    def test_bulk_measurement(self):
+        tab = GeometryTab()
+        dom = DOM(tab)
+        elements = [DOMElement(dom, {'nodeId': i}) for i in (3, 4, 5)]
+
+        results = dom.geometry(elements)
+
+        batch, call, release = tab.calls
+        self.assertEqual(('batch', ['DOM.resolveNode'] * 3), batch)
+        self.assertEqual('obj-3', call[1]['objectId'])
+        self.assertEqual([{'objectId': 'obj-4'}, {'objectId': 'obj-5'}], call[1]['arguments'])
+        self.assertEqual('Runtime.releaseObjectGroup', release[0])
+        self.assertEqual({}, tab.runtime.unreleased_objects)
+        self.assertEqual(set([3, 4, 5]), set(results.keys()))
+
+        # cached values are served without any further calls
+        self.assertEqual([101, 101, 101], [e.width for e in elements])
+        self.assertEqual([20, 40, 60], [e.height for e in elements])
+        self.assertEqual([10, 20, 30], [e.top for e in elements])
+        self.assertEqual([False, True, True], [e.visible for e in elements])
+        self.assertEqual(3, len(tab.calls))
+
+    def test_document_measured_by_document_element(self):
+        tab = GeometryTab()
+        dom = DOM(tab)
+        document = DOMElement(dom, {'nodeId': 1, 'nodeType': 9, 'nodeName': '#document'})
+        dom._root_element = document
+
+        self.assertEqual(20, dom.root.height)
+        self.assertEqual('obj-1', tab.calls[1][1]['objectId'])
+        self.assertIn('el = el.documentElement;', GEOMETRY_FN)
+
+    def test_unmeasurable_node(self):
+        dom = DOM(GeometryTab(values=[None]))
+        text = DOMElement(dom, {'nodeId': 2, 'nodeType': 3, 'nodeName': '#text'})
+
+        with self.assertRaises(ValueError):
+            text.height
+
+        with self.assertRaises(ValueError):
+            text.visible
+
+
+class MutationTest(TestCase):
+    def setUp(self):
+        self.dom = DOM(FakeTab())
+        self.dom.on_child_nodes({
+            'parentId': 1,
+            'nodes': [
+                {
+                    'nodeId':     2,
+                    'parentId':   1,
+                    'nodeType':   1,
+                    'nodeName':   'P',
+                    'attributes': ['class', 'intro'],
+                    'children': [
+                        {'nodeId': 3, 'nodeType': 3, 'nodeName': '#text', 'nodeValue': 'Hello'},
+                        {
+                            'nodeId':   4,
+                            'nodeType': 1,
+                            'nodeName': 'B',
+                            'children': [
+                                {'nodeId': 5, 'nodeType': 3, 'nodeName': '#text', 'nodeValue': 'x'},
+                            ],
+                        },
+                    ],
+                },
+            ],
+        })
+
+        self.element = self.dom.element(2)
+
+    def test_attributes(self):
+        self.dom.on_attribute_modified({'nodeId': 2, 'name': 'id', 'value': 'first'})
+        self.dom.on_attribute_modified({'nodeId': 2, 'name': 'class', 'value': 'outro'})
+        self.dom.on_attribute_removed({'nodeId': 2, 'name': 'id'})
+
+        self.assertEqual({'class': 'outro'}, self.element.attributes)
+        self.assertEqual(3, self.dom.version)
+
+    def test_skeletons_ignore_attribute_events(self):
+        skeleton = self.dom.element_cache.put(DOMElement(self.dom, {'nodeId': 9}))
+        self.dom.on_attribute_modified({'nodeId': 9, 'name': 'id', 'value': 'x'})
+
+        self.assertIsNone(skeleton._attributes)
+
+    def test_character_data(self):
+        self.assertEqual('Hello', self.element.text)
+
+        self.dom.on_character_data_modified({'nodeId': 3, 'characterData': 'Goodbye'})
+        self.assertEqual('Goodbye', self.element.text)
+
+        # nested text nodes are tracked too, once their owner is materialized
+        bold = self.element.children[0]
+        self.dom.on_character_data_modified({'nodeId': 5, 'characterData': 'y'})
+        self.assertEqual('y', bold.text)
+
+    def test_text_nodes_inserted_and_removed(self):
+        self.dom.on_child_removed({'parentNodeId': 2, 'nodeId': 3})
+        self.assertEqual('', self.element.text)
+
+        self.dom.on_child_inserted({
+            'parentNodeId':   2,
+            'previousNodeId': 4,
+            'node': {'nodeId': 6, 'nodeType': 3, 'nodeName': '#text', 'nodeValue': 'Again'},
+        })
+        self.assertEqual('Again', self.element.text)
+
+        self.dom.on_character_data_modified({'nodeId': 6, 'characterData': 'More'})
+        self.assertEqual('More', self.element.text)
+
+    def test_child_count(self):
+        self.dom.on_child_node_count_updated({'nodeId': 2, 'childNodeCount': 7})
+        self.assertEqual(7, self.element.child_count)
+
+    def test_handlers_leave_cache_stats_unchanged(self):
+        stats = self.dom.element_cache.as_dict()
+
+        self.dom.on_child_inserted({
+            'parentNodeId': 2,
+            'node': {'nodeId': 6, 'nodeType': 1, 'nodeName': 'I'},
+        })
+        self.dom.on_child_inserted({
+            'parentNodeId': 99,
+            'node': {'nodeId': 7, 'nodeType': 1, 'nodeName': 'I'},
+        })
+        self.dom.on_child_removed({'parentNodeId': 2, 'nodeId': 4})
+        self.dom.on_child_removed({'parentNodeId': 99, 'nodeId': 7})
+        self.dom.on_child_removed({'parentNodeId': 2, 'nodeId': 3})
+        self.dom.on_attribute_modified({'nodeId': 2, 'name': 'id', 'value': 'x'})
+        self.dom.on_attribute_removed({'nodeId': 2, 'name': 'id'})
+        self.dom.on_character_data_modified({'nodeId': 5, 'characterData': 'y'})
+        self.dom.on_child_node_count_updated({'nodeId': 2, 'childNodeCount': 1})
+
+        after = self.dom.element_cache.as_dict()
+
+        for key in ['hits', 'misses', 'evictions']:
+            self.assertEqual(stats[key], after[key])
+
+        self.assertEqual(set([6]), self.element.child_ids)
+
+
+class FakePage(object):
+    top_frame_id = 'top'
+    frames = [
+        {'id': 'top', 'parent_id': None, 'name': None, 'url': 'http://example.com/'},
+        {'id': 'a', 'parent_id': 'top', 'name': 'ad', 'url': 'http://a/'},
+        {'id': 'oopif', 'parent_id': 'top', 'name': None, 'url': 'http://b/'},
+    ]
+
+
+class FramesTab(object):
+    def __init__(self):
+        self.page = FakePage()
+        self.batches = []
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.batches.append([method])
+
+        if method == 'DOM.pushNodesByBackendIdsToFrontend':
+            return FakeReply({'nodeIds': [100 + i for i in params['backendNodeIds']]})
+
+    def rpc_many(self, calls, **kwargs):
+        self.batches.append([method for method, _ in calls])
+        replies = []
+
+        for method, params in calls:
+            if method == 'DOM.getFrameOwner':
+                replies.append(FakeReply({'backendNodeId': 10}))
+
+            elif method == 'DOM.describeNode':
+                replies.append(FakeReply({'node': {'contentDocument': {'backendNodeId': 20}}}))
+
+            elif params['nodeId'] == 1:
+                replies.append(FakeReply({'nodeIds': [2, 3]}))
+
+            else:
+                replies.append(FakeReply({'nodeIds': [120 + len(replies)]}))
+
+        # the second frame is out-of-process, so its owner can't be found
+        if calls[0][0] == 'DOM.getFrameOwner':
+            replies[1] = ProtocolError('Frame with the given id was not found.')
+
+        return replies
+
+
+class FramesTest(TestCase):
+    def test_query_all_frames(self):
+        tab = FramesTab()
+        dom = DOM(tab)
+        dom._root_element = DOMElement(dom, {'nodeId': 1})
+
+        results = dom.query_all_frames('a')
+
+        self.assertEqual([
+            ['DOM.getFrameOwner', 'DOM.getFrameOwner'],
+            ['DOM.describeNode'],
+            ['DOM.pushNodesByBackendIdsToFrontend'],
+            ['DOM.querySelectorAll', 'DOM.querySelectorAll'],
+        ], tab.batches)
+
+        self.assertEqual(['top', 'a'], [r['frame_id'] for r in results])
+        self.assertEqual([[2, 3], [121]], [[n.id for n in r['nodes']] for r in results])
+        self.assertEqual(120, dom.frame_root('a').id)
+
+        # frame roots are cached
+        dom.query_all_frames('a', frame_ids=['a'])
+        self.assertEqual(['DOM.querySelectorAll'], tab.batches[-1])
+
+
+class InternDOM(DOM):
+    def __init__(self, tab):
+        super(InternDOM, self).__init__(tab)
+        self.pushed = {}
+        self.described = []
+
+    @property
+    def document(self):
+        return None
+
+    def push_node_by_backend_ids_to_frontend(self, backend_node_ids):
+        return {
+            'nodeIds': [self.pushed.get(i, 0) for i in backend_node_ids],
+        }
+
+    def call(self, method, expect_reply=True, reply_timeout=None, context=None, **params):
+        self.described.append(params['nodeId'])
+
+        return FakeReply({
+            'node': {'backendNodeId': 500 + params['nodeId'], 'nodeType': 1},
+        })
+
+
+class InternTest(TestCase):
+    def setUp(self):
+        self.dom = InternDOM(FakeTab())
+
+    def test_same_node_same_handle(self):
+        element = self.dom.materialize({'nodeId': 2, 'backendNodeId': 50, 'nodeName': 'P'})
+        self.dom.element_cache.put(element)
+        self.dom.invalidate()
+
+        again = self.dom.materialize({
+            'nodeId':        9,
+            'backendNodeId': 50,
+            'nodeName':      'P',
+            'attributes':    ['id', 'x'],
+        })
+
+        self.assertIs(element, again)
+        self.assertEqual(9, element.id)
+        self.assertEqual('x', element['id'])
+
+    def test_stale_handle_rebinds(self):
+        element = self.dom.element_cache.put(
+            self.dom.materialize({'nodeId': 2, 'backendNodeId': 50, 'nodeName': 'P'})
+        )
+
+        self.dom.invalidate()
+        self.dom.pushed[50] = 12
+
+        self.assertEqual(12, element.id)
+        self.assertIs(element, self.dom.element(12))
+
+        # the node was removed from the page
+        self.dom.invalidate()
+        del self.dom.pushed[50]
+        self.assertRaises(NoSuchElement, lambda: element.id)
+
+    def test_elements_for_resolves_identity_lazily(self):
+        cached = self.dom.element_cache.put(DOMElement(self.dom, {'nodeId': 1}))
+        elements = self.dom.elements_for([1, 2, 3])
+
+        self.assertIs(cached, elements[0])
+        self.assertEqual([], self.dom.described)
+
+        self.assertEqual(502, elements[1].backend_id)
+        self.assertEqual(502, elements[1].backend_id)
+        self.assertEqual([2], self.dom.described)
+        self.assertIs(elements[1], self.dom.materialize({'nodeId': 7, 'backendNodeId': 502}))
+        self.assertIs(elements[2], self.dom.elements_for([3])[0])
+
+    def test_registry_is_weak(self):
+        self.dom.materialize({'nodeId': 2, 'backendNodeId': 50})
+        self.assertNotIn(50, self.dom._interned)
+
+    def test_elements_for_backend_ids(self):
+        current = self.dom.element_cache.put(
+            self.dom.materialize({'nodeId': 2, 'backendNodeId': 50, 'nodeName': 'P'})
+        )
+
+        self.dom.pushed.update({51: 3})
+        elements = self.dom.elements_for_backend_ids([50, 51, 52, 51])
+
+        self.assertIs(current, elements[0])
+        self.assertEqual([2, 3, 3], [e.id for e in elements])
+        self.assertIs(elements[1], self.dom.element(3))
+        self.assertEqual([elements[1]], DOM.resolved_nodes({'nodes': [elements[1]]}))
+        self.assertEqual([current], self.dom.query_all(current))
+        self.assertIsNone(DOM.resolved_nodes('p'))
+
+    def test_interned_element_keeps_data_when_rebound(self):
+        element = self.dom.element_cache.put(self.dom.materialize({
+            'nodeId':        2,
+            'backendNodeId': 50,
+            'nodeType':      1,
+            'nodeName':      'P',
+            'attributes':    ['id', 'x'],
+            'children': [
+                {'nodeId': 3, 'nodeType': 3, 'nodeName': '#text', 'nodeValue': 'Hello'},
+                {'nodeId': 4, 'nodeType': 1, 'nodeName': 'B'},
+            ],
+        }))
+
+        self.assertEqual(set([4]), element.child_ids)
+        self.dom.invalidate()
+        self.dom.pushed[50] = 12
+
+        again = self.dom.elements_for_backend_ids([50])[0]
+
+        self.assertIs(element, again)
+        self.assertEqual(12, element.id)
+        self.assertEqual('P', element.name)
+        self.assertEqual(1, element.type)
+        self.assertEqual('x', element['id'])
+        self.assertEqual('Hello', element.text)
+        self.assertFalse(element.is_partial)
+
+        # the children's node IDs were reset along with the document's
+        self.assertNotIn('children', element.definition)
+
+        # a full description still replaces what was known
+        self.dom.materialize({'nodeId': 12, 'backendNodeId': 50, 'nodeName': 'DIV'})
+        self.assertEqual('DIV', element.name)
+
+
+class SourceTab(object):
+    connected = True
+
+    def __init__(self, html):
+        self.html = html
+        self.held = None
+        self.calls = []
+        self.runtime = Runtime(self)
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.calls.append(method)
+
+        if method == 'DOM.resolveNode':
+            return FakeReply({'object': {'objectId': 'obj-1'}})
+
+        elif method != 'Runtime.callFunctionOn':
+            return FakeReply({})
+
+        function = params['functionDeclaration']
+        arguments = [a['value'] for a in params['arguments']]
+
+        if function == SOURCE_HOLD_FN:
+            self.held = self.html
+            value = len(self.held)
+
+        elif function == SOURCE_CHUNK_FN:
+            start, size = arguments
+            end = min(start + size, len(self.held))
+            value = [self.held[start:end], end]
+
+        else:
+            self.held = None
+            value = None
+
+        return FakeReply({'result': {'value': value}})
+
+
+class SourceTest(TestCase):
+    def test_written_in_chunks(self):
+        tab = SourceTab('<p>h\u00e9llo</p>')
+        dom = DOM(tab)
+        output = io.BytesIO()
+
+        size = DOMElement(dom, {'nodeId': 1}).write_outer_html(output, chunk_size=4)
+
+        self.assertEqual('<p>h\u00e9llo</p>'.encode('utf-8'), output.getvalue())
+        self.assertEqual(len(output.getvalue()), size)
+        self.assertEqual(3, tab.calls.count('Runtime.callFunctionOn') - 2)
+        self.assertEqual('Runtime.releaseObjectGroup', tab.calls[-1])
+        self.assertIsNone(tab.held)
+
+    def test_gzip(self):
+        dom = DOM(SourceTab('<html>' + ('x' * 1000) + '</html>'))
+        output = io.BytesIO()
+
+        size = dom.write_outer_html(1, output, gzip=True)
+
+        self.assertEqual(1013, size)
+        self.assertLess(len(output.getvalue()), size)
+        self.assertEqual(
+            '<html>' + ('x' * 1000) + '</html>',
+            gzip.GzipFile(fileobj=io.BytesIO(output.getvalue())).read()
+        )
+        self.assertRaises(ValueError, dom.write_outer_html, 1, output, chunk_size=1)
+
+
+class FetchTab(object):
+    def __init__(self):
+        self.requests = []
+        self.syncs = 0
+        self.dom = None
+
+    def sync_events(self):
+        self.syncs += 1
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.requests.append((params['nodeId'], params.get('depth')))
+
+        if params['nodeId'] == 1:
+            self.dom.on_child_nodes({
+                'parentId': 1,
+                'nodes': [
+                    {'nodeId': 2, 'nodeType': 1, 'nodeName': 'HTML', 'childNodeCount': 2},
+                ],
+            })
+
+            # a deep fetch also sends the next level down, in its own event
+            if params.get('depth', 1) > 1:
+                self.dom.on_child_nodes({
+                    'parentId': 2,
+                    'nodes': [
+                        {'nodeId': 3, 'nodeType': 1, 'nodeName': 'HEAD', 'childNodeCount': 0},
+                        {
+                            'nodeId':   4,
+                            'nodeType': 1,
+                            'nodeName': 'BODY',
+                            'children': [
+                                {'nodeId': 5, 'nodeType': 3, 'nodeName': '#text', 'nodeValue': 'hi'},
+                            ],
+                        },
+                    ],
+                })
+
+        return FakeReply({})
+
+
+class ChildFetchTest(TestCase):
+    def setUp(self):
+        self.tab = FetchTab()
+        self.dom = self.tab.dom = DOM(self.tab)
+        self.document = self.dom.element_cache.put(DOMElement(self.dom, {
+            'nodeId':         1,
+            'nodeType':       9,
+            'nodeName':       '#document',
+            'childNodeCount': 1,
+        }))
+
+    def test_fetched_on_demand(self):
+        self.dom.prefetch_window = 0
+
+        self.assertTrue(self.document.has_unfetched_children)
+        self.assertEqual([2], [c.id for c in self.document.children])
+        self.assertEqual([(1, 1)], self.tab.requests)
+        self.assertEqual(1, self.tab.syncs)
+
+        # children are only fetched once
+        self.document.children
+        self.assertEqual(1, len(self.tab.requests))
+
+    def test_prefetch_during_traversal(self):
+        html = self.document.children[0]
+        body = [c for c in html.children if c.name == 'BODY'][0]
+
+        # the second fetch came right after the first, so the parent was fetched deeply
+        self.assertEqual([(1, 1), (1, self.dom.prefetch_depth + 1)], self.tab.requests)
+        self.assertEqual(set([3, 4]), html.child_ids)
+        self.assertEqual('hi', body.text)
+        self.assertEqual([], self.dom.element(3).children)
+        self.assertEqual(2, len(self.tab.requests))
+
+
+class QueryTab(object):
+    def __init__(self):
+        self.queries = []
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.queries.append(params['selector'])
+        return FakeReply({'nodeIds': [10, 11]})
+
+    def rpc_many(self, calls, **kwargs):
+        return [self.rpc(method, **params) for method, params in calls]
+
+
+class LargeResultTab(object):
+    def __init__(self, count):
+        self.count = count
+        self.messages = []
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.messages.append(method)
+        return FakeReply({'nodeIds': range(10, 10 + self.count)})
+
+    def rpc_many(self, calls, **kwargs):
+        return [self.rpc(method, **params) for method, params in calls]
+
+
+class LargeResultTest(TestCase):
+    def test_one_message_for_large_result(self):
+        tab = LargeResultTab(1000)
+        dom = DOM(tab)
+        dom._root_element = dom.element_cache.put(DOMElement(dom, {'nodeId': 1}))
+
+        elements = dom.query_all('li')
+
+        self.assertEqual(1000, len(elements))
+        self.assertEqual(['DOM.querySelectorAll'], tab.messages)
+        self.assertEqual(range(10, 1010), [e.id for e in elements])
+
+
+class QueryCacheTest(TestCase):
+    def setUp(self):
+        self.tab = QueryTab()
+        self.dom = DOM(self.tab)
+        self.dom._root_element = self.dom.element_cache.put(DOMElement(self.dom, {'nodeId': 1}))
+
+        for i in (10, 11, 12):
+            self.dom.element_cache.put(DOMElement(self.dom, {'nodeId': i, 'nodeName': 'A'}))
+
+    def test_not_cached_by_default(self):
+        self.dom.query_all('a')
+        self.dom.query_all('a')
+        self.dom.query_many(['a'])
+
+        self.assertEqual(['a', 'a', 'a'], self.tab.queries)
+        self.assertEqual(0, self.dom.cache_stats['queries']['size'])
+
+    def test_repeated_queries_served_from_cache(self):
+        first = self.dom.query_all('a', use_cache=True)
+
+        self.assertEqual(first, self.dom.query_all('a', use_cache=True))
+        self.assertEqual([first, first], self.dom.query_many(['a', 'a'], use_cache=True))
+        self.assertEqual(['a'], self.tab.queries)
+
+        self.dom.query_all('a')
+        self.assertEqual(['a', 'a'], self.tab.queries)
+        self.assertEqual(0.75, self.dom.cache_stats['queries']['hit_rate'])
+
+    def test_invalidated_by_mutations(self):
+        self.dom.query_all('a', use_cache=True)
+
+        for method, event in [
+            ('on_attribute_modified', {'nodeId': 10, 'name': 'href', 'value': '/'}),
+            ('on_attribute_removed', {'nodeId': 10, 'name': 'href'}),
+            ('on_child_inserted', {'parentNodeId': 1, 'node': {'nodeId': 12, 'nodeName': 'A'}}),
+            ('on_child_removed', {'parentNodeId': 1, 'nodeId': 12}),
+            ('on_child_node_count_updated', {'nodeId': 1, 'childNodeCount': 3}),
+        ]:
+            count = len(self.tab.queries)
+            getattr(self.dom, method)(event)
+            self.dom.query_all('a', use_cache=True)
+            self.assertEqual(count + 1, len(self.tab.queries), method)
+
+        # text changes can't affect which elements a selector matches
+        self.dom.on_character_data_modified({'nodeId': 99, 'characterData': 'x'})
+        self.dom.query_all('a', use_cache=True)
+        self.assertEqual(6, len(self.tab.queries))
+
+
+class ActionDOM(DOM):
+    def __init__(self, tab, result):
+        super(ActionDOM, self).__init__(tab)
+        self.result = result
+        self.calls = []
+
+    def call_function_on(self, node_id, function, arguments=None, **kwargs):
+        self.calls.append((node_id, function, arguments, kwargs))
+        return self.result
+
+
+class ActionabilityTest(TestCase):
+    def test_checks_by_action(self):
+        dom = ActionDOM(FakeTab(), {'ok': True})
+
+        self.assertTrue(dom.wait_for_actionable(5, timeout=2000))
+        self.assertTrue(DOMElement(dom, {'nodeId': 6}).wait_for_actionable('field'))
+
+        node_id, function, arguments, kwargs = dom.calls[0]
+
+        self.assertEqual(5, node_id)
+        self.assertEqual(ACTIONABILITY_FN, function)
+        self.assertEqual([
+            ['attached', 'visible', 'stable', 'enabled', 'receives_events'], 2000,
+        ], arguments)
+        self.assertTrue(kwargs['await_promise'])
+        self.assertGreater(kwargs['reply_timeout'], 2000)
+
+        self.assertEqual(6, dom.calls[1][0])
+        self.assertEqual(['attached', 'visible', 'enabled', 'editable'], dom.calls[1][2][0])
+
+    def test_not_actionable(self):
+        dom = ActionDOM(FakeTab(), {'ok': False, 'reason': 'it is disabled'})
+
+        with self.assertRaises(TimeoutError) as ctx:
+            dom.wait_for_actionable(5, timeout=100)
+
+        self.assertIn('it is disabled', str(ctx.exception))
+
+    def test_invalid(self):
+        dom = ActionDOM(FakeTab(), {'ok': True})
+
+        self.assertRaises(ValueError, dom.wait_for_actionable, 5, action='hover')
+        self.assertRaises(ValueError, dom.wait_for_actionable, 5, checks=['visible', 'shiny'])
+        self.assertEqual([], dom.calls)
@@ -0,0 +1,395 @@
+from __future__ import absolute_import
+from webfriend.rpc import Base
+from webfriend.rpc.cache import QueryCache
+from webfriend.utils.textindex import TextIndex
+from array import array
+from collections import defaultdict
+import time
+
+NODE_TYPE_ELEMENT = 1
+NODE_TYPE_TEXT = 3
+
+# text inside these elements is never rendered as page text
+UNSEARCHABLE_TAGS = set(['script', 'style', 'noscript', 'template'])
+
+
+class DocumentSnapshot(object):
+    """
+    A compact, array-backed copy of a single document's node tree, as returned from
+    `DOMSnapshot.captureSnapshot`.
+
+    Nodes are addressed by their index in the document.  All strings (tag names, attribute names
+    and values, text) are stored once in the page-wide string table shared by every document in
+    the snapshot, and nodes refer to them by index.  Lookups by tag, ID, class, and attribute name
+    are served from indexes built when the snapshot is loaded.
+    """
+    def __init__(self, snapshot, definition):
+        self.snapshot = snapshot
+        self.strings = snapshot.strings
+
+        nodes = definition.get('nodes', {})
+        layout = definition.get('layout', {})
+
+        self.url             = self.string(definition.get('documentURL', -1))
+        self.frame_id        = self.string(definition.get('frameId', -1))
+        self.parents         = array('i', nodes.get('parentIndex', []))
+        self.node_types      = array('i', nodes.get('nodeType', []))
+        self.node_names      = array('i', nodes.get('nodeName', []))
+        self.node_values     = array('i', nodes.get('nodeValue', []))
+        self.backend_ids     = array('i', nodes.get('backendNodeId', []))
+        self.attr_offsets    = array('i', [0])
+        self.attr_data       = array('i')
+        self.layout_index    = array('i', [-1] * len(self.parents))
+        self.bounds          = array('d')
+        self.tags            = defaultdict(list)
+        self.ids             = defaultdict(list)
+        self.classes         = defaultdict(list)
+        self.attribute_names = defaultdict(list)
+        self._text_children  = None
+
+        # flatten per-node attribute name/value pairs into a single array, indexed by offset
+        for pairs in nodes.get('attributes', []):
+            self.attr_data.extend(pairs)
+            self.attr_offsets.append(len(self.attr_data))
+
+        while len(self.attr_offsets) <= len(self.parents):
+            self.attr_offsets.append(len(self.attr_data))
+
+        # layout boxes are only present for rendered nodes
+        for layout_i, node_i in enumerate(layout.get('nodeIndex', [])):
+            self.layout_index[node_i] = layout_i
+
+        for box in layout.get('bounds', []):
+            self.bounds.extend((list(box) + [0, 0, 0, 0])[0:4])
+
+        self.build_indexes()
+
+    def build_indexes(self):
+        lowered = self.snapshot.lowered_strings
+
+        for i in range(len(self.parents)):
+            if self.node_types[i] != NODE_TYPE_ELEMENT:
+                continue
+
+            self.tags[lowered(self.node_names[i])].append(i)
+
+            for name_i, value_i in self.attribute_indices(i):
+                name = lowered(name_i)
+                self.attribute_names[name].append(i)
+
+                if name == 'id':
+                    self.ids[self.strings[value_i]].append(i)
+
+                elif name == 'class':
+                    for cls in self.strings[value_i].split():
+                        self.classes[cls].append(i)
+
+    def string(self, index):
+        if index is None or index < 0:
+            return None
+
+        return self.strings[index]
+
+    def attribute_indices(self, i):
+        start = self.attr_offsets[i]
+        end = self.attr_offsets[i + 1]
+
+        return zip(self.attr_data[start:end:2], self.attr_data[start + 1:end:2])
+
+    def attributes(self, i):
+        return dict([
+            (self.strings[n], self.strings[v]) for n, v in self.attribute_indices(i)
+        ])
+
+    def tag(self, i):
+        return self.snapshot.lowered_strings(self.node_names[i])
+
+    def text(self, i):
+        """
+        Return the text of the given node; for elements this is the concatenated text of its
+        immediate text node children.
+        """
+        if self.node_types[i] == NODE_TYPE_TEXT:
+            return self.string(self.node_values[i])
+
+        return ''.join([
+            self.string(self.node_values[c]) or '' for c in self.text_children(i)
+        ])
+
+    def text_children(self, i):
+        if self._text_children is None:
+            self._text_children = defaultdict(list)
+
+            for c in range(len(self.parents)):
+                if self.node_types[c] == NODE_TYPE_TEXT:
+                    self._text_children[self.parents[c]].append(c)
+
+        return self._text_children.get(i, [])
+
+    def box(self, i):
+        layout_i = self.layout_index[i]
+
+        if layout_i < 0 or (layout_i * 4) >= len(self.bounds):
+            return None
+
+        x, y, w, h = self.bounds[(layout_i * 4):(layout_i * 4) + 4]
+
+        return {
+            'x':      x,
+            'y':      y,
+            'width':  w,
+            'height': h,
+        }
+
+    def query(self, tag=None, id=None, class_name=None, attribute=None, value=None, text=None):
+        """
+        Return the indices of all element nodes matching every given criterion.
+
+        #### Arguments
+
+        - **tag** (`str`, optional): The (case-insensitive) tag name to match.
+        - **id** (`str`, optional): The exact value of the `id` attribute.
+        - **class_name** (`str`, optional): A class that must be present in the `class` attribute.
+        - **attribute** (`str`, optional): An attribute name that must be present.
+        - **value** (`str`, optional): If **attribute** is given, the exact value it must have.
+        - **text** (`str`, optional): A (case-insensitive) substring of the element's text.
+
+        #### Returns
+        A sorted `list` of node indices.
+        """
+        candidates = None
+
+        for key, index in [
+            (tag.lower() if tag else None, self.tags),
+            (id, self.ids),
+            (class_name, self.classes),
+            (attribute.lower() if attribute else None, self.attribute_names),
+        ]:
+            if key is None:
+                continue
+
+            matches = set(index.get(key, []))
+
+            if candidates is None:
+                candidates = matches
+            else:
+                candidates &= matches
+
+        if candidates is None:
+            candidates = set(
+                i for i in range(len(self.parents)) if self.node_types[i] == NODE_TYPE_ELEMENT
+            )
+
+        if attribute and value is not None:
+            candidates = set(
+                i for i in candidates if self.attributes(i).get(attribute) == value
+            )
+
+        if text is not None:
+            text = text.lower()
+            candidates = set(
+                i for i in candidates if text in self.text(i).lower()
+            )
+
+        return sorted(candidates)
+
+    def node(self, i):
+        return {
+            'index':           i,
+            'frame_id':        self.frame_id,
+            'backend_node_id': (self.backend_ids[i] if i < len(self.backend_ids) else None),
+            'parent_index':    self.parents[i],
+            'tag':             self.tag(i),
+            'attributes':      self.attributes(i),
+            'text':            self.text(i),
+            'bounds':          self.box(i),
+        }
+
+    def __len__(self):
+        return len(self.parents)
+
+
+class PageSnapshot(object):
+    """
+    A snapshot of every document (the top-level page and any frames) in a tab.
+    """
+    def __init__(self, definition, generation=None, version=None):
+        self.captured_at = time.time()
+        self.generation = generation
+        self.version = version
+        self.strings = definition.get('strings', [])
+        self._lowered = {}
+        self._text_index = None
+        self.documents = [
+            DocumentSnapshot(self, d) for d in definition.get('documents', [])
+        ]
+
+    def lowered_strings(self, index):
+        if index < 0:
+            return None
+
+        try:
+            return self._lowered[index]
+        except KeyError:
+            value = self._lowered[index] = self.strings[index].lower()
+            return value
+
+    def query(self, limit=None, **criteria):
+        """
+        Query all documents in the snapshot; see `DocumentSnapshot.query` for criteria.
+
+        #### Returns
+        A `list` of `dict` objects describing each matching node.
+        """
+        results = []
+
+        for document in self.documents:
+            for i in document.query(**criteria):
+                results.append(document.node(i))
+
+                if limit and len(results) >= limit:
+                    return results
+
+        return results
+
+    @property
+    def text_index(self):
+        """
+        A `webfriend.utils.textindex.TextIndex` of every text node in the snapshot, built the first
+        time it is accessed.  Each entry carries the _frame_id_, _backend_node_id_, and _tag_ of
+        the element containing the text.
+        """
+        if self._text_index is None:
+            index = TextIndex()
+
+            for document in self.documents:
+                for i in range(len(document)):
+                    if document.node_types[i] != NODE_TYPE_TEXT:
+                        continue
+
+                    parent = document.parents[i]
+
+                    if parent < 0 or document.node_types[parent] != NODE_TYPE_ELEMENT:
+                        continue
+
+                    tag = document.tag(parent)
+
+                    if tag in UNSEARCHABLE_TAGS:
+                        continue
+
+                    index.add(
+                        document.string(document.node_values[i]),
+                        frame_id=document.frame_id,
+                        backend_node_id=document.backend_ids[parent],
+                        tag=tag
+                    )
+
+            self._text_index = index
+
+        return self._text_index
+
+    def as_dict(self):
+        return {
+            'documents': len(self.documents),
+            'nodes':     sum([len(d) for d in self.documents]),
+            'strings':   len(self.strings),
+        }
+
+    def __len__(self):
+        return sum([len(d) for d in self.documents])
+
+
+class DOMSnapshot(Base):
+    """
+    See: https://chromedevtools.github.io/devtools-protocol/tot/DOMSnapshot
+
+    Snapshots used to answer `find` are reused until the document is replaced or a change to it
+    is observed.  Since the browser only reports changes to the parts of a document it has sent
+    us, they also expire after **find_max_age** seconds (like `webfriend.rpc.cache.QueryCache`.)
+    """
+    domain = 'DOMSnapshot'
+    supports_events = False
+    find_max_age = QueryCache.default_max_age
+
+    def __init__(self, tab):
+        super(DOMSnapshot, self).__init__(tab)
+        self.latest = None
+
+    def capture_snapshot(self, computed_styles=None, dom_rects=False, reply_timeout=None):
+        params = {
+            'computedStyles': (computed_styles or []),
+        }
+
+        if dom_rects:
+            params['includeDOMRects'] = True
+
+        return self.call('captureSnapshot', reply_timeout=reply_timeout, **params).result
+
+    def capture(self, computed_styles=None, reply_timeout=None):
+        """
+        Capture the entire page (including frames) in one call and store it as a local, indexed
+        `PageSnapshot` that can be queried without any further round trips.
+
+        #### Returns
+        The `webfriend.rpc.domsnapshot.PageSnapshot` that was captured.
+        """
+        self.latest = PageSnapshot(
+            self.capture_snapshot(computed_styles=computed_styles, reply_timeout=reply_timeout),
+            generation=self.tab.dom.element_cache.generation,
+            version=self.tab.dom.version
+        )
+
+        return self.latest
+
+    @property
+    def is_stale(self):
+        if self.latest is None:
+            return True
+
+        return (self.latest.generation != self.tab.dom.element_cache.generation)
+
+    def is_expired(self, max_age=None):
+        """
+        Whether the latest snapshot is missing, stale, out of date with the changes observed in
+        the document, or older than **max_age** seconds (default: **find_max_age**; zero or
+        `False` to never expire.)
+        """
+        if self.is_stale or self.latest.version != self.tab.dom.version:
+            return True
+
+        if max_age is None:
+            max_age = self.find_max_age
+
+        return bool(max_age and (time.time() - self.latest.captured_at) > max_age)
+
+    def find(
+        self,
+        text,
+        regex=False,
+        case_sensitive=False,
+        limit=None,
+        max_age=None,
+        reply_timeout=None
+    ):
+        """
+        Search the text of the page.  The page's text is captured (in a single snapshot) and
+        indexed locally, and repeated searches are answered from that index for as long as no
+        changes to the document have been observed and the snapshot is no older than **max_age**
+        seconds (default: **find_max_age**.)  The age limit catches changes the browser doesn't
+        report, such as those in parts of the document that were never sent to us.
+
+        See `webfriend.utils.textindex.TextIndex.search` for the remaining arguments.
+
+        #### Returns
+        A `list` of `dict` objects describing each match, with the keys _text_, _match_, _start_,
+        _end_, _frame_id_, _backend_node_id_ (of the element containing the text), and _tag_.
+        """
+        if self.is_expired(max_age):
+            self.capture(reply_timeout=reply_timeout)
+
+        return self.latest.text_index.search(
+            text,
+            regex=regex,
+            case_sensitive=case_sensitive,
+            limit=limit
+        )
@@ -0,0 +1,125 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend.rpc.domsnapshot import DOMSnapshot, PageSnapshot
+
+
+class PageSnapshotTest(TestCase):
+    def setUp(self):
+        # <html><body><div id="main" class="a b"><a href="/x">Hello</a></div><p class="b">World</p></body></html>
+        self.snapshot = PageSnapshot({
+            'strings': [
+                '#document', 'HTML', 'BODY', 'DIV', 'id', 'main', 'class', 'a b', 'A', 'href',
+                '/x', '#text', 'Hello', 'P', 'b', 'World', 'https://example.com/', 'F1',
+            ],
+            'documents': [{
+                'documentURL': 16,
+                'frameId':     17,
+                'nodes': {
+                    'parentIndex':   [-1, 0, 1, 2, 3, 4, 2, 6],
+                    'nodeType':      [9, 1, 1, 1, 1, 3, 1, 3],
+                    'nodeName':      [0, 1, 2, 3, 8, 11, 13, 11],
+                    'nodeValue':     [-1, -1, -1, -1, -1, 12, -1, 15],
+                    'backendNodeId': [1, 2, 3, 4, 5, 6, 7, 8],
+                    'attributes': [
+                        [], [], [], [4, 5, 6, 7], [9, 10], [], [6, 14], [],
+                    ],
+                },
+                'layout': {
+                    'nodeIndex': [3, 4],
+                    'bounds':    [[0, 0, 800, 20], [8, 8, 40, 16]],
+                },
+            }],
+        }, generation=1)
+
+    def test_indexed_queries(self):
+        self.assertEqual(['div'], [n['tag'] for n in self.snapshot.query(id='main')])
+        self.assertEqual(['div', 'p'], [n['tag'] for n in self.snapshot.query(class_name='b')])
+        self.assertEqual(['div'], [n['tag'] for n in self.snapshot.query(tag='DIV', class_name='b')])
+        self.assertEqual([], self.snapshot.query(tag='span'))
+        self.assertEqual([5], [n['backend_node_id'] for n in self.snapshot.query(
+            attribute='href',
+            value='/x'
+        )])
+
+    def test_text_and_layout(self):
+        results = self.snapshot.query(text='hello')
+
+        self.assertEqual(1, len(results))
+        self.assertEqual('a', results[0]['tag'])
+        self.assertEqual('Hello', results[0]['text'])
+        self.assertEqual({'href': '/x'}, results[0]['attributes'])
+        self.assertEqual({'x': 8, 'y': 8, 'width': 40, 'height': 16}, results[0]['bounds'])
+        self.assertEqual('F1', results[0]['frame_id'])
+        self.assertIsNone(self.snapshot.query(tag='p')[0]['bounds'])
+
+    def test_summary(self):
+        self.assertEqual({
+            'documents': 1,
+            'nodes':     8,
+            'strings':   18,
+        }, self.snapshot.as_dict())
+
+    def test_text_index(self):
+        results = self.snapshot.text_index.search('WORLD')
+
+        self.assertEqual(1, len(results))
+        self.assertEqual(7, results[0]['backend_node_id'])
+        self.assertEqual('p', results[0]['tag'])
+        self.assertEqual('F1', results[0]['frame_id'])
+        self.assertIs(self.snapshot.text_index, self.snapshot.text_index)
+
+
+class FakeReply(object):
+    def __init__(self, result):
+        self.result = result
+
+
+class FakeElementCache(object):
+    generation = 1
+
+
+class FakeDOM(object):
+    element_cache = FakeElementCache()
+    version = 0
+
+
+class SnapshotTab(object):
+    def __init__(self):
+        self.dom = FakeDOM()
+        self.captures = 0
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.captures += 1
+        return FakeReply({'strings': [], 'documents': []})
+
+
+class FindExpiryTest(TestCase):
+    def setUp(self):
+        self.tab = SnapshotTab()
+        self.snapshot = DOMSnapshot(self.tab)
+
+    def test_repeated_finds_use_index(self):
+        self.snapshot.find('x')
+        self.snapshot.find('x')
+        self.assertEqual(1, self.tab.captures)
+
+        # observed changes invalidate the index
+        self.tab.dom.version += 1
+        self.snapshot.find('x')
+        self.assertEqual(2, self.tab.captures)
+
+    def test_expires_after_max_age(self):
+        self.snapshot.find('x')
+        self.snapshot.latest.captured_at -= (self.snapshot.find_max_age + 1)
+
+        self.snapshot.find('x')
+        self.assertEqual(2, self.tab.captures)
+
+        self.snapshot.latest.captured_at -= 5
+        self.snapshot.find('x', max_age=60)
+        self.snapshot.find('x', max_age=0)
+        self.assertEqual(2, self.tab.captures)
+
+        self.snapshot.find('x', max_age=1)
+        self.assertEqual(3, self.tab.captures)
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 from webfriend.rpc import Base
 from webfriend import exceptions, utils
 from base64 import b64decode
+from collections import OrderedDict
 import os
 import time
 import logging
@@ -14,6 +15,125 @@ class Page(Base):
     domain = 'Page'
     capture_formats = ['jpeg', 'png']
 
+    def __init__(self, tab):
+        super(Page, self).__init__(tab)
+        self._frames = OrderedDict()
+        self._preloads = OrderedDict()
+
+    def initialize(self):
+        self.on('frameAttached', self.on_frame_attached)
+        self.on('frameNavigated', self.on_frame_navigated)
+        self.on('frameDetached', self.on_frame_detached)
+
+    @property
+    def frames(self):
+        """
+        Return a `list` of `dict` objects describing every frame in the current page (starting
+        with the top-level frame), each with the keys _id_, _parent_id_, _name_, and _url_.
+
+        The registry is kept current from frame events; if it is empty (e.g.: events were
+        enabled after the page loaded) it is populated from `Page.getFrameTree`.
+        """
+        if not len(self._frames):
+            self.get_frame_tree()
+
+        return self._frames.values()
+
+    def frame(self, frame_id):
+        if frame_id not in self._frames:
+            self.get_frame_tree()
+
+        return self._frames.get(frame_id)
+
+    def find_frame(self, frame):
+        """
+        Return the `dict` describing the frame with the given ID, name, or URL (in that order of
+        preference.)
+
+        #### Raises
+        `webfriend.exceptions.NotFound` if no frame matches.
+        """
+        for attempt in range(2):
+            for key in ('id', 'name', 'url'):
+                for definition in self.frames:
+                    if definition.get(key) == frame:
+                        return definition
+
+            # the registry may be missing frames that attached before events were enabled
+            if not attempt:
+                self.get_frame_tree()
+
+        raise exceptions.NotFound("No frame matches '{}'".format(frame))
+
+    @property
+    def top_frame_id(self):
+        for frame in self.frames:
+            if frame['parent_id'] is None:
+                return frame['id']
+
+        return None
+
+    def get_frame_tree(self):
+        """
+        Rebuild the frame registry from the browser's current frame tree.
+        """
+        frames = OrderedDict()
+        stack = [self.call('getFrameTree').get('frameTree', {})]
+
+        while len(stack):
+            node = stack.pop(0)
+
+            if 'frame' in node:
+                self.register_frame(node['frame'], frames=frames)
+
+            stack.extend(node.get('childFrames', []))
+
+        self._frames = frames
+        return frames.values()
+
+    def register_frame(self, definition, frames=None):
+        if frames is None:
+            frames = self._frames
+
+        frame_id = definition.get('id')
+        frame = frames.get(frame_id, {
+            'id':        frame_id,
+            'parent_id': None,
+            'name':      None,
+            'url':       None,
+        })
+
+        frame['parent_id'] = definition.get('parentId', frame['parent_id'])
+        frame['name'] = definition.get('name', frame['name'])
+        frame['url'] = definition.get('url', frame['url'])
+        frames[frame_id] = frame
+
+        return frame
+
+    def on_frame_attached(self, event):
+        self.register_frame({
+            'id':       event.get('frameId'),
+            'parentId': event.get('parentFrameId'),
+        })
+
+    def on_frame_navigated(self, event):
+        frame = event.get('frame', {})
+
+        # navigating the top-level frame replaces every frame below it
+        if not frame.get('parentId'):
+            self._frames = OrderedDict()
+
+        self.register_frame(frame)
+
+    def on_frame_detached(self, event):
+        detached = set([event.get('frameId')])
+
+        # remove the frame and everything nested within it
+        for frame in self._frames.values():
+            if frame['parent_id'] in detached or frame['id'] in detached:
+                detached.add(frame['id'])
+                self._frames.pop(frame['id'], None)
+
     def navigate(self, url, referrer=None, transition_type=None, clear_request_cache=True):
         params = {
             'url': url,
@@ -264,12 +384,77 @@ class Page(Base):
         self.call('screencastFrameAck', sessionId=session_id)
         return True
 
-    # addScriptToEvaluateOnLoad[ scriptSource=string ]
-    #   -> string(identifier)
-    #
-    # removeScriptToEvaluateOnLoad
-    #   -> string(identifier)
-    #
+    @property
+    def preloads(self):
+        """
+        Return a `dict` of the scripts registered with `add_preload`, keyed by identifier.
+        """
+        return dict(self._preloads)
+
+    def add_preload(self, source, now=True):
+        """
+        Register a script to be evaluated in every new document loaded in this tab (including
+        frames), before any of the document's own scripts run.  Registering the same script more
+        than once has no effect.
+
+        #### Arguments
+
+        - **source** (`str`):
+
+            The script to evaluate.
+
+        - **now** (`bool`):
+
+            Whether to also evaluate the script in the current document.
+
+        #### Returns
+        The identifier of the registered script, to be passed to `remove_preload`.
+        """
+        for identifier, existing in self._preloads.items():
+            if existing == source:
+                return identifier
+
+        identifier = self.call(
+            'addScriptToEvaluateOnNewDocument',
+            source=source
+        ).get('identifier')
+
+        self._preloads[identifier] = source
+
+        if now:
+            self.tab.runtime.evaluate(source, wrapper_fn=False)
+
+        return identifier
+
+    def remove_preload(self, identifier=None):
+        """
+        Stop evaluating a script registered with `add_preload` in new documents.
+
+        #### Arguments
+
+        - **identifier** (`str`, optional):
+
+            The script to remove.  If not given, all registered scripts are removed.
+
+        #### Returns
+        A `list` of the identifiers that were removed.
+
+        #### Raises
+        `KeyError` if **identifier** is not a registered script.
+        """
+        if identifier is None:
+            identifiers = self._preloads.keys()
+        elif identifier in self._preloads:
+            identifiers = [identifier]
+        else:
+            raise KeyError("Unknown preload script '{}'".format(identifier))
+
+        for i in identifiers:
+            self.call('removeScriptToEvaluateOnNewDocument', identifier=i)
+            self._preloads.pop(i, None)
+
+        return identifiers
+
     # setAutoAttachToCreatedPages [ autoAttach=bool ] -> Nothing
     #
     # getNavigationHistory
@@ -0,0 +1,115 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend.exceptions import NotFound
+from webfriend.rpc.page import Page
+
+
+class FakeReply(object):
+    def __init__(self, result):
+        self.result = result
+
+    def get(self, key, fallback=None):
+        return self.result.get(key, fallback)
+
+
+class FakeTab(object):
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        return FakeReply({
+            'frameTree': {
+                'frame': {'id': 'top', 'url': 'http://example.com/'},
+                'childFrames': [
+                    {
+                        'frame': {'id': 'a', 'parentId': 'top', 'name': 'ad'},
+                        'childFrames': [
+                            {'frame': {'id': 'a1', 'parentId': 'a'}},
+                        ],
+                    },
+                    {'frame': {'id': 'b', 'parentId': 'top', 'url': 'about:blank'}},
+                ],
+            },
+        })
+
+
+class FrameRegistryTest(TestCase):
+    def setUp(self):
+        self.page = Page(FakeTab())
+
+    def test_populated_from_frame_tree(self):
+        self.assertEqual(['top', 'a', 'b', 'a1'], [f['id'] for f in self.page.frames])
+        self.assertEqual('top', self.page.top_frame_id)
+        self.assertEqual('ad', self.page.frame('a')['name'])
+
+    def test_frame_events(self):
+        self.page.frames
+
+        self.page.on_frame_attached({'frameId': 'c', 'parentFrameId': 'b'})
+        self.page.on_frame_navigated({'frame': {'id': 'c', 'parentId': 'b', 'url': 'http://c/'}})
+        self.assertEqual('http://c/', self.page.frame('c')['url'])
+        self.assertEqual('b', self.page.frame('c')['parent_id'])
+
+        # detaching a frame removes everything nested within it
+        self.page.on_frame_detached({'frameId': 'a'})
+        self.assertEqual(['top', 'b', 'c'], [f['id'] for f in self.page.frames])
+
+        # top-level navigation replaces every frame
+        self.page.on_frame_navigated({'frame': {'id': 'top', 'url': 'http://other/'}})
+        self.assertEqual(['top'], [f['id'] for f in self.page.frames])
+
+    def test_find_frame(self):
+        self.assertEqual('a', self.page.find_frame('ad')['id'])
+        self.assertEqual('top', self.page.find_frame('http://example.com/')['id'])
+        self.assertEqual('b', self.page.find_frame('b')['id'])
+        self.assertRaises(NotFound, self.page.find_frame, 'missing')
+
+
+class FakeRuntime(object):
+    def __init__(self):
+        self.evaluated = []
+
+    def evaluate(self, expression, **kwargs):
+        self.evaluated.append((expression, kwargs))
+
+
+class PreloadTab(object):
+    def __init__(self):
+        self.calls = []
+        self.runtime = FakeRuntime()
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.calls.append((method, params))
+        return FakeReply({'identifier': str(len(self.calls))})
+
+
+class PreloadTest(TestCase):
+    def setUp(self):
+        self.tab = PreloadTab()
+        self.page = Page(self.tab)
+
+    def test_registered_once(self):
+        first = self.page.add_preload('window.a = 1;')
+
+        self.assertEqual(first, self.page.add_preload('window.a = 1;'))
+        self.assertEqual([
+            ('Page.addScriptToEvaluateOnNewDocument', {'source': 'window.a = 1;'}),
+        ], self.tab.calls)
+
+        self.assertEqual([('window.a = 1;', {'wrapper_fn': False})], self.tab.runtime.evaluated)
+
+        self.page.add_preload('window.b = 2;', now=False)
+        self.assertEqual(1, len(self.tab.runtime.evaluated))
+        self.assertEqual(2, len(self.page.preloads))
+
+    def test_remove(self):
+        first = self.page.add_preload('window.a = 1;')
+        second = self.page.add_preload('window.b = 2;')
+
+        self.assertEqual([first], self.page.remove_preload(first))
+        self.assertEqual(
+            ('Page.removeScriptToEvaluateOnNewDocument', {'identifier': first}),
+            self.tab.calls[-1]
+        )
+
+        self.assertRaises(KeyError, self.page.remove_preload, first)
+        self.assertEqual([second], self.page.remove_preload())
+        self.assertEqual({}, self.page.preloads)
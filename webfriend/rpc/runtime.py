@@ -1,7 +1,38 @@
 from __future__ import absolute_import
 from webfriend.rpc import Base
+from webfriend import exceptions
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import local, Lock
 from uuid import uuid4
-import json
+from websocket import WebSocketException
+import hashlib
+import logging
+import socket
+
+# The object group that installed script functions are held in for the life of the page.
+SCRIPT_OBJECT_GROUP = 'webfriend-scripts'
+
+# Called on an installed script function to run it with the given data bound to `this`.
+SCRIPT_INVOKE_FN = 'function(data){ return this.call(data); }'
+
+# Runs an installed script function and holds on to its result in the page as an array of rows.
+SCRIPT_HOLD_FN = """function(data){
+    return Promise.resolve(this.call(data)).then(function(result){
+        if(result === undefined || result === null){
+            result = [];
+        }else if(!Array.isArray(result)){
+            result = [result];
+        }
+
+        return {rows: result};
+    });
+}"""
+
+# Called on a held result to retrieve a slice of its rows (and the total number of rows.)
+SCRIPT_ROWS_FN = """function(start, size){
+    return [this.rows.slice(start, start + size), this.rows.length];
+}"""
 
 
 class EmbeddedScriptError(Exception):
@@ -18,6 +49,636 @@ class Runtime(Base):
     domain = 'Runtime'
     supports_events = False
 
+    def __init__(self, tab):
+        super(Runtime, self).__init__(tab)
+        self.groups_created    = 0
+        self.groups_released   = 0
+        self.objects_allocated = 0
+        self.objects_released  = 0
+        self.release_errors    = 0
+        self.scripts_installed = 0
+        self.script_hits       = 0
+        self._unreleased       = {}
+        self._allocated        = set()
+        self._scripts          = {}
+        self._contexts         = OrderedDict()
+        self._enabled          = False
+        self._local            = local()
+        self._lock             = Lock()
+
+    def initialize(self):
+        self.on('executionContextCreated', self.on_context_created)
+        self.on('executionContextDestroyed', self.on_context_destroyed)
+        self.on('executionContextsCleared', self.on_contexts_cleared)
+        self.tab.page.on('frameNavigated', self.on_frame_navigated)
+
+    def track_contexts(self):
+        """
+        Enable the domain's events, so that execution contexts are reported (see `contexts`.)
+        This is only done once contexts are first needed, since every script run would otherwise
+        be accompanied by console, context, and exception events.
+        """
+        if not self._enabled:
+            self.call('enable')
+            self._enabled = True
+
+    def on_context_created(self, event):
+        context = {
+            'id':       event.get('context.id'),
+            'frame_id': event.get('context.auxData.frameId'),
+            'origin':   event.get('context.origin'),
+            'name':     event.get('context.name'),
+            'default':  bool(event.get('context.auxData.isDefault', False)),
+        }
+
+        with self._lock:
+            self._contexts[context['id']] = context
+
+    def on_context_destroyed(self, event):
+        context_id = event.get('executionContextId')
+
+        with self._lock:
+            self._contexts.pop(context_id, None)
+
+            # scripts installed in the context went with it
+            for key in [k for k in self._scripts.keys() if k[0] == context_id]:
+                del self._scripts[key]
+
+    def on_contexts_cleared(self, event):
+        with self._lock:
+            self._contexts = OrderedDict()
+
+        self.clear_scripts()
+
+    @property
+    def contexts(self):
+        """
+        Return a `list` of `dict` objects describing every live execution context in the page,
+        with the keys _id_, _frame_id_, _origin_, _name_, and _default_ (whether it is the
+        frame's main context, as opposed to an isolated world created by an extension or by
+        `Page.createIsolatedWorld`.)  Contexts are only reported once `track_contexts` has been
+        called, which `context_for` does as needed.
+        """
+        with self._lock:
+            return [dict(c) for c in self._contexts.values()]
+
+    def context_for(self, frame_id=None, origin=None):
+        """
+        Return the ID of the main execution context of the given frame (or of the first frame
+        with the given origin), for use as the **context_id** of `evaluate` and `run_script`.
+
+        #### Raises
+        `webfriend.exceptions.NotFound` if no such context exists.
+        """
+        for attempt in range(2):
+            for context in self.contexts:
+                if not context['default']:
+                    continue
+
+                if frame_id is not None and context['frame_id'] != frame_id:
+                    continue
+
+                if origin is not None and context['origin'] != origin:
+                    continue
+
+                return context['id']
+
+            if attempt:
+                break
+
+            # contexts are reported when the domain is enabled and as they are created, so make
+            # sure any that were just created have been handled
+            self.track_contexts()
+
+            self.tab.sync_events()
+
+        raise exceptions.NotFound("No execution context for frame={} origin={}".format(
+            frame_id,
+            origin
+        ))
+
+    def on_frame_navigated(self, event):
+        # installed scripts belong to the top-level document and are gone once it is replaced
+        if not event.get('frame.parentId'):
+            self.clear_scripts()
+
+    def clear_scripts(self):
+        """
+        Forget all installed scripts, so that they are reinstalled the next time they are run.
+        """
+        with self._lock:
+            self._scripts = {}
+
+    @property
+    def current_object_group(self):
+        """
+        The name of the object group remote objects are currently being allocated in (on this
+        thread), or `None`.
+        """
+        return getattr(self._local, 'group', None)
+
+    @contextmanager
+    def object_group(self, name=None):
+        """
+        A context manager that allocates all remote objects created within it (by this module and
+        by `webfriend.rpc.DOM`) in a single object group, and releases the whole group with one
+        call on exit, regardless of whether an exception was raised.
+
+        The release is skipped if no call made within the context passed the group (so contexts
+        that never allocate anything cost no round trips), or if the tab has since disconnected.
+
+        If a group is already active on the current thread, it is reused and left for the
+        outermost context to release.
+
+        #### Arguments
+
+        - **name** (`str`, optional):
+
+            The name of the group to create.  A unique name is generated if not given.
+
+        #### Returns
+        The name of the active object group.
+        """
+        current = self.current_object_group
+
+        if current is not None:
+            yield current
+            return
+
+        group = (name or 'webfriend-{}'.format(uuid4().hex))
+        self._local.group = group
+
+        with self._lock:
+            self.groups_created += 1
+
+        try:
+            yield group
+        finally:
+            self._local.group = None
+            self._release_group(group)
+
+    def allocating(self, object_group):
+        """
+        Record that a call is about to pass the given object group (and so may allocate remote
+        objects in it), so that the group will be released when its context exits.
+
+        #### Returns
+        The given object group.
+        """
+        if object_group is not None:
+            with self._lock:
+                self._allocated.add(object_group)
+
+        return object_group
+
+    def _release_group(self, group):
+        with self._lock:
+            if group not in self._allocated:
+                return
+
+            self._allocated.discard(group)
+
+        if not self.tab.connected:
+            logging.debug('Not releasing object group {}: tab is disconnected'.format(group))
+            return
+
+        try:
+            self.release_object_group(group)
+        except (
+            exceptions.ProtocolError,
+            exceptions.TimeoutError,
+            WebSocketException,
+            socket.error
+        ) as e:
+            with self._lock:
+                self.release_errors += 1
+
+            logging.warning('Failed to release object group {}: {}'.format(group, e))
+
+    def track(self, object_id, object_group=None, description=None):
+        """
+        Record that a remote object was allocated.  Objects allocated outside of an object group
+        are remembered until they are released with `release_object`, so that leaks can be found
+        with `check_unreleased`.
+        """
+        with self._lock:
+            self.objects_allocated += 1
+
+            if object_group is None:
+                self._unreleased[object_id] = description
+            else:
+                self._allocated.add(object_group)
+
+        return object_id
+
+    @property
+    def unreleased_objects(self):
+        """
+        A `dict` of remote object IDs that were allocated outside of any object group and have
+        not been released, along with a description of where they came from.
+        """
+        with self._lock:
+            return dict(self._unreleased)
+
+    def check_unreleased(self):
+        """
+        Log a warning for every remote object that was allocated outside of an object group and
+        never released.
+
+        #### Returns
+        A `list` of the unreleased object IDs.
+        """
+        unreleased = self.unreleased_objects
+
+        for object_id, description in unreleased.items():
+            logging.warning('Remote object {} ({}) was never released'.format(
+                object_id,
+                (description or 'unknown origin')
+            ))
+
+        return unreleased.keys()
+
+    @property
+    def object_stats(self):
+        """
+        Return a `dict` of counters describing remote object allocation and release.
+        """
+        return {
+            'groups_created':    self.groups_created,
+            'groups_released':   self.groups_released,
+            'objects_allocated': self.objects_allocated,
+            'objects_released':  self.objects_released,
+            'unreleased':        len(self._unreleased),
+            'release_errors':    self.release_errors,
+        }
+
+    @property
+    def script_stats(self):
+        """
+        Return a `dict` of counters describing the installed script cache.
+        """
+        with self._lock:
+            return {
+                'installed': self.scripts_installed,
+                'hits':      self.script_hits,
+                'cached':    len(self._scripts),
+            }
+
+    def install_script(self, body, context_id=None, include_command_line_api=None, calling_context=None):
+        """
+        Compile the given script body into a function in the page, once.  Installed functions are
+        cached by the hash of their body (and the execution context they were installed in) and
+        held in a persistent object group rather than page globals, so running the same script
+        again costs a single call and does not recompile it.
+
+        #### Returns
+        The remote object ID of the installed function.
+
+        #### Raises
+        `webfriend.rpc.runtime.EmbeddedScriptError` if the script could not be compiled.
+        """
+        key = self._script_key(body, context_id)
+
+        with self._lock:
+            function_id = self._scripts.get(key)
+
+            if function_id is not None:
+                self.script_hits += 1
+                return function_id
+
+        reply = self.call('evaluate', **self._install_params(body, context_id, include_command_line_api))
+        self.raise_for_exception(reply, calling_context=calling_context)
+
+        return self._store_script(key, reply)
+
+    def _script_key(self, body, context_id):
+        return (context_id, hashlib.sha1(body.encode('utf-8')).hexdigest())
+
+    def _install_params(self, body, context_id, include_command_line_api):
+        params = {
+            # the body starts on the first line so that error positions line up with the script
+            'expression':    '(function(){{ {}\n}})'.format(body),
+            'objectGroup':   SCRIPT_OBJECT_GROUP,
+            'returnByValue': False,
+        }
+
+        if context_id is not None:
+            params['contextId'] = context_id
+
+        if include_command_line_api is not None:
+            params['includeCommandLineAPI'] = include_command_line_api
+
+        return params
+
+    def _store_script(self, key, reply):
+        function_id = reply.result.get('result', {}).get('objectId')
+
+        with self._lock:
+            self._scripts[key] = function_id
+            self.scripts_installed += 1
+
+        return function_id
+
+    def run_script_many(
+        self,
+        body,
+        context_ids,
+        data=None,
+        include_command_line_api=None,
+        calling_context=None,
+        reply_timeout=None
+    ):
+        """
+        Run the given script body in several execution contexts (e.g.: one per frame) at once.
+        The script is installed in every context that doesn't already have it in one round
+        trip, and then run in all of them in another, so the contexts evaluate it concurrently.
+
+        #### Arguments
+
+        - **body** (`str`):
+
+            The script to run.
+
+        - **context_ids** (`list`):
+
+            The execution contexts to run the script in (see `context_for`.)
+
+        - **data** (`dict`, optional):
+
+            The data to bind to `this` in the script.
+
+        #### Returns
+        A `list` with a `dict` for each context, in the same order as **context_ids**.  Each
+        contains the key _value_ with the value the script returned there, or the key _error_
+        with a description of why it failed there.
+        """
+        results = [{} for _ in context_ids]
+        functions = {}
+        missing = []
+
+        with self._lock:
+            for i, context_id in enumerate(context_ids):
+                function_id = self._scripts.get(self._script_key(body, context_id))
+
+                if function_id is None:
+                    missing.append(i)
+                else:
+                    self.script_hits += 1
+                    functions[i] = function_id
+
+        def record_error(i, reply):
+            try:
+                if isinstance(reply, Exception):
+                    raise reply
+
+                self.raise_for_exception(reply, calling_context=calling_context)
+            except (exceptions.WebfriendError, EmbeddedScriptError) as e:
+                results[i]['error'] = '{}'.format(e)
+                return True
+
+            return False
+
+        if len(missing):
+            replies = self.call_many([
+                ('evaluate', self._install_params(body, context_ids[i], include_command_line_api))
+                for i in missing
+            ], reply_timeout=reply_timeout, raise_errors=False)
+
+            for i, reply in zip(missing, replies):
+                if not record_error(i, reply):
+                    functions[i] = self._store_script(self._script_key(body, context_ids[i]), reply)
+
+        order = sorted(functions.keys())
+
+        if not len(order):
+            return results
+
+        replies = self.call_many([
+            ('callFunctionOn', {
+                'objectId':            functions[i],
+                'functionDeclaration': SCRIPT_INVOKE_FN,
+                'arguments':           [{
+                    'value': (data if isinstance(data, dict) else {}),
+                }],
+                'returnByValue':       True,
+                'awaitPromise':        True,
+            }) for i in order
+        ], reply_timeout=reply_timeout, raise_errors=False)
+
+        for i, reply in zip(order, replies):
+            if not record_error(i, reply):
+                results[i]['value'] = reply.result.get('result', {}).get('value')
+
+        return results
+
+    def run_script(
+        self,
+        body,
+        data=None,
+        object_group=None,
+        include_command_line_api=None,
+        silent=None,
+        context_id=None,
+        return_by_value=True,
+        generate_preview=None,
+        user_gesture=None,
+        await_promise=None,
+        obj_own_properties=True,
+        obj_accessors_only=False,
+        obj_preview=False,
+        calling_context=None,
+        reply_timeout=None
+    ):
+        """
+        Run the given script body as a function with **data** bound to `this`, installing it in
+        the page first if necessary (see `install_script`.)  If the page was replaced since the
+        script was installed, it is reinstalled and the call retried once.
+
+        #### Returns
+        The value returned from the script (or its properties, if **return_by_value** is false.)
+        """
+        if object_group is None:
+            object_group = self.current_object_group
+
+        params = {
+            'returnByValue': return_by_value,
+        }
+
+        # results would otherwise be allocated in the (persistent) group of the function
+        if object_group is not None:
+            params['objectGroup'] = self.allocating(object_group)
+
+        if silent is not None:
+            params['silent'] = silent
+
+        if generate_preview is not None:
+            params['generatePreview'] = generate_preview
+
+        if user_gesture is not None:
+            params['userGesture'] = user_gesture
+
+        if await_promise is not None:
+            params['awaitPromise'] = await_promise
+
+        reply = self._call_script(
+            body,
+            SCRIPT_INVOKE_FN,
+            data,
+            params,
+            context_id=context_id,
+            include_command_line_api=include_command_line_api,
+            calling_context=calling_context,
+            reply_timeout=reply_timeout
+        )
+
+        return self.script_result(
+            reply,
+            return_by_value=return_by_value,
+            object_group=object_group,
+            obj_own_properties=obj_own_properties,
+            obj_accessors_only=obj_accessors_only,
+            obj_preview=obj_preview,
+            calling_context=calling_context
+        )
+
+    def iter_script(
+        self,
+        body,
+        data=None,
+        chunk_size=1000,
+        include_command_line_api=None,
+        context_id=None,
+        calling_context=None,
+        reply_timeout=None
+    ):
+        """
+        Run the given script body like `run_script`, but keep its result in the page and retrieve
+        it in slices as it is consumed, rather than transferring (and parsing) all of it at once.
+
+        #### Arguments
+
+        - **body** (`str`):
+
+            The script to run.  If it returns an array (or a promise resolving to one), each
+            element is a row; any other value is a single row, and `null` or `undefined` are no
+            rows at all.
+
+        - **data** (`dict`, optional):
+
+            The data to bind to `this` in the script.
+
+        - **chunk_size** (`int`):
+
+            The maximum number of rows to retrieve from the page at a time.
+
+        #### Returns
+        A generator yielding each row of the result in order.  The result is held in the page
+        until the generator is exhausted or closed.
+
+        #### Raises
+        - `webfriend.rpc.runtime.EmbeddedScriptError` if the script raised an exception.
+        - `ValueError` if **chunk_size** is not a positive integer.
+        """
+        if not isinstance(chunk_size, (int, long)) or isinstance(chunk_size, bool) or chunk_size <= 0:
+            raise ValueError("'chunk_size' must be a positive integer")
+
+        group = 'webfriend-rows-{}'.format(uuid4().hex)
+
+        reply = self._call_script(
+            body,
+            SCRIPT_HOLD_FN,
+            data,
+            {
+                'objectGroup':   group,
+                'returnByValue': False,
+                'awaitPromise':  True,
+            },
+            context_id=context_id,
+            include_command_line_api=include_command_line_api,
+            calling_context=calling_context,
+            reply_timeout=reply_timeout
+        )
+
+        with self._lock:
+            self.groups_created += 1
+            self._allocated.add(group)
+
+        rows = self._iter_rows(reply, group, chunk_size, calling_context, reply_timeout)
+
+        # advance into the generator so that the group is released even if it is closed (or
+        # garbage collected) before the first row is read, and so script errors raise here
+        next(rows)
+        return rows
+
+    def _iter_rows(self, reply, group, chunk_size, calling_context, reply_timeout):
+        try:
+            self.raise_for_exception(reply, calling_context=calling_context)
+            holder_id = reply.result.get('result', {}).get('objectId')
+            start = 0
+
+            yield None
+
+            while True:
+                reply = self.call_function_on(
+                    holder_id,
+                    SCRIPT_ROWS_FN,
+                    arguments=[start, chunk_size],
+                    return_by_value=True,
+                    reply_timeout=reply_timeout
+                )
+
+                self.raise_for_exception(reply, calling_context=calling_context)
+                rows, total = reply.result.get('result', {}).get('value') or ([], 0)
+
+                # each slice is let go of before the next is retrieved
+                for row in rows:
+                    yield row
+
+                start += len(rows)
+                rows = None
+
+                if start >= total:
+                    break
+        finally:
+            self._release_group(group)
+
+    def _call_script(
+        self,
+        body,
+        function,
+        data,
+        params,
+        context_id=None,
+        include_command_line_api=None,
+        calling_context=None,
+        reply_timeout=None
+    ):
+        for attempt in range(2):
+            function_id = self.install_script(
+                body,
+                context_id=context_id,
+                include_command_line_api=include_command_line_api,
+                calling_context=calling_context
+            )
+
+            call_params = dict(params)
+            call_params.update({
+                'objectId':            function_id,
+                'functionDeclaration': function,
+                'arguments':           [{
+                    'value': (data if isinstance(data, dict) else {}),
+                }],
+            })
+
+            try:
+                return self.call('callFunctionOn', reply_timeout=reply_timeout, **call_params)
+            except exceptions.ProtocolError:
+                if attempt:
+                    raise
+
+                # the function is gone along with the context it was installed in
+                self.clear_scripts()
+
     def evaluate(
         self,
         expression,
@@ -34,33 +695,39 @@ class Runtime(Base):
         obj_preview=False,
         wrapper_fn=True,
         data=None,
-        calling_context=None
+        calling_context=None,
+        reply_timeout=None
     ):
-        if isinstance(data, dict):
-            data_serialized = json.dumps(data)
-        else:
-            data_serialized = '{}'  # empty javascript object literal
-
         if wrapper_fn:
-            fn_name = 'webfriend_{}_fn'.format(str(uuid4()).replace('-', '_'))
-
-            # declare variable to hold the anonymous function, bound to the data that was passed in
-            # and call the function
-            expression = 'var {} = function(){{ {} }}.bind({}); {}();'.format(
-                fn_name,
+            # run the expression as a function bound to the data that was passed in
+            return self.run_script(
                 expression,
-                data_serialized,
-                fn_name,
-                fn_name
+                data=data,
+                object_group=object_group,
+                include_command_line_api=include_command_line_api,
+                silent=silent,
+                context_id=context_id,
+                return_by_value=return_by_value,
+                generate_preview=generate_preview,
+                user_gesture=user_gesture,
+                await_promise=await_promise,
+                obj_own_properties=obj_own_properties,
+                obj_accessors_only=obj_accessors_only,
+                obj_preview=obj_preview,
+                calling_context=calling_context,
+                reply_timeout=reply_timeout
             )
 
+        if object_group is None:
+            object_group = self.current_object_group
+
         params = {
             'expression':    expression,
             'returnByValue': return_by_value,
         }
 
         if object_group is not None:
-            params['objectGroup'] = object_group
+            params['objectGroup'] = self.allocating(object_group)
 
         if include_command_line_api is not None:
             params['includeCommandLineAPI'] = include_command_line_api
@@ -80,8 +747,22 @@ class Runtime(Base):
         if await_promise is not None:
             params['awaitPromise'] = await_promise
 
-        reply = self.call('evaluate', **params)
+        reply = self.call('evaluate', reply_timeout=reply_timeout, **params)
 
+        return self.script_result(
+            reply,
+            return_by_value=return_by_value,
+            object_group=object_group,
+            obj_own_properties=obj_own_properties,
+            obj_accessors_only=obj_accessors_only,
+            obj_preview=obj_preview,
+            calling_context=calling_context
+        )
+
+    def raise_for_exception(self, reply, calling_context=None):
+        """
+        Raise an `EmbeddedScriptError` if the given evaluation reply describes a thrown exception.
+        """
         if 'exceptionDetails' in reply.result:
             exception   = reply.result['exceptionDetails']
             detail      = exception.get('exception', {})
@@ -108,31 +789,63 @@ class Runtime(Base):
                 line_number
             ), line=line_number, col=col_number)
 
-        else:
-            result = reply.result.get('result', {})
+    def script_result(
+        self,
+        reply,
+        return_by_value=True,
+        object_group=None,
+        obj_own_properties=True,
+        obj_accessors_only=False,
+        obj_preview=False,
+        calling_context=None
+    ):
+        """
+        Convert the reply from evaluating a script into its return value.
+        """
+        self.raise_for_exception(reply, calling_context=calling_context)
+
+        result = reply.result.get('result', {})
+
+        if return_by_value:
+            return result.get('value')
+        elif 'objectId' in result:
+            self.track(result['objectId'], object_group, description='evaluate')
 
-            if return_by_value:
-                return result.get('value')
-            elif 'objectId' in result:
+            try:
                 return self.get_properties(
                     result['objectId'],
                     own_properties=obj_own_properties,
                     accessors_only=obj_accessors_only,
                     preview=obj_preview
                 )
-            else:
-                return None
-
-    def call_function_on(self, object_id, fn_name, arguments=None, return_by_value=False):
-        return self.call(
-            'callFunctionOn',
-            objectId=object_id,
-            functionDeclaration=fn_name,
-            arguments=[{
+            finally:
+                if object_group is None:
+                    self.release_object(result['objectId'])
+        else:
+            return None
+
+    def call_function_on(
+        self,
+        object_id,
+        fn_name,
+        arguments=None,
+        return_by_value=False,
+        await_promise=None,
+        reply_timeout=None
+    ):
+        params = {
+            'objectId':            object_id,
+            'functionDeclaration': fn_name,
+            'arguments': [{
                 'value': v,
             } for v in (arguments or [])],
-            returnByValue=return_by_value
-        )
+            'returnByValue':       return_by_value,
+        }
+
+        if await_promise is not None:
+            params['awaitPromise'] = await_promise
+
+        return self.call('callFunctionOn', reply_timeout=reply_timeout, **params)
 
     def get_properties(
         self,
@@ -159,5 +872,12 @@ class Runtime(Base):
     def release_object(self, object_id):
         self.call('releaseObject', objectId=object_id)
 
+        with self._lock:
+            self.objects_released += 1
+            self._unreleased.pop(object_id, None)
+
     def release_object_group(self, object_group):
         self.call('releaseObjectGroup', objectGroup=object_group)
+
+        with self._lock:
+            self.groups_released += 1
@@ -0,0 +1,377 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend.exceptions import NotFound, ProtocolError
+from webfriend.rpc.event import Event
+from webfriend.rpc.runtime import Runtime, EmbeddedScriptError, SCRIPT_OBJECT_GROUP
+from webfriend.rpc.runtime import SCRIPT_HOLD_FN, SCRIPT_ROWS_FN
+
+
+class FakeReply(object):
+    def __init__(self, result):
+        self.result = result
+
+    def get(self, key, fallback=None):
+        return self.result.get(key, fallback)
+
+
+class FakeTab(object):
+    connected = True
+
+    def __init__(self):
+        self.calls = []
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.calls.append((method, params))
+        return FakeReply({})
+
+
+class ObjectGroupTest(TestCase):
+    def setUp(self):
+        self.tab = FakeTab()
+        self.runtime = Runtime(self.tab)
+
+    def test_nested_groups_released_once(self):
+        with self.runtime.object_group() as outer:
+            self.runtime.track('obj-1', self.runtime.current_object_group)
+
+            with self.runtime.object_group() as inner:
+                self.assertEqual(outer, inner)
+                self.runtime.track('obj-2', self.runtime.current_object_group)
+
+            self.assertEqual([], self.tab.calls)
+
+        self.assertIsNone(self.runtime.current_object_group)
+        self.assertEqual([
+            ('Runtime.releaseObjectGroup', {'objectGroup': outer}),
+        ], self.tab.calls)
+
+        self.assertEqual({
+            'groups_created':    1,
+            'groups_released':   1,
+            'objects_allocated': 2,
+            'objects_released':  0,
+            'unreleased':        0,
+            'release_errors':    0,
+        }, self.runtime.object_stats)
+
+    def test_released_on_exception(self):
+        try:
+            with self.runtime.object_group('failing') as group:
+                self.runtime.track('obj-1', group)
+                raise ValueError('boom')
+        except ValueError:
+            pass
+
+        self.assertEqual([
+            ('Runtime.releaseObjectGroup', {'objectGroup': 'failing'}),
+        ], self.tab.calls)
+
+    def test_unused_group_not_released(self):
+        with self.runtime.object_group():
+            self.runtime.call('getIsolateId')
+
+        with self.runtime.object_group():
+            pass
+
+        self.assertEqual(['Runtime.getIsolateId'], [c[0] for c in self.tab.calls])
+        self.assertEqual(0, self.runtime.object_stats['groups_released'])
+
+    def test_group_passed_to_call_is_released(self):
+        with self.runtime.object_group() as group:
+            self.runtime.evaluate('1 + 1', wrapper_fn=False)
+
+        self.assertEqual([
+            ('Runtime.evaluate', {
+                'expression':            '1 + 1',
+                'returnByValue':         True,
+                'includeCommandLineAPI': True,
+                'objectGroup':           group,
+            }),
+            ('Runtime.releaseObjectGroup', {'objectGroup': group}),
+        ], self.tab.calls)
+
+    def test_not_released_once_disconnected(self):
+        with self.runtime.object_group() as group:
+            self.runtime.track('obj-1', group)
+            self.tab.connected = False
+
+        self.assertEqual([], self.tab.calls)
+        self.assertEqual(0, self.runtime.object_stats['release_errors'])
+
+    def test_ungrouped_objects_tracked_until_released(self):
+        self.runtime.track('obj-1', description='node 5')
+        self.runtime.track('obj-2')
+
+        self.assertEqual({'obj-1': 'node 5', 'obj-2': None}, self.runtime.unreleased_objects)
+
+        self.runtime.release_object('obj-1')
+
+        self.assertEqual(['obj-2'], self.runtime.check_unreleased())
+
+
+class ScriptTab(object):
+    connected = True
+
+    def __init__(self, rows=None):
+        self.calls = []
+        self.installed = {}
+        self.rows = rows
+        self.held = {}
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        self.calls.append(method)
+
+        if method == 'Runtime.evaluate':
+            if 'syntax error' in params['expression']:
+                return FakeReply({
+                    'exceptionDetails': {
+                        'lineNumber':   0,
+                        'columnNumber': 7,
+                        'text':         'SyntaxError',
+                    },
+                })
+
+            function_id = 'fn-{}'.format(len(self.installed))
+            self.installed[function_id] = params
+
+            return FakeReply({'result': {'objectId': function_id}})
+
+        elif method == 'Runtime.callFunctionOn':
+            if params['functionDeclaration'] == SCRIPT_HOLD_FN:
+                if self.rows is None:
+                    return FakeReply({
+                        'exceptionDetails': {
+                            'lineNumber':   2,
+                            'columnNumber': 0,
+                            'text':         'ReferenceError',
+                        },
+                    })
+
+                self.held['rows-1'] = params['objectGroup']
+                return FakeReply({'result': {'objectId': 'rows-1'}})
+
+            elif params['functionDeclaration'] == SCRIPT_ROWS_FN:
+                start, size = [a['value'] for a in params['arguments']]
+                return FakeReply({
+                    'result': {'value': [self.rows[start:start + size], len(self.rows)]},
+                })
+
+            if params['objectId'] not in self.installed:
+                raise ProtocolError('Protocol Error -32000: Could not find object with given id')
+
+            return FakeReply({'result': {'value': params['arguments'][0]['value'].get('x')}})
+
+        return FakeReply({})
+
+
+class ScriptCacheTest(TestCase):
+    def setUp(self):
+        self.tab = ScriptTab()
+        self.runtime = Runtime(self.tab)
+
+    def test_installed_once(self):
+        self.assertEqual(1, self.runtime.evaluate('return this.x', data={'x': 1}))
+        self.assertEqual(2, self.runtime.evaluate('return this.x', data={'x': 2}))
+        self.runtime.evaluate('return null')
+
+        self.assertEqual([
+            'Runtime.evaluate',
+            'Runtime.callFunctionOn',
+            'Runtime.callFunctionOn',
+            'Runtime.evaluate',
+            'Runtime.callFunctionOn',
+        ], self.tab.calls)
+
+        # functions are held in the script group rather than assigned to page globals
+        params = self.tab.installed['fn-0']
+        self.assertEqual(SCRIPT_OBJECT_GROUP, params['objectGroup'])
+        self.assertTrue(params['expression'].startswith('(function(){ return this.x'))
+        self.assertEqual({'installed': 2, 'hits': 1, 'cached': 2}, self.runtime.script_stats)
+
+    def test_cleared_on_navigation(self):
+        self.runtime.evaluate('return this.x', data={'x': 1})
+
+        # subframe navigations leave the top-level document (and its scripts) alone
+        self.runtime.on_frame_navigated(Event(self.runtime, 'Page.frameNavigated', {
+            'frame': {'id': 'sub', 'parentId': 'top'},
+        }))
+        self.runtime.evaluate('return this.x', data={'x': 1})
+        self.assertEqual(1, self.runtime.script_stats['installed'])
+
+        self.runtime.on_frame_navigated(Event(self.runtime, 'Page.frameNavigated', {
+            'frame': {'id': 'top'},
+        }))
+        self.runtime.evaluate('return this.x', data={'x': 1})
+        self.assertEqual(2, self.runtime.script_stats['installed'])
+
+    def test_stale_function_reinstalled(self):
+        self.runtime.evaluate('return this.x', data={'x': 1})
+        self.tab.installed.clear()
+
+        self.assertEqual(5, self.runtime.evaluate('return this.x', data={'x': 5}))
+        self.assertEqual(2, self.runtime.script_stats['installed'])
+
+    def test_compile_error(self):
+        with self.assertRaises(EmbeddedScriptError) as ctx:
+            self.runtime.evaluate('syntax error')
+
+        self.assertEqual(1, ctx.exception.line)
+        self.assertEqual(0, self.runtime.script_stats['cached'])
+
+
+class StreamTest(TestCase):
+    def test_rows_retrieved_in_slices(self):
+        tab = ScriptTab(rows=range(7))
+        runtime = Runtime(tab)
+        rows = runtime.iter_script('return this.rows', chunk_size=3)
+
+        self.assertEqual(['Runtime.evaluate', 'Runtime.callFunctionOn'], tab.calls)
+        self.assertEqual([0, 1, 2], [next(rows) for _ in range(3)])
+        self.assertEqual(2, tab.calls.count('Runtime.callFunctionOn'))
+        self.assertEqual([3, 4, 5, 6], list(rows))
+        self.assertEqual(4, tab.calls.count('Runtime.callFunctionOn'))
+
+        self.assertEqual('Runtime.releaseObjectGroup', tab.calls[-1])
+        self.assertEqual(runtime.object_stats['groups_created'], runtime.object_stats['groups_released'])
+
+    def test_released_when_closed_early(self):
+        tab = ScriptTab(rows=[])
+        runtime = Runtime(tab)
+        runtime.iter_script('return []').close()
+
+        self.assertEqual('Runtime.releaseObjectGroup', tab.calls[-1])
+        self.assertEqual([], list(Runtime(ScriptTab(rows=[])).iter_script('return []')))
+
+    def test_errors(self):
+        tab = ScriptTab()
+        runtime = Runtime(tab)
+
+        self.assertRaises(EmbeddedScriptError, runtime.iter_script, 'return missing')
+        self.assertEqual('Runtime.releaseObjectGroup', tab.calls[-1])
+        self.assertRaises(ValueError, runtime.iter_script, 'return []', chunk_size=0)
+
+
+class ContextTab(object):
+    connected = True
+
+    def __init__(self):
+        self.calls = []
+        self.synced = 0
+        self.installed = 0
+
+    def sync_events(self):
+        self.synced += 1
+
+    def reply(self, method, params):
+        self.calls.append((method, params))
+
+        if method == 'Runtime.evaluate':
+            if params.get('contextId') == 3:
+                return ProtocolError('Protocol Error -32000: Cannot find context with specified id')
+
+            self.installed += 1
+            return FakeReply({'result': {'objectId': 'fn-{}'.format(params.get('contextId'))}})
+
+        elif method == 'Runtime.callFunctionOn':
+            if params['objectId'] == 'fn-2':
+                return FakeReply({
+                    'exceptionDetails': {
+                        'lineNumber':   0,
+                        'columnNumber': 0,
+                        'text':         'Uncaught TypeError',
+                    },
+                })
+
+            return FakeReply({'result': {'value': params['objectId']}})
+
+        return FakeReply({})
+
+    def rpc(self, method, expect_reply=True, reply_timeout=None, **params):
+        reply = self.reply(method, params)
+
+        if isinstance(reply, Exception):
+            raise reply
+
+        return reply
+
+    def rpc_many(self, calls, reply_timeout=None, raise_errors=True):
+        return [self.reply(method, params) for method, params in calls]
+
+
+def context_event(runtime, context_id, frame_id, default=True):
+    return Event(runtime, 'executionContextCreated', {
+        'context': {
+            'id':      context_id,
+            'origin':  'http://{}'.format(frame_id),
+            'name':    '',
+            'auxData': {'frameId': frame_id, 'isDefault': default},
+        },
+    })
+
+
+class ExecutionContextTest(TestCase):
+    def setUp(self):
+        self.tab = ContextTab()
+        self.runtime = Runtime(self.tab)
+        self.runtime.on_context_created(context_event(self.runtime, 1, 'top'))
+        self.runtime.on_context_created(context_event(self.runtime, 2, 'child'))
+        self.runtime.on_context_created(context_event(self.runtime, 9, 'child', default=False))
+
+    def test_registry(self):
+        self.assertEqual([1, 2, 9], [c['id'] for c in self.runtime.contexts])
+        self.assertEqual(2, self.runtime.context_for(frame_id='child'))
+        self.assertEqual(1, self.runtime.context_for(origin='http://top'))
+
+        self.runtime.on_context_destroyed(Event(self.runtime, 'executionContextDestroyed', {
+            'executionContextId': 2,
+        }))
+
+        # a missing context is looked for again once pending events have been handled
+        self.assertRaises(NotFound, self.runtime.context_for, frame_id='child')
+        self.assertEqual(1, self.tab.synced)
+        self.assertEqual([('Runtime.enable', {})], self.tab.calls)
+
+        self.runtime.on_contexts_cleared(Event(self.runtime, 'executionContextsCleared', {}))
+        self.assertEqual([], self.runtime.contexts)
+
+    def test_events_enabled_only_when_contexts_needed(self):
+        # Tab.enable_events enables every domain; Runtime's events stay off until needed
+        self.runtime.enable()
+        self.assertEqual([], self.tab.calls)
+
+        self.runtime.context_for(frame_id='top')
+        self.assertEqual([], self.tab.calls)
+
+        self.assertRaises(NotFound, self.runtime.context_for, frame_id='other')
+        self.assertRaises(NotFound, self.runtime.context_for, frame_id='other')
+        self.assertEqual([('Runtime.enable', {})], self.tab.calls)
+
+    def test_scripts_dropped_with_context(self):
+        self.runtime.evaluate('return 1', context_id=1)
+        self.runtime.evaluate('return 1', context_id=1)
+        self.assertEqual(1, self.tab.installed)
+
+        self.runtime.on_context_destroyed(Event(self.runtime, 'executionContextDestroyed', {
+            'executionContextId': 1,
+        }))
+
+        self.assertEqual(0, self.runtime.script_stats['cached'])
+
+    def test_run_in_many_contexts(self):
+        self.runtime.install_script('return 1', context_id=1)
+        del self.tab.calls[:]
+
+        results = self.runtime.run_script_many('return 1', [1, 2, 3])
+
+        self.assertEqual({'value': 'fn-1'}, results[0])
+        self.assertIn('TypeError', results[1]['error'])
+        self.assertIn('Cannot find context', results[2]['error'])
+
+        # contexts 2 and 3 were installed into together, then 1 and 2 were called together
+        self.assertEqual([
+            ('Runtime.evaluate', 2),
+            ('Runtime.evaluate', 3),
+            ('Runtime.callFunctionOn', 'fn-1'),
+            ('Runtime.callFunctionOn', 'fn-2'),
+        ], [(m, p.get('contextId', p.get('objectId'))) for m, p in self.tab.calls])
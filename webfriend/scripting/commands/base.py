@@ -13,6 +13,7 @@ class CommandProxy(object):
     enabled_proxies = [
         'cookies',
         'core',
+        'dom',
         'file',
         'fmt',
         'page',
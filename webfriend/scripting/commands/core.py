@@ -11,6 +11,7 @@ from webfriend.scripting.scope import Scope
 from webfriend.scripting.parser.exceptions import UserError
 from webfriend.utils import autotype
 from webfriend.utils.docs import document_commands
+from webfriend.utils.javascript import this_references
 import json
 import logging
 import os
@@ -26,6 +27,9 @@ class CoreProxy(CommandProxy):
     """
     default_referrer_prefix = 'https://github.com/ghetzel/webfriend'
 
+    # script files loaded by javascript(), by absolute path: (modification time, size, body)
+    _script_files = {}
+
     @classmethod
     def qualify(cls, name):
         return name
@@ -38,7 +42,8 @@ class CoreProxy(CommandProxy):
         extra_headers=None,
         cache=None,
         console=None,
-        referrer_prefix=None
+        referrer_prefix=None,
+        coalesce=None
     ):
         """
         Configures various features of the Remote Debugging protocol and provides environment
@@ -83,6 +88,33 @@ class CoreProxy(CommandProxy):
         - **referrer_prefix** (`str`, optional):
 
             The domain portion of the "Referer" header to send.
+
+        - **coalesce** (`list`, optional):
+
+            A list of objects describing high-frequency events that should be aggregated into a
+            single event per time window (see `webfriend.coalesce.CoalescingRule`).  Each object
+            supports the following keys:
+
+            - **event** (`str`):
+
+                The name of the event to coalesce (e.g.: `Network.dataReceived`).
+
+            - **window** (`int`, optional):
+
+                The aggregation window, in milliseconds (default: 100).
+
+            - **mode** (`str`, optional):
+
+                Either `latest` (keep only the most recent event) or `sum` (sum the fields named
+                in **sum**).
+
+            - **key** (`str`, optional):
+
+                A payload field (e.g.: `requestId`) to aggregate events by.
+
+            - **sum** (`list`, optional):
+
+                The payload fields to sum when **mode** is `sum`.
         """
         if events and hasattr(events, 'values') and isinstance(events.values, list):
             for domain in events.values:
@@ -118,6 +150,22 @@ class CoreProxy(CommandProxy):
         else:
             self.tab.disable_console_messages()
 
+        if isinstance(coalesce, list):
+            for rule in coalesce:
+                if hasattr(rule, 'as_dict'):
+                    rule = rule.as_dict()
+
+                if not isinstance(rule, dict) or 'event' not in rule:
+                    raise AttributeError("Coalescing rules must be objects with at least an 'event' key")
+
+                self.tab.coalesce(
+                    rule['event'],
+                    window=rule.get('window', 100),
+                    mode=rule.get('mode', 'latest'),
+                    key=rule.get('key'),
+                    sum_fields=rule.get('sum')
+                )
+
         if referrer_prefix:
             self._referrer_prefix = referrer_prefix
         else:
@@ -132,7 +180,8 @@ class CoreProxy(CommandProxy):
         clear_requests=True,
         continue_on_error=False,
         continue_on_timeout=True,
-        load_event_name='Page.loadEventFired'
+        load_event_name='Page.loadEventFired',
+        network_idle=None
     ):
         """
         Nagivate to a URL.
@@ -177,6 +226,12 @@ class CoreProxy(CommandProxy):
 
             The RPC event to wait for before proceeding to the next command.
 
+        - **network_idle** (`bool`, `dict`, optional):
+
+            If set, wait for the network to become idle after the page has loaded (see
+            [wait_for_network_idle](#wait_for_network_idle)).  If an object is given, its
+            *max_inflight* and *quiet* keys are used to configure the wait.
+
         #### Returns
         The URL that was loaded (`str`)
         """
@@ -218,6 +273,27 @@ class CoreProxy(CommandProxy):
                 else:
                     raise
 
+        if network_idle:
+            if hasattr(network_idle, 'as_dict'):
+                network_idle = network_idle.as_dict()
+
+            if not isinstance(network_idle, dict):
+                network_idle = {}
+
+            try:
+                self.tab.wait_for_network_idle(
+                    max_inflight=network_idle.get('max_inflight', 0),
+                    quiet=network_idle.get('quiet', 500),
+                    timeout=timeout
+                )
+            except exceptions.TimeoutError:
+                if continue_on_timeout:
+                    logging.error('Timed out waiting for the network to become idle after {}ms.'.format(
+                        timeout
+                    ))
+                else:
+                    raise
+
         return reply
 
     def reload(self):
@@ -539,6 +615,46 @@ class CoreProxy(CommandProxy):
             poll_interval=poll_interval
         )
 
+    def wait_for_network_idle(self, max_inflight=0, quiet=500, timeout=30000, poll_interval=50):
+        """
+        Blocks until the number of in-flight network requests has stayed at or below
+        **max_inflight** for **quiet** milliseconds, or until **timeout** elapses (whichever comes
+        first).
+
+        #### Arguments
+
+        - **max_inflight** (`int`):
+
+            The number of requests that may still be pending for the network to be considered
+            idle.
+
+        - **quiet** (`int`):
+
+            The amount of time, in milliseconds, that network activity must remain at or below
+            **max_inflight** before returning.
+
+        - **timeout** (`int`):
+
+            The maximum amount of time to wait before raising a
+            `webfriend.exceptions.TimeoutError`.
+
+        - **poll_interval** (`int`):
+
+            How often to check the number of in-flight requests.
+
+        #### Returns
+        An `int` representing the number of milliseconds we waited for.
+
+        #### Raises
+        `webfriend.exceptions.TimeoutError`
+        """
+        return self.tab.wait_for_network_idle(
+            max_inflight=max_inflight,
+            quiet=quiet,
+            timeout=timeout,
+            poll_interval=poll_interval
+        )
+
     def wait_for_load(self, timeout=30000, idle_time=500):
         """
         Blocks until the "Page.loadEventFired" event has fired, or until timeout elapses (whichever
@@ -570,7 +686,7 @@ class CoreProxy(CommandProxy):
         """
         return self.tab.input.type_text(text, **kwargs)
 
-    def focus(self, selector):
+    def focus(self, selector, actionable=True, timeout=10000):
         """
         Focuses the given HTML element described by **selector**.  One and only one element may
         match the selector.
@@ -582,21 +698,43 @@ class CoreProxy(CommandProxy):
             The page element to focus, given as a CSS-style selector, an ID (e.g. "#myid"), or an
             XPath query (e.g.: "xpath://body/p").
 
+        - **actionable** (`bool`):
+
+            Whether to wait for the element to be attached to the document and visible before
+            focusing it.
+
+        - **timeout** (`int`):
+
+            The maximum amount of time, in milliseconds, to wait for the element to appear and
+            become actionable.
+
         #### Returns
         The matching `webfriend.rpc.DOMElement` that was given focus.
 
         #### Raises
         - `webfriend.exceptions.EmptyResult` if zero elements were matched, or
-        - `webfriend.exceptions.TooManyResults` if more than one elements were matched.
+        - `webfriend.exceptions.TooManyResults` if more than one elements were matched, or
+        - `webfriend.exceptions.TimeoutError` if the element did not become actionable in time.
         """
-        elements = self.tab.dom.query_all(selector)
-        self.tab.dom.ensure_unique_element(selector, elements)
-        element = elements['nodes'][0]
+        elements = self.tab.dom.select_nodes(selector, timeout=timeout)
+        element = self.tab.dom.ensure_unique_element(selector, elements)
+
+        if actionable:
+            element.wait_for_actionable('focus', timeout=timeout)
 
         self.tab.dom.focus(element.id)
         return element
 
-    def click(self, selector=None, x=None, y=None, unique_match=True, **kwargs):
+    def click(
+        self,
+        selector=None,
+        x=None,
+        y=None,
+        unique_match=True,
+        actionable=True,
+        timeout=10000,
+        **kwargs
+    ):
         """
         Click on HTML element(s) or on a specific part of the page.  More complex click operations
         are supported (e.g.: double clicking, drag and drop) by supplying **x**/**y** coordinates
@@ -624,6 +762,20 @@ class CoreProxy(CommandProxy):
             For **selector** matches, whether there can be one and only one match to click on. If
             false, every matched element will be clicked on in the order they were matched in.
 
+        - **actionable** (`bool`):
+
+            For **selector** matches, whether to wait for each element to be actionable before
+            clicking on it: attached to the document, visible, not moving (i.e.: its position and
+            size are the same across two animation frames), enabled, and not covered by another
+            element.  Elements outside of the viewport are scrolled into view.  The check runs in
+            the page on every animation frame, so the click happens as soon as the element is
+            ready.
+
+        - **timeout** (`int`):
+
+            For **selector** matches, the maximum amount of time, in milliseconds, to wait for
+            elements to appear and become actionable.
+
         - **kwargs**:
 
             Only applies to **x**/**y** click events, see: `webfriend.rpc.Input.click_at`.
@@ -635,16 +787,20 @@ class CoreProxy(CommandProxy):
         For **selector**-based events:
 
         - `webfriend.exceptions.EmptyResult` if zero elements were matched, or
-        - `webfriend.exceptions.TooManyResults` if more than one elements were matched.
+        - `webfriend.exceptions.TooManyResults` if more than one elements were matched, or
+        - `webfriend.exceptions.TimeoutError` if an element did not become actionable in time.
         """
         if selector:
-            elements = self.tab.dom.select_nodes(selector)
+            elements = self.tab.dom.select_nodes(selector, timeout=timeout)
             results = []
 
             if unique_match:
                 self.tab.dom.ensure_unique_element(selector, elements)
 
             for element in elements['nodes']:
+                if actionable:
+                    element.wait_for_actionable('click', timeout=timeout)
+
                 results.append(element.click())
 
             return results
@@ -656,7 +812,7 @@ class CoreProxy(CommandProxy):
                 self.tab.input.click_at(x, y, **kwargs)
             ]
 
-    def field(self, selector, value, autoclear=True):
+    def field(self, selector, value, autoclear=True, actionable=True, timeout=10000):
         """
         Locate and enter data into a form input field.
 
@@ -675,15 +831,31 @@ class CoreProxy(CommandProxy):
 
             Whether to clear the existing contents of the field before entering new data.
 
+        - **actionable** (`bool`):
+
+            Whether to wait for the field to be attached to the document, visible, enabled, and
+            editable (i.e.: not read-only) before entering data.
+
+        - **timeout** (`int`):
+
+            The maximum amount of time, in milliseconds, to wait for the field to appear and
+            become actionable.
+
         #### Returns
         The text that was entered, as a string.
+
+        #### Raises
+        `webfriend.exceptions.TimeoutError` if the field did not become actionable in time.
         """
         if not isinstance(value, basestring):
             raise ValueError("'value' must be specified")
 
-        elements = self.tab.dom.select_nodes(selector)
+        elements = self.tab.dom.select_nodes(selector, timeout=timeout)
         field = self.tab.dom.ensure_unique_element(selector, elements)
 
+        if actionable:
+            field.wait_for_actionable('field', timeout=timeout)
+
         if autoclear:
             field['value'] = ''
 
@@ -834,15 +1006,26 @@ class CoreProxy(CommandProxy):
 
         return self.browser.close_tab(tab_id)
 
-    def javascript(self, body=None, file=None, expose_variables=True):
+    def javascript(
+        self,
+        body=None,
+        file=None,
+        expose_variables=True,
+        stream=False,
+        chunk_size=1000,
+        frame=None
+    ):
         """
         Inject Javascript into the current page, evaluate it, and return the results.  The script
         is wrapped in an anonymous function whose return value will be returned from this command
-        as a native data type.
+        as a native data type.  Each distinct script is only compiled once per page; running it
+        again (e.g.: in a loop) reuses the same function.
 
         By default, scripts will have access to all local variables in the calling script that are
         defined at the time of invocation.  They are available to injected scripts as a plain
-        object accessible using the `this` variable.
+        object accessible using the `this` variable.  Only the variables the script refers to
+        (e.g.: `this.results` or `this['results']`) are sent to the page, unless the script
+        uses `this` in some other way (e.g.: `Object.keys(this)`), in which case all of them are.
 
         #### Arguments
 
@@ -858,23 +1041,138 @@ class CoreProxy(CommandProxy):
 
             Whether to expose all local variables to the injected script or not.
 
+        - **stream** (`bool`):
+
+            Whether to keep the result in the page and retrieve it in slices of **chunk_size**
+            rows as it is looped over, instead of transferring it all at once.  This is useful
+            for scripts that return very large arrays (e.g.: extracted table rows), which can then
+            be processed one row at a time.
+
+        - **chunk_size** (`int`):
+
+            When **stream** is set, the maximum number of rows to retrieve from the page at a
+            time.
+
+        - **frame** (`str`, `list`, optional):
+
+            The ID, name, or URL of a frame to run the script in instead of the top-level page.
+            If a list of frames (or `*`, meaning every frame in the page) is given, the script
+            runs in all of them concurrently.
+
         #### Returns
         Whatever data was returned from the injected script using a `return` statement,
         automatically parsed into native data types.  Objects, arrays, and all scalar types are
         supported as return values.
+
+        If **stream** is set, an iterator over the returned rows is returned instead, which can
+        be consumed once by a `loop`.  A returned array yields each of its elements, and any other
+        value yields itself as a single row.
+
+        If **frame** is a list (or `*`), a list with an object for every frame is returned
+        instead, with the keys _frame_ (the frame ID), _url_, and either _value_ (what the script
+        returned there) or _error_ (why it failed there.)
+
+        #### Raises
+        `webfriend.exceptions.NotFound` if a single **frame** was given and it could not be found.
         """
         if not body and not file:
             raise ValueError("Must specify either body or file")
 
         if file:
-            body = open(file, 'r').read()
+            body = self._read_script(file)
 
         if expose_variables:
-            data = self.scope.as_dict()
+            names = this_references(body)
+
+            if names is None:
+                data = self.scope.as_dict()
+            else:
+                data = dict([(name, self.scope[name]) for name in names if name in self.scope])
         else:
             data = {}
 
-        return self.tab.evaluate(body, data=data, calling_context=self.environment)
+        if frame == '*' or isinstance(frame, list):
+            if stream:
+                raise ValueError("'stream' cannot be used with more than one frame")
+
+            return self._javascript_frames(body, data, frame)
+
+        context_id = None
+
+        if frame is not None:
+            context_id = self.tab.runtime.context_for(
+                frame_id=self.tab.page.find_frame(frame)['id']
+            )
+
+        if stream:
+            return self.tab.runtime.iter_script(
+                body,
+                data=data,
+                chunk_size=chunk_size,
+                include_command_line_api=True,
+                context_id=context_id,
+                calling_context=self.environment
+            )
+
+        return self.tab.evaluate(
+            body,
+            data=data,
+            context_id=context_id,
+            calling_context=self.environment
+        )
+
+    def _javascript_frames(self, body, data, frames):
+        if frames == '*':
+            frames = [f['id'] for f in self.tab.page.frames]
+
+        results = []
+        context_ids = []
+
+        for frame in frames:
+            result = {
+                'frame': frame,
+                'url':   None,
+            }
+
+            try:
+                definition = self.tab.page.find_frame(frame)
+                result['frame'] = definition['id']
+                result['url'] = definition.get('url')
+                context_ids.append(self.tab.runtime.context_for(frame_id=definition['id']))
+            except exceptions.NotFound as e:
+                result['error'] = '{}'.format(e)
+                context_ids.append(None)
+
+            results.append(result)
+
+        runnable = [i for i, context_id in enumerate(context_ids) if context_id is not None]
+
+        outcomes = self.tab.runtime.run_script_many(
+            body,
+            [context_ids[i] for i in runnable],
+            data=data,
+            include_command_line_api=True,
+            calling_context=self.environment
+        )
+
+        for i, outcome in zip(runnable, outcomes):
+            results[i].update(outcome)
+
+        return results
+
+    def _read_script(self, filename):
+        # scripts are only re-read from disk when they change
+        path = os.path.abspath(filename)
+        info = os.stat(path)
+        cached = self._script_files.get(path)
+
+        if cached is None or cached[:2] != (info.st_mtime, info.st_size):
+            with open(path, 'r') as file:
+                cached = (info.st_mtime, info.st_size, file.read())
+
+            self._script_files[path] = cached
+
+        return cached[2]
 
     def env(self, name, fallback=None, ignore_empty=True, detect_type=True, joiner=None):
         """
@@ -0,0 +1,236 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from webfriend.scripting.commands.base import CommandProxy
+from webfriend.utils import fingerprint
+import time
+
+
+class DomProxy(CommandProxy):
+    """
+    Commands for inspecting the structure of the current page locally, without issuing a query to
+    the browser for every question asked of it.
+    """
+    qualifier = 'dom'
+    doc_name = 'DOM'
+
+    def snapshot(self, computed_styles=None, reply_timeout=30000):
+        """
+        Capture the entire current page (including frames) in a single call and store it as a
+        local, indexed snapshot.  Subsequent [dom::query](#domquery) commands are answered from
+        this snapshot without contacting the browser.
+
+        #### Arguments
+
+        - **computed_styles** (`list`, optional):
+
+            A list of CSS property names whose computed values should be captured for every
+            rendered node.
+
+        - **reply_timeout** (`int`):
+
+            The maximum amount of time, in milliseconds, to wait for the snapshot to be captured.
+
+        #### Returns
+        A `dict` with the keys:
+
+        - _documents_ (`int`):
+            The number of documents (the page and its frames) that were captured.
+
+        - _nodes_ (`int`):
+            The total number of nodes that were captured.
+
+        - _strings_ (`int`):
+            The number of distinct strings in the snapshot's string table.
+
+        - _duration_ (`float`):
+            The amount of time, in milliseconds, it took to capture and index the snapshot.
+        """
+        started_at = time.time()
+
+        snapshot = self.tab.dom_snapshot.capture(
+            computed_styles=computed_styles,
+            reply_timeout=reply_timeout
+        )
+
+        out = snapshot.as_dict()
+        out['duration'] = (time.time() - started_at) * 1e3
+
+        return out
+
+    def query(
+        self,
+        tag=None,
+        id=None,
+        class_name=None,
+        attribute=None,
+        value=None,
+        text=None,
+        limit=None,
+        refresh=False
+    ):
+        """
+        Query the most recent page snapshot for elements matching all of the given criteria.  If
+        no snapshot has been taken (or the page has been navigated since), one is captured first.
+
+        #### Arguments
+
+        - **tag** (`str`, optional):
+
+            The tag name of the elements to return (e.g.: `a`, `div`.)
+
+        - **id** (`str`, optional):
+
+            The exact value of the `id` attribute.
+
+        - **class_name** (`str`, optional):
+
+            A class that must be present in the element's `class` attribute.
+
+        - **attribute** (`str`, optional):
+
+            The name of an attribute that must be present on the element.
+
+        - **value** (`str`, optional):
+
+            If **attribute** is specified, the exact value that attribute must have.
+
+        - **text** (`str`, optional):
+
+            A case-insensitive substring that must appear in the element's text.
+
+        - **limit** (`int`, optional):
+
+            The maximum number of results to return.
+
+        - **refresh** (`bool`):
+
+            Whether to capture a new snapshot before querying, even if one is available.
+
+        #### Returns
+        A `list` of `dict` objects describing each matching element, with the keys _index_,
+        _frame_id_, _backend_node_id_, _parent_index_, _tag_, _attributes_, _text_, and _bounds_.
+        """
+        if refresh or self.tab.dom_snapshot.is_stale:
+            self.tab.dom_snapshot.capture()
+
+        return self.tab.dom_snapshot.latest.query(
+            tag=tag,
+            id=id,
+            class_name=class_name,
+            attribute=attribute,
+            value=value,
+            text=text,
+            limit=limit
+        )
+
+    def frames(self):
+        """
+        List every frame in the current page.
+
+        #### Returns
+        A `list` of `dict` objects (starting with the top-level frame) with the keys _id_,
+        _parent_id_, _name_, and _url_.
+        """
+        return self.tab.page.frames
+
+    def query_frames(self, selector, frames=None, reply_timeout=None):
+        """
+        Query every frame in the current page for elements matching the given selector, without
+        having to switch into each frame in turn.  All frames are queried in a single round trip.
+
+        #### Arguments
+
+        - **selector** (`str`):
+
+            The CSS-style selector to query each frame for.
+
+        - **frames** (`list`, optional):
+
+            The IDs of the frames to query (see [dom::frames](#domframes)).  Defaults to all
+            frames.
+
+        - **reply_timeout** (`int`, optional):
+
+            The maximum amount of time, in milliseconds, to wait for all frames to reply.
+
+        #### Returns
+        A `list` of `dict` objects, one for each frame that contained matches, with the keys
+        _frame_id_, _name_, _url_, _selector_, _count_, and _nodes_.
+        """
+        if frames is not None and not isinstance(frames, list):
+            frames = [frames]
+
+        return self.tab.dom.query_all_frames(
+            selector,
+            frame_ids=frames,
+            reply_timeout=reply_timeout
+        )
+
+    def fingerprint(
+        self,
+        selector=None,
+        depth=3,
+        exclude=None,
+        attributes=True,
+        normalize_whitespace=True,
+        previous=None
+    ):
+        """
+        Compute a compact tree of hashes describing the current page (or the elements matching
+        **selector**), in a single pass through the page.  Every element's hash covers its
+        attributes, its text, and everything inside it, so comparing a fingerprint against one
+        taken earlier shows which regions of the page have changed without transferring any of
+        the page's content.
+
+        #### Arguments
+
+        - **selector** (`str`, optional):
+
+            A CSS selector for the element(s) to fingerprint.  If omitted, the whole document is
+            fingerprinted.
+
+        - **depth** (`int`):
+
+            How many levels of child hashes to return below each matched element.  Deeper
+            fingerprints can locate changes more precisely, at the cost of size.
+
+        - **exclude** (`str`, optional):
+
+            A CSS selector for elements to leave out of the fingerprint entirely (e.g.: ads or
+            clocks that change on every load.)
+
+        - **attributes** (`bool`):
+
+            Whether changes to attribute values count as changes.
+
+        - **normalize_whitespace** (`bool`):
+
+            Whether to ignore changes that only affect whitespace in text.
+
+        - **previous** (`dict`, optional):
+
+            A fingerprint returned by an earlier call to compare against.  It should have been
+            taken with the same options.
+
+        #### Returns
+        A `dict` with the keys _selector_, _depth_, and _roots_ (the fingerprint of each matched
+        element, with the keys _hash_, _tag_, _index_, and _children_).
+
+        If **previous** is given, the keys _changed_ (whether anything differs) and _changes_ are
+        added.  Each change is a `dict` with the keys _root_, _path_ (a CSS-style path to the
+        changed element, relative to its root), _change_ (`modified`, `added`, or `removed`),
+        _old_, and _new_.
+        """
+        out = self.tab.dom.fingerprint(
+            selector=selector,
+            depth=depth,
+            exclude=exclude,
+            attributes=attributes,
+            normalize_whitespace=normalize_whitespace
+        )
+
+        if previous is not None:
+            out['changes'] = fingerprint.diff(previous, out)
+            out['changed'] = (len(out['changes']) > 0)
+
+        return out
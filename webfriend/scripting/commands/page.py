@@ -24,6 +24,7 @@ class PageProxy(CommandProxy):
         reply_timeout=30000,
         autoclose=True,
         use="tallest",
+        network_idle=None,
     ):
         """
         Capture the current screen contents as an image and write the image to a file or return it
@@ -104,6 +105,13 @@ class PageProxy(CommandProxy):
             - "first":
                 Use the first element matched as the result for measuring screenshot dimensions.
 
+        - **network_idle** (`bool`, `dict`, optional):
+
+            If set, wait for the network to become idle after resizing the viewport and before
+            capturing the image, instead of sleeping for a fixed **settle** time.  If an object is
+            given, its *max_inflight* and *quiet* keys are used to configure the wait (see
+            [wait_for_network_idle](#wait_for_network_idle)).
+
         #### Returns
         `dict`, with keys:
 
@@ -130,7 +138,6 @@ class PageProxy(CommandProxy):
         """
 
         element = None
-        stored_element = None
         is_explicitly_set = set()
 
         # width defaults to document scrollWidth
@@ -148,35 +155,37 @@ class PageProxy(CommandProxy):
         # listify selector
         if selector is None:
             selector = []
+        elif isinstance(selector, dict) and 'nodes' in selector:
+            selector = selector['nodes']
         elif not isinstance(selector, list):
             selector = [selector]
 
-        # if selector is a list, then find the tallest element among all of them
-        for s in selector:
-            try:
-                elements = self.tab.dom.query_all(s)
-                element = self.tab.dom.ensure_unique_element(s, elements)
+        if use not in ('tallest', 'first'):
+            raise exceptions.WebfriendError(
+                "Unrecognized use '{}'".format(use)
+            )
 
-                if use == "tallest":
-                    if stored_element:
-                        if element.height > stored_element.height:
-                            stored_element = element
+        # query every selector (and later, measure every candidate) in a single round trip
+        candidates = []
 
-                elif use == "first":
-                    stored_element = element
-                    break
+        if len(selector):
+            for s, elements in zip(selector, self.tab.dom.query_many(selector)):
+                try:
+                    candidates.append(self.tab.dom.ensure_unique_element(s, elements))
+                except (exceptions.EmptyResult, exceptions.TooManyResults) as e:
+                    logging.debug("Screenshot selector error: {}".format(e))
+                    continue
 
-                else:
-                    raise exceptions.WebfriendError(
-                        "Unrecognized use '{}'".format(use)
-                    )
+                if use == "first":
+                    break
 
-            except (exceptions.EmptyResult, exceptions.TooManyResults) as e:
-                logging.debug("Screenshot selector error: {}".format(e))
-                continue
+        # if selector is a list, then find the tallest element among all of them
+        if len(candidates) > 1:
+            self.tab.dom.geometry(candidates)
+            element = max(candidates, key=lambda e: e.height)
 
-        if stored_element:
-            element = stored_element
+        elif len(candidates):
+            element = candidates[0]
 
         return_flo = True
 
@@ -229,10 +238,33 @@ class PageProxy(CommandProxy):
                 )
 
             self.tab.emulation.set_visible_size(width, height)
+
+            # wait for anything loaded as a result of the resize to finish loading
+            if network_idle:
+                if hasattr(network_idle, 'as_dict'):
+                    network_idle = network_idle.as_dict()
+
+                if not isinstance(network_idle, dict):
+                    network_idle = {}
+
+                wfn_params = {
+                    'max_inflight': network_idle.get('max_inflight', 0),
+                    'quiet':        network_idle.get('quiet', settle),
+                }
+
+                if settle_timeout:
+                    wfn_params['timeout'] = settle_timeout
+
+                try:
+                    logging.info('Waiting for network activity to settle')
+                    self.tab.wait_for_network_idle(**wfn_params)
+                except exceptions.TimeoutError as e:
+                    logging.warning('Taking screenshot anyway: {}'.format(e))
+
             self.tab.page.capture_screenshot(destination, **capture_screenshot_params)
 
             # wait for a spell for the page to adjust to its new world
-            if settle:
+            if settle and not network_idle:
                 if after_events is None:
                     logging.info('Waiting {}ms for resize to settle'.format(settle))
                     time.sleep(settle / 1e3)
@@ -314,11 +346,94 @@ class PageProxy(CommandProxy):
     def stop_capture(self):
         self.tab.page.stop_screencast()
 
-    def find(self, text, **kwargs):
-        logging.info('text={}, kwargs={}'.format(text, kwargs))
-        raise exceptions.NotImplemented("find()")
+    def find(self, text, regex=False, case_sensitive=False, limit=None, reply_timeout=30000):
+        """
+        Search the text of the page (including frames) for the given string or regular expression.
+
+        The page's text is captured and indexed locally the first time this is called, and
+        subsequent searches are answered from that index (without contacting the browser) until
+        the page is navigated, a change to the document is observed, or the index is more than a
+        few seconds old (see `webfriend.rpc.DOMSnapshot.find_max_age`).
+
+        The result can be passed as the selector to commands like [click](#click),
+        [scroll_to](#scroll_to), and [page::screenshot](#pagescreenshot), which will then operate
+        on the elements containing the matched text.
+
+        #### Arguments
+
+        - **text** (`str`):
+
+            The text to search for.  Any whitespace in the text matches any whitespace on the
+            page.  Matches do not span elements.
+
+        - **regex** (`bool`):
+
+            Whether **text** is a regular expression.
+
+        - **case_sensitive** (`bool`):
+
+            Whether matching should be case-sensitive.
+
+        - **limit** (`int`, optional):
+
+            The maximum number of matches to return.
+
+        - **reply_timeout** (`int`):
+
+            The maximum amount of time, in milliseconds, to wait for the page's text to be
+            captured.
 
-    def source(self, selector=None):
+        #### Returns
+        A `dict` with the keys _selector_ (the search text), _count_, _nodes_ (the elements
+        containing matches), and _matches_.  Each match is a `dict` with the keys _text_ (the
+        element's text), _match_, _start_, _end_, _frame_id_, and _node_ (the node ID of the
+        element).
+        """
+        matches = self.tab.dom_snapshot.find(
+            text,
+            regex=regex,
+            case_sensitive=case_sensitive,
+            limit=limit,
+            reply_timeout=reply_timeout
+        )
+
+        elements = dict([
+            (e.backend_id, e) for e in self.tab.dom.elements_for_backend_ids([
+                m['backend_node_id'] for m in matches
+            ])
+        ])
+
+        nodes = []
+        seen = set()
+        results = []
+
+        for match in matches:
+            element = elements.get(match['backend_node_id'])
+
+            if element is None:
+                continue
+
+            if element.backend_id not in seen:
+                seen.add(element.backend_id)
+                nodes.append(element)
+
+            results.append({
+                'text':     match['text'],
+                'match':    match['match'],
+                'start':    match['start'],
+                'end':      match['end'],
+                'frame_id': match['frame_id'],
+                'node':     element.id,
+            })
+
+        return {
+            'selector': text,
+            'count':    len(nodes),
+            'nodes':    nodes,
+            'matches':  results,
+        }
+
+    def source(self, selector=None, destination=None, gzip=False, chunk_size=1048576):
         """
         Retrieves the `outerHtml` of the matching page element.
 
@@ -329,8 +444,26 @@ class PageProxy(CommandProxy):
             The page element to retrieve source for, given as a CSS-style selector, an ID
             (e.g. "#myid"), or an XPath query (e.g.: "xpath://body/p").
 
+        - **destination** (`str`, _file-like object_, optional):
+
+            If given, the source is written to this filesystem path (or file-like object) instead
+            of being returned.  The source is read from the page and written in chunks, so this
+            should be used for very large documents.
+
+        - **gzip** (`bool`):
+
+            If **destination** is given, whether to gzip-compress the output.
+
+        - **chunk_size** (`int`):
+
+            If **destination** is given, the maximum number of characters to read from the page
+            at a time.
+
         #### Returns
-        A `unicode` string representing the HTML contents of the matched element.
+        A `unicode` string representing the HTML contents of the matched element.  If
+        **destination** is given, a `dict` with the keys _path_ (or _destination_, if a file-like
+        object was given) and _size_ (the number of uncompressed bytes written) is returned
+        instead.
 
         #### Raises
         - `webfriend.exceptions.EmptyResult` if zero elements were matched, or
@@ -338,16 +471,180 @@ class PageProxy(CommandProxy):
         """
         if selector:
             elements = self.tab.dom.select_nodes(selector)
-            self.tab.dom.ensure_unique_element(selector, elements)
-            return elements['nodes'][0].outer_html
+            element = self.tab.dom.ensure_unique_element(selector, elements)
         else:
-            return self.tab.dom.root.outer_html
+            element = self.tab.dom.root
+
+        if destination is None:
+            return element.outer_html
+
+        out = {
+            'size': element.write_outer_html(destination, gzip=gzip, chunk_size=chunk_size),
+        }
+
+        if isinstance(destination, basestring):
+            out['path'] = destination
+        else:
+            out['destination'] = destination
+
+        return out
+
+    def extract(
+        self,
+        selector=None,
+        fields=None,
+        attribute=None,
+        property=None,
+        html=False,
+        outer_html=False,
+        multiple=False,
+        trim=True,
+        within=None,
+        frame=None
+    ):
+        """
+        Extract structured data from the current page in a single round trip.  The given options
+        describe one field; fields can contain other fields, so arbitrarily nested records (and
+        lists of records) can be pulled out with one command.
+
+        #### Arguments
+
+        - **selector** (`str`, optional):
+
+            A CSS selector for the element(s) to extract data from.  If omitted, the document (or
+            the element matched by **within**) is used.
+
+        - **fields** (`dict`, optional):
+
+            A mapping of output keys to nested fields, evaluated relative to each matched element.
+            Each value is either a CSS selector string (whose element's text is returned), or an
+            object taking the same options as this command (_selector_, _attribute_, _property_,
+            _html_, _outer_html_, _multiple_, _fields_, _trim_).
+
+        - **attribute** (`str`, optional):
+
+            Return the value of this attribute of the matched element.
+
+        - **property** (`str`, optional):
+
+            Return the value of this DOM property of the matched element (e.g. "href", "value").
+
+        - **html** (`bool`):
+
+            Return the inner HTML of the matched element.
+
+        - **outer_html** (`bool`):
+
+            Return the outer HTML of the matched element.
+
+        - **multiple** (`bool`):
+
+            Return a list with a result for every element matching **selector** instead of just
+            the first.
+
+        - **trim** (`bool`):
+
+            Whether to collapse and strip whitespace from text results.
+
+        - **within** (`str`, optional):
+
+            A selector for a single element that all other selectors are evaluated relative to.
+
+        - **frame** (`str`, optional):
+
+            The ID, name, or URL of a frame to extract from instead of the top-level page.  This
+            cannot be combined with **within**.
+
+        #### Returns
+        The extracted data.  If a single-valued field does not match anything, its value is `null`.
+
+        #### Raises
+        - `ValueError` if the field specification is invalid, or
+        - `webfriend.exceptions.NotFound` if **frame** does not match a frame.
+        """
+        spec = {
+            'selector':   selector,
+            'attribute':  attribute,
+            'property':   property,
+            'html':       html,
+            'outer_html': outer_html,
+            'multiple':   multiple,
+            'trim':       trim,
+        }
+
+        if fields is not None:
+            spec['fields'] = fields
+
+        if frame is not None:
+            if within:
+                raise ValueError("'within' cannot be used with 'frame'")
+
+            return self.tab.dom.extract(spec, context_id=self.tab.runtime.context_for(
+                frame_id=self.tab.page.find_frame(frame)['id']
+            ))
+
+        if within:
+            elements = self.tab.dom.select_nodes(within)
+            self.tab.dom.ensure_unique_element(within, elements)
+            return self.tab.dom.extract(spec, node_id=elements['nodes'][0].id)
+
+        return self.tab.dom.extract(spec)
 
     # def highlight(self, selector, **kwargs):
     #     elements = self.tab.dom.select_nodes(selector)
     #     self.tab.dom.ensure_unique_element(selector, elements)
     #     self.tab.overlay.highlight_node(node_id=elements['nodes'][0].id, **kwargs)
 
+    def preload(self, body=None, file=None, now=True):
+        """
+        Register a script to be evaluated at the start of every page (and frame) loaded in the
+        current tab from now on, before any of the page's own scripts run.  This is useful for
+        helper functions or shims that later [javascript](#javascript) calls rely on, which
+        would otherwise have to be injected again after every navigation.
+
+        #### Arguments
+
+        - **body** (`str`, optional):
+
+            The script to register.
+
+        - **file** (`str`, optional):
+
+            A file containing the script to register.
+
+        - **now** (`bool`):
+
+            Whether to also evaluate the script in the current page.
+
+        #### Returns
+        The identifier of the registered script, which can be passed to
+        [page::remove_preload](#pageremove_preload).
+        """
+        if not body and not file:
+            raise ValueError("Must specify either body or file")
+
+        if file:
+            with open(file, 'r') as f:
+                body = f.read()
+
+        return self.tab.page.add_preload(body, now=now)
+
+    def remove_preload(self, identifier=None):
+        """
+        Stop evaluating a script registered with [page::preload](#pagepreload) in new pages.
+
+        #### Arguments
+
+        - **identifier** (`str`, optional):
+
+            The identifier returned from [page::preload](#pagepreload).  If not given, all
+            registered scripts are removed.
+
+        #### Returns
+        A `list` of the identifiers that were removed.
+        """
+        return self.tab.page.remove_preload(identifier)
+
     def remove(self, selector):
         """
         Removes ALL elements that match the given selector from the page.
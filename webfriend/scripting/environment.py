@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 from webfriend.scripting.scope import Scope
 from webfriend.scripting import parser
 from webfriend.scripting.commands.base import CommandProxy
+from contextlib import contextmanager
 import sys
 import logging
 import traceback
@@ -230,6 +231,27 @@ class Environment(object):
         else:
             return actual
 
+    @contextmanager
+    def object_group(self, proxy):
+        """
+        Allocate all remote objects created while a command is running in a single object group
+        on the proxy's tab, so they are all released with one call when the command finishes.
+        """
+        runtime = None
+
+        if self.browser is not None:
+            try:
+                runtime = proxy.tab.runtime
+            except Exception:
+                # commands that don't need a tab (or run before one exists) are not wrapped
+                pass
+
+        if runtime is None:
+            yield None
+        else:
+            with runtime.object_group() as group:
+                yield group
+
     def execute(self, command, scope=None):
         if scope:
             # NOTE: Future Sadness May Await
@@ -299,15 +321,16 @@ class Environment(object):
                 keyname
             ))
 
-            # call function
+            # call function; any remote objects it allocates are released when it returns
             try:
-                if command_id is None:
-                    return resultkey, fn(**opts)
-                else:
-                    return resultkey, fn(
-                        command_id,
-                        **opts
-                    )
+                with self.object_group(proxy):
+                    if command_id is None:
+                        return resultkey, fn(**opts)
+                    else:
+                        return resultkey, fn(
+                            command_id,
+                            **opts
+                        )
             except Exception as e:
                 line = col = None
 
@@ -5,6 +5,7 @@ from webfriend.rpc import (
     Browser,
     Console,
     DOM,
+    DOMSnapshot,
     Emulation,
     Input,
     Network,
@@ -17,15 +18,25 @@ from webfriend.rpc import (
 import json
 import time
 from webfriend import exceptions
+from webfriend.coalesce import CoalescingRule
+from webfriend.tap import EventTap
 from webfriend.utils import patch_json  # noqa
 import websocket
 import logging
 from Queue import Queue, Empty, Full
-from threading import Thread
+from threading import Thread, Lock, Event as ThreadEvent, current_thread
 
 ANY_KEY = 'ANY'
 
 
+class EventBarrier(object):
+    """
+    Placed in the event queue by `Tab.sync_events`; set once every event ahead of it is handled.
+    """
+    def __init__(self):
+        self.done = ThreadEvent()
+
+
 class Tab(object):
     default_width  = 0
     default_height = 0
@@ -63,18 +74,24 @@ class Tab(object):
         self.last_event_m      = {}
         self.last_event_t      = {}
         self._network_requests = {}
+        self._inflight_requests = set()
+        self.last_network_activity_t = 0
         self.g_recv_ctl        = Queue(1)
         self.g_recv            = Thread(target=self.receive_messages, args=(self.g_recv_ctl,))
         self.replies           = {}
+        self._send_lock        = Lock()
         self.initial_w         = width
         self.initial_h         = height
         self.msg_enable        = False
         self.netreq_tracking   = True
         self._trigger_worker   = None
+        self.event_taps        = []
+        self.coalescing_rules  = {}
 
         # setup and enable all the RPC domains we support
         self.page              = Page(self)
         self.dom               = DOM(self)
+        self.dom_snapshot      = DOMSnapshot(self)
         self.console           = Console(self)
         self.emulation         = Emulation(self)
         self.input             = Input(self)
@@ -110,6 +127,14 @@ class Tab(object):
     def wsurl(self):
         return self.description.get('webSocketDebuggerUrl')
 
+    @property
+    def connected(self):
+        """
+        Whether the tab's debugger connection is still open (e.g.: the tab has not been closed or
+        crashed.)
+        """
+        return (self.socket.connected and self.g_recv.is_alive())
+
     @property
     def rpc_domains(self):
         instances = []
@@ -150,6 +175,9 @@ class Tab(object):
         self.netreq_tracking = False
 
     def stop(self):
+        for tap in list(self.event_taps):
+            self.remove_event_tap(tap)
+
         if self.g_recv.is_alive():
             logging.debug('Sending stop to receive thread')
             self.g_recv_ctl.put(StopIteration)
@@ -160,42 +188,91 @@ class Tab(object):
             time.sleep(1)
 
     def send(self, data, expect_reply=True, reply_timeout=None, context=None):
-        if not isinstance(data, dict):
-            raise AttributeError("Data must be a dict")
+        return self.send_many([data], expect_reply=expect_reply, reply_timeout=reply_timeout)[0]
+
+    def send_many(self, messages, expect_reply=True, reply_timeout=None, raise_errors=True):
+        """
+        Send several requests back-to-back without waiting for the replies in between, then wait
+        for all of them.  Since the Remote Debugger processes requests in order, this costs
+        roughly one round trip regardless of how many requests are sent.
+
+        #### Arguments
+
+        - **messages** (`list`):
+
+            A list of `dict` objects, each with a *method* and (optional) *params*.
+
+        - **expect_reply** (`bool`):
+
+            Whether to wait for replies at all.
+
+        - **reply_timeout** (`int`):
+
+            How long (in milliseconds) to wait for all replies to arrive.
+
+        - **raise_errors** (`bool`):
+
+            If false, requests that fail have their exception returned in place of a reply
+            instead of it being raised.
+
+        #### Returns
+        A `list` of `webfriend.rpc.Reply` objects, in the same order as **messages**.
+
+        #### Raises
+        - `webfriend.exceptions.TimeoutError` if not all replies were received in time, or
+        - the exception reported for the first request that failed (if **raise_errors** is set.)
+        """
+        for data in messages:
+            if not isinstance(data, dict):
+                raise AttributeError("Data must be a dict")
 
         if not reply_timeout:
             reply_timeout = 10000
 
-        # increment and include message ID
-        self.message_id += 1
-        data['id'] = self.message_id
-
-        body = json.dumps(data)
+        pending = []
 
         try:
-            request_handle = {
-                'id':    data['id'],
-                'reply': Queue(1),
-            }
+            # requests may be sent from multiple threads; IDs must be unique and messages whole
+            with self._send_lock:
+                for data in messages:
+                    # increment and include message ID
+                    self.message_id += 1
+                    data['id'] = self.message_id
+
+                    body = json.dumps(data)
+
+                    request_handle = {
+                        'id':    data['id'],
+                        'reply': Queue(1),
+                    }
+
+                    self.replies[data['id']] = request_handle
+                    pending.append((data, request_handle))
+
+                    # send the request to the Remote Debugger
+                    logging.debug(' >> [{:04d}] {} {}'.format(
+                        data['id'],
+                        data['method'],
+                        ' '.join([
+                            '{}={}'.format(k, v) for k, v in data.get('params', {}).items()
+                        ])
+                    ))
 
-            self.replies[data['id']] = request_handle
+                    # send the request
+                    self.socket.send(body)
 
-            # send the request to the Remote Debugger
-            logging.debug(' >> [{:04d}] {} {}'.format(
-                data['id'],
-                data['method'],
-                ' '.join([
-                    '{}={}'.format(k, v) for k, v in data.get('params', {}).items()
-                ])
-            ))
+            if not expect_reply:
+                return [None] * len(messages)
 
-            # send the request
-            self.socket.send(body)
+            deadline = time.time() + (reply_timeout / 1e3)
+            replies = []
 
             # block until the receive loop says so
-            if expect_reply:
+            for data, request_handle in pending:
                 try:
-                    reply, events = request_handle['reply'].get(timeout=(reply_timeout / 1e3))
+                    reply, events = request_handle['reply'].get(
+                        timeout=max(deadline - time.time(), 0)
+                    )
                 except Empty:
                     raise exceptions.TimeoutError("Timed out waiting for reply to command '{}', id={}".format(
                         data['method'],
@@ -204,19 +281,22 @@ class Tab(object):
 
                 # if there was an exception, raise it now
                 if isinstance(reply, Exception):
-                    raise reply
+                    if raise_errors:
+                        raise reply
+
+                    replies.append(reply)
 
                 # make sure the IDs match
-                if reply['id'] == data['id']:
-                    return Reply(reply, request=data, events=events)
+                elif reply['id'] == data['id']:
+                    replies.append(Reply(reply, request=data, events=events))
                 else:
                     raise exceptions.ProtocolError("Reply Message ID does not match Request Message ID")
 
-            else:
-                return None
+            return replies
 
         finally:
-            del self.replies[data['id']]
+            for data, _ in pending:
+                self.replies.pop(data['id'], None)
 
     def dispatch_event(self, message):
         if message is StopIteration:
@@ -236,37 +316,89 @@ class Tab(object):
 
     def trigger_worker(self):
         while True:
-            proxy, method, payload = self.triggerqueue.get()
+            try:
+                proxy, method, payload = self.triggerqueue.get(timeout=self.next_coalesce_timeout())
+            except Empty:
+                self.flush_coalesced_events()
+                continue
 
             if payload is StopIteration:
+                self.flush_coalesced_events(force=True)
                 logging.debug('Stopping trigger thread')
                 return
 
-            event = proxy.trigger(method, payload)
-            event_name = str(event)
+            # a barrier placed by sync_events; everything queued before it has been handled
+            if isinstance(payload, EventBarrier):
+                payload.done.set()
+                continue
+
+            rule = None
 
-            if event:
-                logging.debug(' >> [ .. ] EVENT: {}'.format(
-                    event
-                ))
+            if len(self.coalescing_rules):
+                rule = self.coalescing_rules.get('{}.{}'.format(proxy.domain, method))
 
-                # record the current time as the last time we saw an event of this type
-                now = time.time()
-                self.last_event_m[str(event)] = now
-                self.last_event_t = now
+            if rule is not None:
+                rule.add(payload, proxy=proxy)
+            else:
+                self.trigger_event(proxy, method, payload)
 
-                # attempt to send this event to whoever is waiting for it
-                if event_name in self.waiters:
-                    try:
-                        self.waiters[event_name].put(event)
-                    except Full:
-                        pass
+            if len(self.coalescing_rules):
+                self.flush_coalesced_events()
 
-                if ANY_KEY in self.waiters:
-                    try:
-                        self.waiters[ANY_KEY].put(event)
-                    except Full:
-                        pass
+    def trigger_event(self, proxy, method, payload):
+        event = proxy.trigger(method, payload)
+        event_name = str(event)
+
+        if event:
+            logging.debug(' >> [ .. ] EVENT: {}'.format(
+                event
+            ))
+
+            # hand the event off to any taps (this never blocks)
+            for tap in self.event_taps:
+                tap.offer(event)
+
+            # record the current time as the last time we saw an event of this type
+            now = time.time()
+            self.last_event_m[str(event)] = now
+            self.last_event_t = now
+
+            # attempt to send this event to whoever is waiting for it
+            if event_name in self.waiters:
+                try:
+                    self.waiters[event_name].put(event)
+                except Full:
+                    pass
+
+            if ANY_KEY in self.waiters:
+                try:
+                    self.waiters[ANY_KEY].put(event)
+                except Full:
+                    pass
+
+        return event
+
+    def next_coalesce_timeout(self):
+        """
+        Return how long the trigger worker can block waiting for new events before the next
+        coalescing window needs to be flushed, or `None` if nothing is waiting to be flushed.
+        """
+        flush_at = [
+            r.flush_at for r in self.coalescing_rules.values() if r.pending
+        ]
+
+        if not len(flush_at):
+            return None
+
+        return max(min(flush_at) - time.time(), 0)
+
+    def flush_coalesced_events(self, force=False):
+        now = time.time()
+
+        for rule in self.coalescing_rules.values():
+            if rule.pending and (force or rule.is_due(now)):
+                for payload in rule.flush():
+                    self.trigger_event(rule.proxy, rule.method, payload)
 
     def dispatch_reply(self, request_id, message, events):
         if request_id in self.replies:
@@ -383,6 +515,34 @@ class Tab(object):
         finally:
             del self.waiters[event_name]
 
+    def sync_events(self, timeout=10000):
+        """
+        Block until every event received so far has been handled.  Events are handled on a
+        separate thread, so a reply to a call can arrive before the handlers for the events the
+        call caused (e.g.: `DOM.setChildNodes` after `DOM.requestChildNodes`) have run; this
+        waits for them to catch up.
+
+        #### Arguments
+
+        - **timeout** (`int`):
+
+            The maximum amount of time, in milliseconds, to wait.
+
+        #### Returns
+        `True` if all events were handled, or `False` if the timeout elapsed first.
+        """
+        worker = self._trigger_worker
+
+        # events are handled in order on the trigger thread, so there is nothing to wait for if
+        # it isn't running or if we're already on it
+        if worker is None or not worker.is_alive() or current_thread() is worker:
+            return True
+
+        barrier = EventBarrier()
+        self.triggerqueue.put((None, None, barrier))
+
+        return barrier.done.wait(timeout / 1e3)
+
     def wait_for(self, event_name, **kwargs):
         """
         Block until a specific event is received, or until **timeout** elapses (whichever comes first).
@@ -488,6 +648,66 @@ class Tab(object):
 
         raise exceptions.TimeoutError("Timed out waiting for events to stop coming in")
 
+    def wait_for_network_idle(self, max_inflight=0, quiet=500, timeout=30000, poll_interval=50):
+        """
+        Blocks until no more than **max_inflight** network requests have been pending for at least
+        **quiet** milliseconds, or until **timeout** elapses (whichever comes first).
+
+        Unlike `wait_for_idle`, this tracks actual network activity: a request is considered
+        in-flight from `Network.requestWillBeSent` until `Network.loadingFinished` or
+        `Network.loadingFailed` is received for it (redirects do not count as new requests), or
+        until the top-level frame navigates.
+
+        #### Arguments
+
+        - **max_inflight** (`int`):
+
+            The number of requests that may still be pending for the network to be considered
+            idle.  Setting this to a small number (e.g. 2) allows for long-polling connections,
+            analytics beacons, and the like to be ignored.
+
+        - **quiet** (`int`):
+
+            The amount of time, in milliseconds, that the in-flight request count must stay at or
+            below **max_inflight** before returning.
+
+        - **timeout** (`int`):
+
+            The maximum amount of time to wait before raising a
+            `webfriend.exceptions.TimeoutError`.
+
+        - **poll_interval** (`int`):
+
+            How often to check the in-flight request count.
+
+        #### Returns
+        An `int` representing the number of milliseconds we waited for.
+
+        #### Raises
+        `webfriend.exceptions.TimeoutError`
+        """
+        started_at = time.time()
+        quiet = (quiet / 1e3)
+
+        while time.time() < (started_at + (timeout / 1e3)):
+            now = time.time()
+
+            if self.inflight_requests <= max_inflight:
+                # the quiet period starts at the last change in network activity, but never before
+                # we started waiting
+                idle_since = max(started_at, self.last_network_activity_t)
+
+                if now >= (idle_since + quiet):
+                    return int((now - started_at) * 1e3)
+
+            time.sleep(poll_interval / 1e3)
+
+        raise exceptions.TimeoutError(
+            "Timed out waiting for the network to become idle ({} requests in-flight)".format(
+                self.inflight_requests
+            )
+        )
+
     def evaluate(self, *args, **kwargs):
         return self.runtime.evaluate(*args, **kwargs)
 
@@ -506,6 +726,35 @@ class Tab(object):
             context=context
         )
 
+    def rpc_many(self, calls, expect_reply=True, reply_timeout=None, raise_errors=True):
+        """
+        Perform several RPC calls in a single round trip.  See `send_many`.
+
+        #### Arguments
+
+        - **calls** (`list`):
+
+            A list of `(method, params)` tuples.
+        """
+        messages = []
+
+        for method, params in calls:
+            payload = {
+                'method': method,
+            }
+
+            if params:
+                payload['params'] = params
+
+            messages.append(payload)
+
+        return self.send_many(
+            messages,
+            expect_reply=expect_reply,
+            reply_timeout=reply_timeout,
+            raise_errors=raise_errors
+        )
+
     def get_domain_instance(self, domain):
         for attr in dir(self):
             instance = getattr(self, attr)
@@ -526,12 +775,103 @@ class Tab(object):
         instance = self.get_domain_instance(domain)
         return instance.remove_handler(callback_id)
 
+    def tap_events(self, destination, patterns=None, **kwargs):
+        """
+        Start writing events received by this tab to the given file or UNIX socket as
+        newline-delimited JSON.  See `webfriend.tap.EventTap` for details and options.
+
+        #### Returns
+        The running `webfriend.tap.EventTap`, whose *written* and *dropped* attributes report
+        how many events have been written and dropped so far.
+        """
+        tap = EventTap(destination, patterns=patterns, **kwargs).start()
+        self.event_taps = self.event_taps + [tap]
+        return tap
+
+    def remove_event_tap(self, tap):
+        """
+        Stop the given event tap, waiting for any queued events to be written out.
+        """
+        if tap in self.event_taps:
+            self.event_taps = [t for t in self.event_taps if t is not tap]
+            tap.stop()
+
+            if tap.dropped:
+                logging.warning('Event tap {} dropped {} events'.format(tap.destination, tap.dropped))
+
+            return True
+
+        return False
+
+    def coalesce(self, event_name, **kwargs):
+        """
+        Start coalescing the named event so that at most one aggregated event (per key) is
+        dispatched per time window.  See `webfriend.coalesce.CoalescingRule` for options.
+
+        #### Returns
+        The `webfriend.coalesce.CoalescingRule` that was registered.
+        """
+        rule = CoalescingRule(event_name, **kwargs)
+
+        # swap in a new dict so that the trigger worker never sees one that is being modified
+        rules = dict(self.coalescing_rules)
+        rules[event_name] = rule
+        self.coalescing_rules = rules
+
+        return rule
+
+    def remove_coalescing(self, event_name):
+        """
+        Stop coalescing the named event.  Any events aggregated in the current window are
+        discarded.
+        """
+        if event_name in self.coalescing_rules:
+            rules = dict(self.coalescing_rules)
+            del rules[event_name]
+            self.coalescing_rules = rules
+            return True
+
+        return False
+
     def reset_network_request_cache(self):
         self._network_requests = {}
 
+    @property
+    def inflight_requests(self):
+        """
+        The number of network requests that have been sent but have not yet finished loading or
+        failed.
+        """
+        return len(self._inflight_requests)
+
     def get_network_request(self, request_id):
         return self._network_requests.get(request_id)
 
+    def on_network_request_started(self, event):
+        # redirects reuse the requestId of the original request, so they are already counted
+        if not event.get('redirectResponse'):
+            self._inflight_requests.add(event.get('requestId'))
+
+        self.last_network_activity_t = time.time()
+
+    def on_network_request_done(self, event):
+        # requests served from the cache still finish with loadingFinished
+        self._inflight_requests.discard(event.get('requestId'))
+        self.last_network_activity_t = time.time()
+
+    def on_main_frame_navigated(self, event):
+        # requests cancelled by the unload (or abandoned long-polls) never finish, so nothing from
+        # the previous document is counted any longer
+        if not event.get('frame.parentId'):
+            self._inflight_requests.clear()
+            self.last_network_activity_t = 0
+
+    def track_inflight_requests(self):
+        self.network.on('requestWillBeSent', self.on_network_request_started)
+        self.network.on('loadingFinished',   self.on_network_request_done)
+        self.network.on('loadingFailed',     self.on_network_request_done)
+        self.page.on('frameNavigated',       self.on_main_frame_navigated)
+
     def setup_callbacks(self):
         def on_net_pre_request(e):
             self._network_requests[e.get('requestId')] = {
@@ -576,6 +916,9 @@ class Tab(object):
 
                 logging.info('[{}] {}'.format(lvlident, body))
 
+        # in-flight request counting is always on, as it backs wait_for_network_idle
+        self.track_inflight_requests()
+
         if self.netreq_tracking:
             self.network.on('requestWillBeSent', on_net_pre_request)
             self.network.on('responseReceived',  on_net_response_received)
@@ -0,0 +1,178 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend import exceptions
+from webfriend.rpc import Network, Page
+from webfriend.tab import Tab
+from Queue import Queue
+from threading import Thread, Event as ThreadEvent
+
+
+class InflightRequestTest(TestCase):
+    def setUp(self):
+        # only the state behind request counting; no browser connection
+        self.tab = Tab.__new__(Tab)
+        self.tab._inflight_requests = set()
+        self.tab.last_network_activity_t = 0
+        self.tab.network = Network(self.tab)
+        self.tab.page = Page(self.tab)
+        self.tab.track_inflight_requests()
+
+    def event(self, name, **payload):
+        self.tab.network.trigger(name, payload)
+
+    def test_started_and_finished(self):
+        self.event('requestWillBeSent', requestId='a')
+        self.event('requestWillBeSent', requestId='b')
+        self.assertEqual(2, self.tab.inflight_requests)
+        self.assertGreater(self.tab.last_network_activity_t, 0)
+
+        self.event('loadingFinished', requestId='a')
+        self.assertEqual(1, self.tab.inflight_requests)
+
+        # events for requests we never saw start are ignored
+        self.event('loadingFinished', requestId='zzz')
+        self.assertEqual(1, self.tab.inflight_requests)
+
+    def test_redirects_counted_once(self):
+        self.event('requestWillBeSent', requestId='a')
+        self.event('requestWillBeSent', requestId='a', redirectResponse={'status': 302})
+        self.assertEqual(1, self.tab.inflight_requests)
+
+        self.event('loadingFinished', requestId='a')
+        self.assertEqual(0, self.tab.inflight_requests)
+
+    def test_loading_failed(self):
+        self.event('requestWillBeSent', requestId='a')
+        self.event('loadingFailed', requestId='a', errorText='net::ERR_FAILED')
+        self.assertEqual(0, self.tab.inflight_requests)
+
+    def test_served_from_cache(self):
+        # being served from the cache is not a completion; loadingFinished still follows it
+        self.event('requestWillBeSent', requestId='a')
+        self.event('requestServedFromCache', requestId='a')
+        self.assertEqual(1, self.tab.inflight_requests)
+
+        self.event('loadingFinished', requestId='a')
+        self.assertEqual(0, self.tab.inflight_requests)
+
+    def test_cleared_on_main_frame_navigation(self):
+        self.event('requestWillBeSent', requestId='a')
+        self.event('requestWillBeSent', requestId='b')
+
+        # subframe navigations leave the page's requests alone
+        self.tab.page.trigger('frameNavigated', {'frame': {'id': 'f2', 'parentId': 'f1'}})
+        self.assertEqual(2, self.tab.inflight_requests)
+
+        self.tab.page.trigger('frameNavigated', {'frame': {'id': 'f1'}})
+        self.assertEqual(0, self.tab.inflight_requests)
+        self.assertEqual(0, self.tab.last_network_activity_t)
+        self.assertIsInstance(self.tab.wait_for_network_idle(quiet=0, timeout=100), int)
+
+        # requests from the new document are counted as usual
+        self.event('requestWillBeSent', requestId='c')
+        self.assertEqual(1, self.tab.inflight_requests)
+
+    def test_wait_for_network_idle(self):
+        self.assertGreaterEqual(self.tab.wait_for_network_idle(quiet=0, timeout=100), 0)
+        self.assertIsInstance(self.tab.wait_for_network_idle(quiet=0, timeout=100), int)
+
+        self.event('requestWillBeSent', requestId='a')
+        self.event('requestWillBeSent', requestId='b')
+
+        self.assertRaises(
+            exceptions.TimeoutError,
+            self.tab.wait_for_network_idle,
+            quiet=0,
+            timeout=50,
+            poll_interval=10
+        )
+
+        # long-lived requests can be tolerated
+        self.assertGreaterEqual(
+            self.tab.wait_for_network_idle(max_inflight=2, quiet=0, timeout=100),
+            0
+        )
+
+
+class CoalescingTest(TestCase):
+    def setUp(self):
+        # just the event pipeline, with the trigger worker running as it does for a live tab
+        self.tab = Tab.__new__(Tab)
+        self.tab.triggerqueue = Queue()
+        self.tab.coalescing_rules = {}
+        self.tab.event_taps = []
+        self.tab.waiters = {}
+        self.tab.last_event_m = {}
+        self.tab.last_event_t = 0
+        self.tab.network = Network(self.tab)
+        self.tab._trigger_worker = Thread(target=self.tab.trigger_worker)
+        self.tab._trigger_worker.start()
+
+        self.received = []
+        self.finished = []
+        self.tab.network.on('dataReceived', lambda e: self.received.append(e.payload))
+        self.tab.network.on('loadingFinished', lambda e: self.finished.append(e.payload))
+
+    def tearDown(self):
+        self.tab.triggerqueue.put((None, None, StopIteration))
+        self.tab._trigger_worker.join(5)
+
+    def event(self, name, **payload):
+        self.tab.triggerqueue.put((self.tab.network, name, payload))
+
+    def test_aggregated_event_delivered_once(self):
+        rule = self.tab.coalesce(
+            'Network.dataReceived',
+            window=60000,
+            mode='sum',
+            key='requestId',
+            sum_fields=['dataLength']
+        )
+
+        self.event('dataReceived', requestId='a', dataLength=10)
+        self.event('dataReceived', requestId='a', dataLength=20)
+        self.event('dataReceived', requestId='b', dataLength=5)
+        self.event('dataReceived', requestId='a', dataLength=30)
+
+        # events that aren't coalesced pass straight through
+        self.event('loadingFinished', requestId='c')
+        self.assertTrue(self.tab.sync_events(timeout=5000))
+
+        self.assertEqual([{'requestId': 'c'}], self.finished)
+        self.assertEqual([], self.received)
+        self.assertIsNotNone(self.tab.next_coalesce_timeout())
+
+        # end the window, and wake the worker up so that it notices
+        rule.flush_at = 0
+        self.event('loadingFinished', requestId='d')
+        self.assertTrue(self.tab.sync_events(timeout=5000))
+
+        self.assertEqual([
+            {'requestId': 'a', 'dataLength': 60, 'coalescedCount': 3},
+            {'requestId': 'b', 'dataLength': 5, 'coalescedCount': 1},
+        ], self.received)
+        self.assertIn('Network.dataReceived', self.tab.last_event_m)
+
+        # nothing is left over to be delivered again
+        self.assertIsNone(self.tab.next_coalesce_timeout())
+        self.event('loadingFinished', requestId='e')
+        self.assertTrue(self.tab.sync_events(timeout=5000))
+        self.tab.flush_coalesced_events(force=True)
+
+        self.assertEqual(2, len(self.received))
+        self.assertEqual(3, len(self.finished))
+
+    def test_delivered_when_window_elapses(self):
+        delivered = ThreadEvent()
+        self.tab.coalesce('Network.dataReceived', window=20)
+        self.tab.network.on('dataReceived', lambda e: delivered.set())
+
+        self.event('dataReceived', requestId='a', dataLength=10)
+        self.event('dataReceived', requestId='a', dataLength=20)
+
+        # no further events arrive; the worker flushes the window on its own
+        self.assertTrue(delivered.wait(5))
+        self.assertEqual([
+            {'requestId': 'a', 'dataLength': 20, 'coalescedCount': 2},
+        ], self.received)
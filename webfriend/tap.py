@@ -0,0 +1,231 @@
+"""
+Event taps write every event a tab receives (optionally filtered by name) out as newline-delimited
+JSON, either to a file or to a UNIX domain socket.
+
+Events are handed off to a bounded queue and written in batches by a dedicated writer thread, so
+the tab's trigger worker never blocks on disk or socket I/O.  If the writer falls behind and the
+queue fills up, new events are dropped (and counted) rather than stalling event dispatch.
+"""
+from __future__ import absolute_import
+from fnmatch import fnmatchcase
+from Queue import Queue, Empty, Full
+from threading import Thread, Lock
+from webfriend.utils import patch_json  # noqa
+import json
+import logging
+import socket
+import time
+
+UNIX_SOCKET_PREFIX = 'unix://'
+
+
+class EventTap(object):
+    default_queue_size = 10000
+    default_batch_size = 256
+    default_flush_interval = 250
+
+    def __init__(
+        self,
+        destination,
+        patterns=None,
+        queue_size=None,
+        batch_size=None,
+        flush_interval=None
+    ):
+        """
+        Create a new event tap.
+
+        #### Arguments
+
+        - **destination** (`str`, _file-like object_):
+
+            Where to write events to.  Strings starting with `unix://` are interpreted as the path
+            to a UNIX domain socket to connect to, all other strings are filenames that will be
+            appended to.  File-like objects are written to as-is.
+
+        - **patterns** (`str`, `list`, optional):
+
+            One or more shell-style wildcard patterns (e.g. `Network.*`) that event names must
+            match in order to be written.  If not specified, all events are written.
+
+        - **queue_size** (`int`, optional):
+
+            The maximum number of events that may be waiting to be written before new events are
+            dropped.
+
+        - **batch_size** (`int`, optional):
+
+            The maximum number of events written per write call.
+
+        - **flush_interval** (`int`, optional):
+
+            How long (in milliseconds) the writer thread waits for new events before flushing what
+            it has written so far.
+        """
+        if patterns is None:
+            patterns = []
+        elif not isinstance(patterns, (list, tuple)):
+            patterns = [patterns]
+
+        self.destination    = destination
+        self.patterns       = list(patterns)
+        self.batch_size     = (batch_size or self.default_batch_size)
+        self.flush_interval = (flush_interval or self.default_flush_interval)
+        self.written        = 0
+        self.dropped        = 0
+        self._lock          = Lock()
+        self._queue         = Queue(queue_size or self.default_queue_size)
+        self._handle        = None
+        self._socket        = None
+        self._close_handle  = False
+        self._writer        = None
+
+    def matches(self, event_name):
+        if not len(self.patterns):
+            return True
+
+        for pattern in self.patterns:
+            if fnmatchcase(event_name, pattern):
+                return True
+
+        return False
+
+    def start(self):
+        self.open()
+        self._writer = Thread(target=self.write_worker)
+        self._writer.daemon = True
+        self._writer.start()
+        return self
+
+    def stop(self, timeout=10000):
+        if self._writer and self._writer.is_alive():
+            deadline = time.time() + (timeout / 1e3)
+
+            # the stop sentinel may wait for room in the queue, since we want everything before it
+            # written, but never for longer than the timeout
+            try:
+                self._queue.put(StopIteration, timeout=(timeout / 1e3))
+                self._writer.join(max(deadline - time.time(), 0))
+            except Full:
+                logging.warning('Timed out stopping event tap for {} ({} events pending)'.format(
+                    self.destination,
+                    self._queue.qsize()
+                ))
+
+        self.close()
+
+    def open(self):
+        if hasattr(self.destination, 'write'):
+            self._handle = self.destination
+
+        elif self.destination.startswith(UNIX_SOCKET_PREFIX):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self.destination[len(UNIX_SOCKET_PREFIX):])
+            self._handle = self._socket.makefile('wb')
+            self._close_handle = True
+
+        else:
+            self._handle = open(self.destination, 'ab')
+            self._close_handle = True
+
+    def close(self):
+        if self._close_handle and self._handle:
+            try:
+                self._handle.close()
+            finally:
+                self._handle = None
+
+                if self._socket:
+                    self._socket.close()
+                    self._socket = None
+
+    def offer(self, event):
+        """
+        Queue the given event for writing if it matches this tap's patterns. This never blocks; if
+        the queue is full the event is dropped.
+
+        #### Returns
+        `True` if the event was queued, `False` if it was filtered out or dropped.
+        """
+        if not self.matches(str(event)):
+            return False
+
+        try:
+            self._queue.put_nowait((time.time(), event))
+            return True
+        except Full:
+            self.drop()
+            return False
+
+    def drop(self, count=1):
+        # events are dropped from both the trigger worker and the writer thread
+        with self._lock:
+            self.dropped += count
+
+    def write_worker(self):
+        while True:
+            batch = []
+
+            try:
+                batch.append(self._queue.get(timeout=(self.flush_interval / 1e3)))
+            except Empty:
+                self.flush()
+                continue
+
+            # drain whatever else is already waiting, up to the batch size
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+
+            stopping = (StopIteration in batch)
+
+            if stopping:
+                batch = batch[:batch.index(StopIteration)]
+
+            try:
+                self.write_batch(batch)
+            except (IOError, socket.error, ValueError):
+                logging.exception('Failed to write events to {}'.format(self.destination))
+                self.drop(len(batch))
+
+            if stopping:
+                self.flush()
+                return
+
+    def write_batch(self, batch):
+        lines = []
+
+        for received_at, event in batch:
+            # an event that can't be serialized is dropped on its own, rather than taking the
+            # batch (or the writer thread) down with it
+            try:
+                line = event.to_json()
+                line['time'] = received_at
+                lines.append(json.dumps(line))
+            except (TypeError, ValueError) as e:
+                logging.warning('Dropping unserializable event {}: {}'.format(event, e))
+                self.drop()
+
+        if not len(lines):
+            return
+
+        self._handle.write(('\n'.join(lines) + '\n').encode('UTF-8'))
+        self.written += len(lines)
+
+    def flush(self):
+        if self._handle and hasattr(self._handle, 'flush'):
+            try:
+                self._handle.flush()
+            except (IOError, socket.error):
+                pass
+
+    def as_dict(self):
+        return {
+            'destination': '{}'.format(self.destination),
+            'patterns':    self.patterns,
+            'written':     self.written,
+            'dropped':     self.dropped,
+            'pending':     self._queue.qsize(),
+        }
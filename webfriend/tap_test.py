@@ -0,0 +1,98 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from threading import Thread
+from webfriend.tap import EventTap
+import io
+import json
+import time
+
+
+class FakeEvent(object):
+    def __init__(self, name, payload):
+        self.name = name
+        self.payload = payload
+
+    def to_json(self):
+        return {
+            'event':   self.name,
+            'payload': self.payload,
+        }
+
+    def __str__(self):
+        return self.name
+
+
+class UnclosingBuffer(io.BytesIO):
+    def close(self):
+        pass
+
+
+class EventTapTest(TestCase):
+    def test_writes_matching_events_as_ndjson(self):
+        out = UnclosingBuffer()
+        tap = EventTap(out, patterns=['Network.*']).start()
+
+        self.assertTrue(tap.offer(FakeEvent('Network.dataReceived', {'dataLength': 1})))
+        self.assertFalse(tap.offer(FakeEvent('Page.loadEventFired', {})))
+        self.assertTrue(tap.offer(FakeEvent('Network.loadingFinished', {'requestId': 'a'})))
+        tap.stop()
+
+        lines = [json.loads(l) for l in out.getvalue().decode('UTF-8').splitlines()]
+
+        self.assertEqual(['Network.dataReceived', 'Network.loadingFinished'], [
+            l['event'] for l in lines
+        ])
+
+        self.assertEqual({'dataLength': 1}, lines[0]['payload'])
+        self.assertIn('time', lines[0])
+        self.assertEqual(2, tap.written)
+        self.assertEqual(0, tap.dropped)
+
+    def test_drops_events_when_queue_is_full(self):
+        out = UnclosingBuffer()
+
+        # not started, so nothing drains the queue
+        tap = EventTap(out, queue_size=2)
+
+        for i in range(5):
+            tap.offer(FakeEvent('Network.dataReceived', {'i': i}))
+
+        self.assertEqual(3, tap.dropped)
+
+        tap.start()
+        tap.stop()
+        self.assertEqual(2, tap.written)
+
+    def test_unserializable_events_dropped(self):
+        out = UnclosingBuffer()
+        tap = EventTap(out).start()
+
+        tap.offer(FakeEvent('Page.one', {'ok': 1}))
+        circular = {}
+        circular['self'] = circular
+        tap.offer(FakeEvent('Page.bad', circular))
+        tap.offer(FakeEvent('Page.two', {'ok': 2}))
+        tap.stop()
+
+        # the writer survives and keeps writing the events around the bad one
+        self.assertEqual(['Page.one', 'Page.two'], [
+            json.loads(l)['event'] for l in out.getvalue().decode('UTF-8').splitlines()
+        ])
+
+        self.assertEqual(2, tap.written)
+        self.assertEqual(1, tap.dropped)
+
+    def test_stop_does_not_block_on_full_queue(self):
+        out = UnclosingBuffer()
+        tap = EventTap(out, queue_size=1)
+
+        # a writer that is alive but never drains the queue
+        tap._writer = Thread(target=time.sleep, args=(0.5,))
+        tap._writer.start()
+        tap.offer(FakeEvent('Page.one', {}))
+
+        started = time.time()
+        tap.stop(timeout=50)
+
+        self.assertLess(time.time() - started, 0.4)
@@ -0,0 +1,219 @@
+"""
+Declarative data extraction.
+
+An extraction spec describes what to pull out of a page: which elements to look at (by CSS
+selector), what to take from them (text, HTML, an attribute, or a DOM property), and how to
+structure the results (nested objects and repeated items).  The spec is compiled into a compact
+form and passed as an argument to a single injected function (it is never quoted into script
+text), so that extracting any amount of data costs one round trip to the browser.
+
+#### Spec Format
+
+A field is either a string (a CSS selector whose matching element's text is returned), or an object
+with the following keys:
+
+- **selector** (`str`, optional): The CSS selector to match, relative to the enclosing field's
+  element.  If omitted, the enclosing element itself is used.
+
+- **attribute** (`str`, optional): Return the value of this attribute.
+
+- **property** (`str`, optional): Return the value of this DOM property (e.g. `href`, `value`,
+  `checked`.)  Values that can't be returned as data are converted: DOM elements become their
+  outer HTML (other nodes their text), lists (e.g. `classList`) become arrays, dates become ISO
+  8601 strings, functions become `null`, and any other object is copied as JSON (or converted
+  to a string if it can't be.)
+
+- **html** (`bool`, optional): Return the element's inner HTML.
+
+- **outer_html** (`bool`, optional): Return the element's outer HTML.
+
+- **multiple** (`bool`, optional): Return a list with a result for every matching element instead
+  of just the first.
+
+- **fields** (`dict`, optional): Return an object whose keys are themselves fields, evaluated
+  relative to the matched element.
+
+- **trim** (`bool`, optional): Whether to collapse whitespace in text results (default: true).
+
+If nothing matches a single-valued field, its result is `null`.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+FIELD_KEYS = set([
+    'selector', 'attribute', 'property', 'html', 'outer_html', 'multiple', 'fields', 'trim',
+])
+
+EXTRACT_FN = """function(spec, root){
+    function primitive(v, depth){
+        if(v === null || v === undefined){
+            return null;
+        }
+
+        switch(typeof(v)){
+        case 'string':
+        case 'boolean':
+            return v;
+        case 'number':
+            return (isFinite(v) ? v : null);
+        case 'function':
+        case 'symbol':
+            return null;
+        case 'bigint':
+            return v.toString();
+        }
+
+        if(typeof(Node) !== 'undefined' && v instanceof Node){
+            return (v.nodeType === Node.ELEMENT_NODE ? v.outerHTML : v.textContent);
+        }
+
+        if(v instanceof Date){
+            return (isNaN(v.getTime()) ? null : v.toISOString());
+        }
+
+        if(Array.isArray(v) || (typeof(v.length) === 'number' && typeof(v.item) === 'function')){
+            if(depth >= 2){
+                return null;
+            }
+
+            var out = [];
+
+            for(var i = 0; i < v.length; i++){
+                out.push(primitive(v[i], depth + 1));
+            }
+
+            return out;
+        }
+
+        try{
+            return JSON.parse(JSON.stringify(v));
+        }catch(e){
+            return String(v);
+        }
+    }
+
+    function value(el, f){
+        if(f.f){
+            var out = {};
+
+            for(var k in f.f){
+                out[k] = field(el, f.f[k]);
+            }
+
+            return out;
+        }
+
+        switch(f.k){
+        case 'attr':
+            return el.getAttribute(f.a);
+        case 'prop':
+            return primitive(el[f.a], 0);
+        case 'html':
+            return el.innerHTML;
+        case 'outer_html':
+            return el.outerHTML;
+        default:
+            var text = el.textContent;
+
+            if(f.t && typeof(text) === 'string'){
+                text = text.replace(/\\s+/g, ' ').trim();
+            }
+
+            return text;
+        }
+    }
+
+    function field(ctx, f){
+        if(f.m){
+            var els = (f.s ? ctx.querySelectorAll(f.s) : [ctx]);
+            var out = [];
+
+            for(var i = 0; i < els.length; i++){
+                out.push(value(els[i], f));
+            }
+
+            return out;
+        }
+
+        var el = (f.s ? ctx.querySelector(f.s) : ctx);
+        return (el ? value(el, f) : null);
+    }
+
+    return field(root, spec);
+}"""
+
+
+def compile_spec(spec, path='spec'):
+    """
+    Validate an extraction spec and convert it into the compact form understood by `EXTRACT_FN`.
+
+    #### Raises
+    `ValueError` if the spec is malformed.
+    """
+    if hasattr(spec, 'as_dict'):
+        spec = spec.as_dict()
+
+    if isinstance(spec, basestring):
+        spec = {
+            'selector': spec,
+        }
+
+    if not isinstance(spec, dict):
+        raise ValueError("{}: fields must be a selector string or an object".format(path))
+
+    unknown = set(spec.keys()) - FIELD_KEYS
+
+    if len(unknown):
+        raise ValueError("{}: unknown field option(s) {}".format(
+            path,
+            ', '.join(sorted(unknown))
+        ))
+
+    sources = [k for k in ['attribute', 'property', 'html', 'outer_html', 'fields'] if spec.get(k)]
+
+    if len(sources) > 1:
+        raise ValueError("{}: only one of {} may be specified".format(path, ', '.join(sources)))
+
+    compiled = {
+        's': (spec.get('selector') or None),
+        'k': 'text',
+        'm': bool(spec.get('multiple', False)),
+        't': bool(spec.get('trim', True)),
+    }
+
+    if spec.get('attribute'):
+        compiled['k'] = 'attr'
+        compiled['a'] = spec['attribute']
+
+    elif spec.get('property'):
+        compiled['k'] = 'prop'
+        compiled['a'] = spec['property']
+
+    elif spec.get('html'):
+        compiled['k'] = 'html'
+
+    elif spec.get('outer_html'):
+        compiled['k'] = 'outer_html'
+
+    elif spec.get('fields') is not None:
+        fields = spec['fields']
+
+        if hasattr(fields, 'as_dict'):
+            fields = fields.as_dict()
+
+        if not isinstance(fields, dict) or not len(fields):
+            raise ValueError("{}: 'fields' must be a non-empty object".format(path))
+
+        compiled['f'] = dict([
+            (k, compile_spec(v, path='{}.{}'.format(path, k))) for k, v in fields.items()
+        ])
+
+    return compiled
+
+
+# A script body (see `webfriend.rpc.Runtime.run_script`) that extracts the compiled spec bound to
+# `this` from the document.
+EXTRACT_SCRIPT = 'return ({})(this, document);'.format(EXTRACT_FN)
+
+# Called on an element to extract the compiled spec given as its argument, relative to it.
+EXTRACT_NODE_FN = 'function(spec){{ return ({})(spec, this); }}'.format(EXTRACT_FN)
@@ -0,0 +1,143 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from distutils.spawn import find_executable
+from unittest import TestCase, skipUnless
+from webfriend.utils.extract import compile_spec, EXTRACT_FN, EXTRACT_SCRIPT, EXTRACT_NODE_FN
+import json
+import subprocess
+
+
+class ExtractSpecTest(TestCase):
+    def test_compile_nested(self):
+        self.assertEqual({
+            's': 'li.item',
+            'k': 'text',
+            'm': True,
+            't': True,
+            'f': {
+                'name': {
+                    's': '.name',
+                    'k': 'text',
+                    'm': False,
+                    't': True,
+                },
+                'link': {
+                    's': 'a',
+                    'k': 'attr',
+                    'a': 'href',
+                    'm': False,
+                    't': True,
+                },
+                'body': {
+                    's': None,
+                    'k': 'html',
+                    'm': False,
+                    't': False,
+                },
+            },
+        }, compile_spec({
+            'selector': 'li.item',
+            'multiple': True,
+            'fields': {
+                'name': '.name',
+                'link': {
+                    'selector': 'a',
+                    'attribute': 'href',
+                },
+                'body': {
+                    'html': True,
+                    'trim': False,
+                },
+            },
+        }))
+
+    def test_compile_invalid(self):
+        self.assertRaises(ValueError, compile_spec, 42)
+        self.assertRaises(ValueError, compile_spec, {'selector': 'a', 'atribute': 'href'})
+        self.assertRaises(ValueError, compile_spec, {'attribute': 'href', 'html': True})
+        self.assertRaises(ValueError, compile_spec, {'fields': {}})
+
+        with self.assertRaisesRegexp(ValueError, 'spec.items.price'):
+            compile_spec({
+                'fields': {
+                    'items': {
+                        'fields': {
+                            'price': [],
+                        },
+                    },
+                },
+            })
+
+    def test_spec_never_in_script_text(self):
+        self.assertTrue(EXTRACT_SCRIPT.startswith('return (function(spec, root){'))
+        self.assertTrue(EXTRACT_SCRIPT.endswith('(this, document);'))
+        self.assertTrue(EXTRACT_NODE_FN.startswith('function(spec){'))
+        self.assertNotIn('li.item', EXTRACT_SCRIPT + EXTRACT_NODE_FN)
+
+
+# a minimal DOM for running the extraction function under Node.js
+FAKE_DOM = """
+function Node(){}
+Node.ELEMENT_NODE = 1;
+
+function El(props){
+    for(var k in props){ this[k] = props[k]; }
+    this.nodeType = 1;
+}
+El.prototype = Object.create(Node.prototype);
+
+var parent = new El({outerHTML: '<form></form>', textContent: ''});
+var circular = {};
+circular.self = circular;
+
+var classes = ['a', 'b'];
+classes.item = function(i){ return this[i]; };
+
+var el = new El({
+    parentElement: parent,
+    classList: classes,
+    onclick: function(){},
+    when: new Date(Date.UTC(2020, 0, 2)),
+    size: NaN,
+    dataset: {x: '1'},
+    circular: circular,
+    textContent: 'hi'
+});
+"""
+
+
+@skipUnless(find_executable('node'), 'Node.js is not installed')
+class ExtractFunctionTest(TestCase):
+    def extract(self, spec):
+        script = '{}\nconsole.log(JSON.stringify(({})({}, el)));'.format(
+            FAKE_DOM,
+            EXTRACT_FN,
+            json.dumps(compile_spec(spec))
+        )
+
+        process = subprocess.Popen(['node'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        output, _ = process.communicate(script.encode('utf-8'))
+
+        self.assertEqual(0, process.returncode)
+        return json.loads(output)
+
+    def test_properties_coerced_to_data(self):
+        self.assertEqual({
+            'parent':  '<form></form>',
+            'classes': ['a', 'b'],
+            'handler': None,
+            'when':    '2020-01-02T00:00:00.000Z',
+            'size':    None,
+            'dataset': {'x': '1'},
+            'cycle':   '[object Object]',
+        }, self.extract({
+            'fields': {
+                'parent':  {'property': 'parentElement'},
+                'classes': {'property': 'classList'},
+                'handler': {'property': 'onclick'},
+                'when':    {'property': 'when'},
+                'size':    {'property': 'size'},
+                'dataset': {'property': 'dataset'},
+                'cycle':   {'property': 'circular'},
+            },
+        }))
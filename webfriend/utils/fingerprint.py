@@ -0,0 +1,228 @@
+"""
+Hash-tree fingerprints of DOM subtrees.
+
+A fingerprint is computed in the page in a single pass: every element's hash covers its tag name,
+its attributes, its text, and the hashes of its child elements, so any change anywhere in a
+subtree changes the hash of every ancestor up to the root.  Only the top few levels of hashes are
+returned, which makes fingerprints small enough to store and compare cheaply.  Comparing two
+fingerprints (see `diff`) locates the changed regions of a page without transferring any of its
+content.
+
+#### Fingerprint Format
+
+A fingerprint is a `dict` with the keys _selector_, _depth_, and _roots_.  Each root (and each
+child below it, down to _depth_ levels) is a `dict` with the following keys:
+
+- **hash** (`str`): A 64-bit hash of the element and everything inside it, as hex.
+- **tag** (`str`): The element's tag name.
+- **index** (`int`): The element's position among its sibling elements (starting at 1.)
+- **children** (`list`, optional): The fingerprints of the element's child elements.  This is
+  omitted for elements at the depth limit.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import json
+
+FINGERPRINT_FN = """function(spec, ctx){
+    function hash(str){
+        var h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+
+        for(var i = 0; i < str.length; i++){
+            var ch = str.charCodeAt(i);
+            h1 = Math.imul(h1 ^ ch, 2654435761);
+            h2 = Math.imul(h2 ^ ch, 1597334677);
+        }
+
+        h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+        h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+
+        return ('0000000' + (h2 >>> 0).toString(16)).slice(-8) +
+               ('0000000' + (h1 >>> 0).toString(16)).slice(-8);
+    }
+
+    function visit(el, level, index){
+        var parts = [el.localName];
+        var children = [];
+        var n = 0;
+
+        if(spec.a){
+            var attrs = [];
+
+            for(var i = 0; i < el.attributes.length; i++){
+                var attr = el.attributes[i];
+                attrs.push(attr.name + '=' + attr.value);
+            }
+
+            parts.push(attrs.sort().join('\\u0001'));
+        }
+
+        for(var c = el.firstChild; c; c = c.nextSibling){
+            if(c.nodeType === Node.ELEMENT_NODE){
+                n++;
+
+                if(spec.x && c.matches(spec.x)){
+                    continue;
+                }
+
+                var child = visit(c, level + 1, n);
+                parts.push(child.hash);
+                children.push(child);
+
+            }else if(c.nodeType === Node.TEXT_NODE || c.nodeType === Node.CDATA_SECTION_NODE){
+                var text = (spec.w ? c.nodeValue.replace(/\\s+/g, ' ').trim() : c.nodeValue);
+
+                if(text.length){
+                    parts.push('#' + text);
+                }
+            }
+        }
+
+        var out = {
+            hash:  hash(parts.join('\\u0000')),
+            tag:   el.localName,
+            index: index,
+        };
+
+        if(level < spec.d){
+            out.children = children;
+        }
+
+        return out;
+    }
+
+    var roots = (spec.s ? ctx.querySelectorAll(spec.s) : [ctx.documentElement || ctx]);
+    var out = [];
+
+    for(var i = 0; i < roots.length; i++){
+        out.push(visit(roots[i], 0, i + 1));
+    }
+
+    return out;
+}"""
+
+
+def compile_spec(selector=None, depth=3, exclude=None, attributes=True, normalize_whitespace=True):
+    """
+    Validate fingerprint options and convert them into the compact form understood by
+    `FINGERPRINT_FN`.
+
+    #### Raises
+    `ValueError` if **depth** is not a non-negative integer.
+    """
+    if not isinstance(depth, (int, long)) or isinstance(depth, bool) or depth < 0:
+        raise ValueError("'depth' must be a non-negative integer")
+
+    return {
+        's': (selector or None),
+        'd': depth,
+        'x': (exclude or None),
+        'a': bool(attributes),
+        'w': bool(normalize_whitespace),
+    }
+
+
+def fingerprint_expression(root='document', **kwargs):
+    """
+    Return a Javascript expression that fingerprints the matching elements within **root**.  See
+    `compile_spec` for arguments.
+    """
+    return '({})({}, {})'.format(
+        FINGERPRINT_FN,
+        json.dumps(compile_spec(**kwargs)),
+        root
+    )
+
+
+def _label(node, root=False):
+    if root:
+        return node.get('tag') or ''
+
+    return '{}:nth-child({})'.format(node.get('tag'), node.get('index'))
+
+
+def _diff_node(old, new, path, root_index, changes):
+    if old.get('hash') == new.get('hash'):
+        return
+
+    old_children = old.get('children')
+    new_children = new.get('children')
+
+    # descend only where both sides have the same element structure; otherwise this element is
+    # the smallest region known to have changed
+    same_structure = False
+
+    if old.get('tag') == new.get('tag') and None not in (old_children, new_children):
+        same_structure = ([
+            (c.get('tag'), c.get('index')) for c in old_children
+        ] == [
+            (c.get('tag'), c.get('index')) for c in new_children
+        ])
+
+    if same_structure:
+        differing = [
+            (o, n) for o, n in zip(old_children, new_children) if o.get('hash') != n.get('hash')
+        ]
+
+        if len(differing):
+            for o, n in differing:
+                _diff_node(o, n, path + [_label(n)], root_index, changes)
+            return
+
+    changes.append({
+        'root':   root_index,
+        'path':   ' > '.join(path),
+        'change': 'modified',
+        'old':    old.get('hash'),
+        'new':    new.get('hash'),
+    })
+
+
+def diff(old, new):
+    """
+    Compare two fingerprints and return the regions that changed between them.
+
+    A change to an element's own attributes or text is reported at that element; changes to
+    descendants are reported at the deepest element (within the fingerprints' depth) whose child
+    structure is the same in both fingerprints.
+
+    #### Returns
+    A `list` of `dict` objects with the keys _root_ (the index of the root in _roots_), _path_
+    (a CSS-style path to the changed element, relative to the root), _change_ (one of
+    `modified`, `added`, or `removed`), _old_, and _new_ (the hashes on either side, or `None`.)
+    """
+    if hasattr(old, 'as_dict'):
+        old = old.as_dict()
+
+    if hasattr(new, 'as_dict'):
+        new = new.as_dict()
+
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        raise ValueError("Fingerprints must be objects")
+
+    changes = []
+    old_roots = old.get('roots', [])
+    new_roots = new.get('roots', [])
+
+    for i in range(max(len(old_roots), len(new_roots))):
+        if i >= len(new_roots):
+            changes.append({
+                'root':   i,
+                'path':   _label(old_roots[i], root=True),
+                'change': 'removed',
+                'old':    old_roots[i].get('hash'),
+                'new':    None,
+            })
+
+        elif i >= len(old_roots):
+            changes.append({
+                'root':   i,
+                'path':   _label(new_roots[i], root=True),
+                'change': 'added',
+                'old':    None,
+                'new':    new_roots[i].get('hash'),
+            })
+
+        else:
+            _diff_node(old_roots[i], new_roots[i], [_label(new_roots[i], root=True)], i, changes)
+
+    return changes
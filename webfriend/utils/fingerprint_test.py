@@ -0,0 +1,134 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from distutils.spawn import find_executable
+from unittest import TestCase, skipUnless
+from webfriend.utils.fingerprint import compile_spec, diff, FINGERPRINT_FN
+import json
+import subprocess
+
+
+def node(hash, tag, index=1, children=None):
+    out = {
+        'hash':  hash,
+        'tag':   tag,
+        'index': index,
+    }
+
+    if children is not None:
+        out['children'] = children
+
+    return out
+
+
+class FingerprintTest(TestCase):
+    def setUp(self):
+        self.old = {
+            'roots': [
+                node('h1', 'html', children=[
+                    node('b1', 'body', 2, children=[
+                        node('p1', 'p', 1),
+                        node('d1', 'div', 2),
+                        node('s1', 'span', 3),
+                    ]),
+                ]),
+            ],
+        }
+
+    def test_compile_spec(self):
+        self.assertEqual(2, compile_spec(depth=2)['d'])
+        self.assertRaises(ValueError, compile_spec, depth=-1)
+        self.assertRaises(ValueError, compile_spec, depth='3')
+
+    def test_unchanged(self):
+        self.assertEqual([], diff(self.old, self.old))
+
+    def test_changed_children_located(self):
+        new = {
+            'roots': [
+                node('h2', 'html', children=[
+                    node('b2', 'body', 2, children=[
+                        node('p1', 'p', 1),
+                        node('d2', 'div', 2),
+                        node('s2', 'span', 3),
+                    ]),
+                ]),
+            ],
+        }
+
+        self.assertEqual([
+            'html > body:nth-child(2) > div:nth-child(2)',
+            'html > body:nth-child(2) > span:nth-child(3)',
+        ], [c['path'] for c in diff(self.old, new)])
+
+        self.assertEqual(('d1', 'd2'), (diff(self.old, new)[0]['old'], diff(self.old, new)[0]['new']))
+
+    def test_own_content_or_structure_changed(self):
+        # the body's own text changed, but none of its children did
+        new = {
+            'roots': [
+                node('h2', 'html', children=[
+                    node('b2', 'body', 2, children=[
+                        node('p1', 'p', 1),
+                        node('d1', 'div', 2),
+                        node('s1', 'span', 3),
+                    ]),
+                ]),
+            ],
+        }
+
+        self.assertEqual(['html > body:nth-child(2)'], [c['path'] for c in diff(self.old, new)])
+
+        # an element was inserted into the body
+        new['roots'][0]['children'][0]['children'].insert(0, node('x', 'img', 1))
+        self.assertEqual(['html > body:nth-child(2)'], [c['path'] for c in diff(self.old, new)])
+
+    def test_roots_added_and_removed(self):
+        new = {
+            'roots': self.old['roots'] + [node('h3', 'html', 2)],
+        }
+
+        self.assertEqual([('added', 1)], [(c['change'], c['root']) for c in diff(self.old, new)])
+        self.assertEqual([('removed', 1)], [(c['change'], c['root']) for c in diff(new, self.old)])
+        self.assertRaises(ValueError, diff, self.old, [])
+
+
+# just enough of the DOM for FINGERPRINT_FN to walk a single element
+FAKE_DOM = """
+var Node = {ELEMENT_NODE: 1, TEXT_NODE: 3, CDATA_SECTION_NODE: 4};
+
+function element(attributes){
+    return {
+        nodeType:   1,
+        localName:  'div',
+        attributes: attributes,
+        firstChild: null,
+    };
+}
+"""
+
+
+@skipUnless(find_executable('node'), 'Node.js is not installed')
+class FingerprintFunctionTest(TestCase):
+    def hash(self, attributes):
+        script = '{}\nconsole.log(JSON.stringify(({})({}, element({}))));'.format(
+            FAKE_DOM,
+            FINGERPRINT_FN,
+            json.dumps(compile_spec()),
+            json.dumps([{'name': k, 'value': v} for k, v in attributes])
+        )
+
+        process = subprocess.Popen(['node'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        output, _ = process.communicate(script.encode('utf-8'))
+
+        self.assertEqual(0, process.returncode)
+        return json.loads(output)[0]['hash']
+
+    def test_all_attributes_hashed(self):
+        base = self.hash([('id', 'x')])
+
+        self.assertEqual(base, self.hash([('id', 'x')]))
+        self.assertNotEqual(base, self.hash([('id', 'x'), ('data-webfriend-state', 'a')]))
+        self.assertNotEqual(
+            self.hash([('data-webfriend-state', 'a')]),
+            self.hash([('data-webfriend-state', 'b')])
+        )
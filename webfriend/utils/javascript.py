@@ -0,0 +1,69 @@
+"""
+Static analysis of Javascript injected into pages.
+
+Injected scripts see the calling script's variables as properties of `this`.  Rather than
+serializing every variable in scope on every call, the script body is scanned for the
+properties of `this` it actually reads (e.g.: `this.results` or `this['results']`), and only
+those are sent.  Any other use of `this` (e.g.: `Object.keys(this)`, `this[key]`, or passing
+`this` to a function) means the whole scope may be needed, which the analysis reports so that
+callers can fall back to sending everything.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import re
+
+# strings and comments are matched first so that their contents are never mistaken for code
+RX_TOKENS = re.compile(r'''
+    (?P<string>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")
+    |(?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<this>\bthis\b)
+''', re.VERBOSE | re.DOTALL)
+
+RX_NAME = re.compile(r'^[A-Za-z_$][\w$]*$')
+RX_PROPERTY = re.compile(r'\s*\??\.\s*([A-Za-z_$][\w$]*)')
+RX_STRING_INDEX = re.compile(r'''\s*\[\s*('(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")\s*\]''')
+
+# a quote inside a template or regular expression literal can hide code from the tokenizer, so
+# property reads are also collected from the raw text (extra names are harmless, missing ones
+# are not)
+RX_ANY_PROPERTY = re.compile(r'\bthis\s*\??\.\s*([A-Za-z_$][\w$]*)')
+
+
+def this_references(body):
+    """
+    Find the names of the properties of `this` that are read by the given script body.
+
+    #### Returns
+    A `set` of property names, or `None` if the script uses `this` in a way that could read any
+    property (in which case the entire scope should be exposed to it.)
+    """
+    names = set()
+
+    for match in RX_TOKENS.finditer(body or ''):
+        if match.lastgroup != 'this':
+            continue
+
+        end = match.end()
+        prop = RX_PROPERTY.match(body, end)
+
+        if prop:
+            names.add(prop.group(1))
+            continue
+
+        index = RX_STRING_INDEX.match(body, end)
+
+        if index:
+            literal = index.group(1)[1:-1]
+
+            # anything other than a plain name (e.g.: escape sequences) is rare enough to not be
+            # worth decoding
+            if not RX_NAME.match(literal):
+                return None
+
+            names.add(literal)
+            continue
+
+        return None
+
+    names.update(RX_ANY_PROPERTY.findall(body or ''))
+    return names
@@ -0,0 +1,31 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend.utils.javascript import this_references
+
+
+class ThisReferencesTest(TestCase):
+    def test_property_reads(self):
+        self.assertEqual(set(), this_references('return document.title;'))
+        self.assertEqual(set(['a', 'b', 'c', 'd']), this_references(
+            "var x = this.a + this ['b'];\n"
+            "return [this\n    .c, this?.d];"
+        ))
+
+    def test_strings_and_comments_ignored(self):
+        self.assertEqual(set(['a']), this_references(
+            "// this is a comment\n"
+            "/* and this\n is too */\n"
+            "return 'this is' + \"this too\" + this.a;"
+        ))
+
+    def test_templates(self):
+        self.assertEqual(set(['name', 'count']), this_references(
+            "return `it's ${this.name}, ${this.count} of 'em`;"
+        ))
+
+    def test_whole_scope(self):
+        self.assertIsNone(this_references('return Object.keys(this);'))
+        self.assertIsNone(this_references('var k = "a"; return this[k];'))
+        self.assertIsNone(this_references("return this['a-b'];"))
+        self.assertIsNone(this_references('return this.a || JSON.stringify(this);'))
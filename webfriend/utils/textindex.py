@@ -0,0 +1,188 @@
+"""
+A local full-text index over a page's text.
+
+Text is added as a series of entries (typically one per text node), each normalized so that runs
+of whitespace collapse to a single space.  Every word in an entry is recorded in an inverted index
+(token -> entry and offset), which is used to narrow literal searches down to the entries that
+could possibly match before the text itself is scanned.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from collections import defaultdict
+import re
+
+RX_WHITESPACE = re.compile(r'\s+', re.UNICODE)
+RX_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_text(text):
+    """
+    Collapse all runs of whitespace in the given text to a single space and strip the ends.
+    """
+    return RX_WHITESPACE.sub(' ', text or '').strip()
+
+
+class TextIndex(object):
+    def __init__(self):
+        self.entries = []
+        self.data = []
+        self.postings = defaultdict(list)
+
+    def add(self, text, **data):
+        """
+        Normalize and index the given text, storing any keyword arguments alongside it to be
+        returned with matches.
+
+        #### Returns
+        The index of the new entry, or `None` if the text was empty after normalization.
+        """
+        text = normalize_text(text)
+
+        if not text:
+            return None
+
+        entry = len(self.entries)
+
+        self.entries.append(text)
+        self.data.append(data)
+
+        for match in RX_TOKEN.finditer(text.lower()):
+            self.postings[match.group(0)].append((entry, match.start()))
+
+        return entry
+
+    def positions(self, token):
+        """
+        Return a `list` of `(entry, offset)` tuples for every occurrence of the given word.
+        """
+        return self.postings.get(token.lower(), [])
+
+    def candidates(self, text):
+        """
+        Return the set of entries that could contain the given (normalized) literal text, or
+        `None` if the text contains no words and so every entry is a candidate.
+
+        Words in the middle of the text must appear exactly; the first and last words may be
+        partial (e.g.: "ello wor" matches "Hello world"), so they are matched against every
+        word in the index that ends or starts with them, respectively.
+        """
+        tokens = [m for m in RX_TOKEN.finditer(text.lower())]
+
+        if not len(tokens):
+            return None
+
+        entries = None
+
+        for i, match in enumerate(tokens):
+            token = match.group(0)
+            open_start = (i == 0 and match.start() == 0)
+            open_end = (i == len(tokens) - 1 and match.end() == len(text))
+
+            if open_start and open_end:
+                words = [w for w in self.postings.keys() if token in w]
+            elif open_start:
+                words = [w for w in self.postings.keys() if w.endswith(token)]
+            elif open_end:
+                words = [w for w in self.postings.keys() if w.startswith(token)]
+            else:
+                words = [token]
+
+            found = set()
+
+            for word in words:
+                found.update([entry for entry, _ in self.postings.get(word, [])])
+
+            if entries is None:
+                entries = found
+            else:
+                entries &= found
+
+            if not len(entries):
+                break
+
+        return entries
+
+    def search(self, query, regex=False, case_sensitive=False, limit=None):
+        """
+        Find all occurrences of the given text (or regular expression) in the index.
+
+        #### Arguments
+
+        - **query** (`str`):
+
+            The text to search for.  Whitespace in the query matches any whitespace in the
+            indexed text.
+
+        - **regex** (`bool`):
+
+            Whether **query** is a regular expression.  Regular expressions are matched against
+            the normalized text of every entry.
+
+        - **case_sensitive** (`bool`):
+
+            Whether matching should be case-sensitive.
+
+        - **limit** (`int`, optional):
+
+            The maximum number of matches to return.
+
+        #### Returns
+        A `list` of `dict` objects with the keys _entry_, _text_ (the normalized text of the entry),
+        _match_, _start_, and _end_, plus any data stored with the entry.
+
+        #### Raises
+        `ValueError` if **regex** is set and **query** is not a valid regular expression.
+        """
+        flags = re.UNICODE
+
+        if not case_sensitive:
+            flags |= re.IGNORECASE
+
+        if regex:
+            try:
+                pattern = re.compile(query, flags)
+            except re.error as e:
+                raise ValueError("Invalid regular expression '{}': {}".format(query, e))
+
+            entries = range(len(self.entries))
+        else:
+            query = normalize_text(query)
+
+            if not query:
+                return []
+
+            pattern = re.compile(re.escape(query), flags)
+            entries = self.candidates(query)
+
+            if entries is None:
+                entries = range(len(self.entries))
+            else:
+                entries = sorted(entries)
+
+        results = []
+
+        for entry in entries:
+            text = self.entries[entry]
+
+            for match in pattern.finditer(text):
+                if match.end() == match.start():
+                    continue
+
+                result = dict(self.data[entry])
+                result.update({
+                    'entry': entry,
+                    'text':  text,
+                    'match': match.group(0),
+                    'start': match.start(),
+                    'end':   match.end(),
+                })
+
+                results.append(result)
+
+                if limit and len(results) >= limit:
+                    return results
+
+        return results
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,46 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from unittest import TestCase
+from webfriend.utils.textindex import TextIndex, normalize_text
+
+
+class TextIndexTest(TestCase):
+    def setUp(self):
+        self.index = TextIndex()
+        self.index.add('  Hello,\n\tworld!  ', node=1)
+        self.index.add('Say hello to the World Wide Web', node=2)
+        self.index.add('   ', node=3)
+        self.index.add('Goodbye', node=4)
+
+    def test_normalize(self):
+        self.assertEqual('a b c', normalize_text(' a \n b\t\tc '))
+        self.assertEqual(3, len(self.index))
+        self.assertEqual([(0, 0), (1, 4)], self.index.positions('HELLO'))
+
+    def test_literal(self):
+        results = self.index.search('hello')
+
+        self.assertEqual([1, 2], [r['node'] for r in results])
+        self.assertEqual(['Hello', 'hello'], [r['match'] for r in results])
+        self.assertEqual((4, 9), (results[1]['start'], results[1]['end']))
+
+        self.assertEqual([2], [r['node'] for r in self.index.search('the  world')])
+        self.assertEqual([1, 2], [r['node'] for r in self.index.search('llo')])
+        self.assertEqual([2], [r['node'] for r in self.index.search('ello to th')])
+        self.assertEqual([], self.index.search('hello there'))
+        self.assertEqual([1], [r['node'] for r in self.index.search('o, w')])
+
+    def test_candidates_narrow_search(self):
+        self.assertEqual(set([1]), self.index.candidates('to the'))
+        self.assertEqual(set([0, 1]), self.index.candidates('orld'))
+        self.assertIsNone(self.index.candidates('!'))
+
+    def test_case_sensitive(self):
+        self.assertEqual([2], [r['node'] for r in self.index.search('World', case_sensitive=True)])
+
+    def test_regex(self):
+        results = self.index.search(r'\bw\w+d\b', regex=True)
+
+        self.assertEqual(['world', 'World'], [r['match'] for r in results])
+        self.assertEqual(1, len(self.index.search(r'w\w+d', regex=True, limit=1)))
+        self.assertRaises(ValueError, self.index.search, '(', regex=True)